@@ -9,9 +9,10 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
-from os import environ
+from os import environ, cpu_count
 from pathlib import Path
 
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,7 +48,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middlewares.TracingMiddleware',
+    'core.middlewares.RequestMetricsMiddleware',
+    'core.middlewares.ProfilingMiddleware',
     'core.middlewares.ValidateAuthTokenMiddleware',
+    'core.middlewares.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,27 +85,74 @@ WSGI_APPLICATION = 'app.wsgi.application'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'core.models.BearerTokenAuthentication',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 PASSWORD_HASHERS = [
-    'django.contrib.auth.hashers.MD5PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',  # legacy hashes, upgraded on login
 ]
 
+PASSWORD_HASHING_WORKERS = int(environ.get("PASSWORD_HASHING_WORKERS", cpu_count() or 1))
+PASSWORD_HASHING_QUEUE_SIZE = int(environ.get("PASSWORD_HASHING_QUEUE_SIZE", 64))
+PASSWORD_HASHING_TIMEOUT = float(environ.get("PASSWORD_HASHING_TIMEOUT", 10))
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
+POSTGRES_POOL = environ.get("POSTGRES_POOL", "1") == "1"
+
+
+def postgres_database(host, port, **extra):
+    database = {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": environ.get("POSTGRES_DATABASE", "promo"),
         "USER": environ.get("POSTGRES_USERNAME", "postgres"),
         "PASSWORD": environ.get("POSTGRES_PASSWORD", "postgres"),
-        "HOST": environ.get("POSTGRES_HOST", "localhost"),
-        "PORT": environ.get("POSTGRES_PORT", "5435"),
-    },
+        "HOST": host,
+        "PORT": port,
+        "CONN_HEALTH_CHECKS": True,
+        **extra,
+    }
+    if POSTGRES_POOL:
+        # psycopg pool per process, CONN_HEALTH_CHECKS makes it check connections before handing them out
+        database["OPTIONS"] = {
+            "pool": {
+                "min_size": int(environ.get("POSTGRES_POOL_MIN_SIZE", 2)),
+                "max_size": int(environ.get("POSTGRES_POOL_MAX_SIZE", 20)),
+                "timeout": float(environ.get("POSTGRES_POOL_TIMEOUT", 10)),
+                "max_idle": 300,
+            },
+        }
+    else:
+        database["CONN_MAX_AGE"] = int(environ.get("POSTGRES_CONN_MAX_AGE", 60))
+    return database
+
+
+DATABASES = {
+    "default": postgres_database(environ.get("POSTGRES_HOST", "localhost"), environ.get("POSTGRES_PORT", "5435")),
 }
 
+# "host:port,host:port", read-only endpoints are routed there by core.routers
+REPLICA_DATABASES = []
+for number, replica in enumerate(filter(None, environ.get("POSTGRES_REPLICAS", "").split(","))):
+    replica_host, _, replica_port = replica.strip().partition(":")
+    DATABASES[f"replica_{number}"] = postgres_database(replica_host, replica_port or "5432", TEST={"MIRROR": "default"})
+    REPLICA_DATABASES.append(f"replica_{number}")
+
+DATABASE_ROUTERS = ["core.routers.PrimaryReplicaRouter"]
+# after a write, the same token keeps reading from the primary for this long
+REPLICA_STICKY_SECONDS = int(environ.get("REPLICA_STICKY_SECONDS", 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -145,5 +197,60 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 ANTIFRAUD_ADDRESS = environ.get("ANTIFRAUD_ADDRESS")
+# seconds per antifraud attempt, a timed out check counts as failed
+ANTIFRAUD_TIMEOUT = float(environ.get("ANTIFRAUD_TIMEOUT", 2))
 REDIS_HOST = environ.get("REDIS_HOST", "redis")
-REDIS_PORT = environ.get("REDIS_PORT", 6379)
\ No newline at end of file
+REDIS_PORT = environ.get("REDIS_PORT", 6379)
+REDIS_DB = int(environ.get("REDIS_DB", 0))
+
+# async variants of the I/O-bound user endpoints, meant to be served by an ASGI worker
+ASYNC_VIEWS = environ.get("ASYNC_VIEWS", "1") == "1"
+# Server-Timing headers and the /api/metrics endpoint
+METRICS_ENABLED = environ.get("METRICS_ENABLED", "1") == "1"
+# Requests with "X-Profile-Token: <PROFILING_TOKEN>" and a PROFILING_SAMPLE_RATE share of all
+# requests are profiled, the same header unlocks /api/profiles. Both unset: profiler is off.
+PROFILING_TOKEN = environ.get("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(environ.get("PROFILING_SAMPLE_RATE", 0))
+PROFILING_INTERVAL = float(environ.get("PROFILING_INTERVAL", 0.002))
+PROFILING_DIR = environ.get("PROFILING_DIR", str(BASE_DIR / "profiles"))
+PROFILING_KEEP = int(environ.get("PROFILING_KEEP", 200))
+# statements slower than this are logged with their route (taken from the metrics middleware),
+# a share of the slow SELECTs also gets EXPLAIN (ANALYZE, BUFFERS). 0 turns the log off.
+SLOW_QUERY_THRESHOLD_MS = float(environ.get("SLOW_QUERY_THRESHOLD_MS", 200))
+SLOW_QUERY_EXPLAIN_RATE = float(environ.get("SLOW_QUERY_EXPLAIN_RATE", 0.1))
+SLOW_QUERY_LOG = environ.get("SLOW_QUERY_LOG", str(BASE_DIR / "logs" / "slow_queries.ndjson"))
+# W3C traceparent tracing: requests with a sampled traceparent and a TRACING_SAMPLE_RATIO share
+# of the others are traced, spans go to TRACING_FILE or, with TRACING_EXPORTER=otlp, to a collector
+TRACING_ENABLED = environ.get("TRACING_ENABLED", "0") == "1"
+TRACING_SAMPLE_RATIO = float(environ.get("TRACING_SAMPLE_RATIO", 0.01))
+TRACING_EXPORTER = environ.get("TRACING_EXPORTER", "file")
+TRACING_FILE = environ.get("TRACING_FILE", str(BASE_DIR / "logs" / "traces.ndjson"))
+TRACING_OTLP_ENDPOINT = environ.get("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACING_SERVICE_NAME = environ.get("TRACING_SERVICE_NAME", "promo-api")
+# rows per fetch of the streaming activation export, memory per export stays around one chunk
+EXPORT_CHUNK_SIZE = int(environ.get("EXPORT_CHUNK_SIZE", 2000))
+# background tasks (core.tasks) go through Redis to `manage.py run_tasks` workers,
+# TASKS_EAGER=1 runs them inline instead, e.g. locally without a worker
+TASKS_EAGER = environ.get("TASKS_EAGER", "0") == "1"
+TASKS_DEAD_LIMIT = int(environ.get("TASKS_DEAD_LIMIT", 1000))
+# relay_outbox appends outbox events to hourly NDJSON files in this directory
+OUTBOX_SINK_DIR = environ.get("OUTBOX_SINK_DIR", str(BASE_DIR / "outbox"))
+OUTBOX_BATCH_SIZE = int(environ.get("OUTBOX_BATCH_SIZE", 1000))
+# COMMON promos with max_count from COUNTER_SHARDS_MIN_COUNT up keep their inventory in
+# COUNTER_SHARDS slot rows instead of the promo row, so activations do not queue on one lock
+COUNTER_SHARDS = int(environ.get("COUNTER_SHARDS", 16))
+COUNTER_SHARDS_MIN_COUNT = int(environ.get("COUNTER_SHARDS_MIN_COUNT", 100000))
+# "database" takes COMMON activations from the counters in the transaction, "redis" reserves
+# them with a Lua script and `manage.py persist_reservations` writes them to Postgres afterwards,
+# which needs Redis with appendonly persistence
+COMMON_RESERVATIONS = environ.get("COMMON_RESERVATIONS", "database")
+RESERVATION_TTL = int(environ.get("RESERVATION_TTL", 60 * 60 * 24))
+# promos with queued_activation answer activations with a ticket, `manage.py run_activation_queue`
+# works them off in FIFO order, the result endpoint long-polls up to ACTIVATION_MAX_WAIT seconds
+ACTIVATION_TICKET_TTL = int(environ.get("ACTIVATION_TICKET_TTL", 60 * 60))
+ACTIVATION_MAX_WAIT = int(environ.get("ACTIVATION_MAX_WAIT", 25))
+
+# "database" keeps issuing authtoken rows, "signed" issues stateless HMAC tokens.
+# Both kinds are accepted on every request regardless of the mode.
+AUTH_TOKEN_MODE = environ.get("AUTH_TOKEN_MODE", "database")
+SIGNED_TOKEN_MAX_AGE = int(environ.get("SIGNED_TOKEN_MAX_AGE", 60 * 60 * 24))
\ No newline at end of file
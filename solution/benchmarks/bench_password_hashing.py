@@ -0,0 +1,86 @@
+"""
+Login hashing throughput: inline check_password vs the bounded hashing pool.
+
+    python benchmarks/bench_password_hashing.py --logins 200 --concurrency 32
+
+Also samples the latency of a cheap call running next to the login storm,
+which is what the other endpoints feel while passwords are being hashed.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+
+import django
+
+django.setup()  # the imports below need the configured settings
+
+from django.contrib.auth.hashers import check_password, make_password  # noqa: E402
+
+from core.hashing import hashing_pool, verify_password  # noqa: E402
+
+PASSWORD = "SuperStrongPassword2000!"
+
+
+class _Account:
+    def __init__(self, encoded):
+        self.password = encoded
+
+
+def _inline_login(encoded):
+    return check_password(PASSWORD, encoded)
+
+
+def _pooled_login(encoded):
+    return verify_password(PASSWORD, _Account(encoded))
+
+
+def _run(login, encoded, logins, concurrency):
+    probe_latencies = []
+    stop = False
+
+    def probe():
+        while not stop:
+            started = time.perf_counter()
+            sum(range(1000))
+            probe_latencies.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    with ThreadPoolExecutor(max_workers=concurrency + 1) as executor:
+        probe_future = executor.submit(probe)
+        started = time.perf_counter()
+        list(executor.map(lambda _: login(encoded), range(logins)))
+        elapsed = time.perf_counter() - started
+        stop = True
+        probe_future.result()
+
+    probe_latencies.sort()
+    return {
+        "logins_per_second": round(logins / elapsed, 1),
+        "elapsed_s": round(elapsed, 3),
+        "probe_p50_ms": round(statistics.median(probe_latencies) * 1000, 3),
+        "probe_p99_ms": round(probe_latencies[int(len(probe_latencies) * 0.99)] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    encoded = make_password(PASSWORD)
+    print("hasher:", encoded.split("$")[0], "pool:", hashing_pool.stats())
+    print("inline:", _run(_inline_login, encoded, args.logins, args.concurrency))
+    print("pooled:", _run(_pooled_login, encoded, args.logins, args.concurrency))
+    print("pool after run:", hashing_pool.stats())
+
+
+if __name__ == "__main__":
+    main()
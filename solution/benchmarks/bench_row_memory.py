@@ -0,0 +1,107 @@
+"""
+Memory of one list page: model instances vs values() dicts vs slotted rows.
+
+    python benchmarks/bench_row_memory.py --limit 100
+
+Measured with tracemalloc: bytes still held by the page and the number of
+allocated blocks while building it. The synthetic part builds the page from the
+same raw column tuples the database cursor returns, the feed part (skipped
+with --no-db or an empty database) loads a real feed page each way.
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+
+import django
+
+django.setup()  # the imports below need the configured settings
+
+from business.models import Business, Promocode  # noqa: E402
+from user.representations import PROMOCODE_FOR_USER_VALUES, PromocodeForUserRow  # noqa: E402
+
+PROMOCODE_FIELDS = [field.attname for field in Promocode._meta.concrete_fields]
+BUSINESS_FIELDS = [field.attname for field in Business._meta.concrete_fields]
+
+
+def _measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    page = build()
+    after = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    return {
+        "retained_kb": round(sum(stat.size_diff for stat in stats) / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "blocks": sum(stat.count_diff for stat in stats),
+        "rows": len(page),
+    }
+
+
+def bench_synthetic(limit):
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    promocode_values = [
+        (i, uuid.uuid4(), i, "Synthetic promo description", None, i, 100, 90, 0, 10, 0, now, None, "COMMON", now)
+        for i in range(limit)
+    ]
+    row_values = [
+        (uuid.uuid4(), uuid.uuid4(), "Company", "Synthetic promo description", None, now, None, "COMMON",
+         90, 0, True, False, 3, False, 5)
+        for _ in range(limit)
+    ]
+
+    def instances():
+        promocodes = []
+        for values in promocode_values:
+            promocode = Promocode.from_db("default", PROMOCODE_FIELDS, values)
+            company = Business.from_db("default", BUSINESS_FIELDS, [None] * len(BUSINESS_FIELDS))
+            promocode._state.fields_cache["company"] = company  # what select_related("company") leaves behind
+            promocodes.append(promocode)
+        return promocodes
+
+    print("model instances:", _measure(instances))
+    print("values() dicts: ", _measure(lambda: [dict(zip(PROMOCODE_FOR_USER_VALUES, values)) for values in row_values]))
+    print("slotted rows:   ", _measure(lambda: [PromocodeForUserRow(*values) for values in row_values]))
+
+
+def bench_feed(limit):
+    from user.models import User
+    from user.representations import annotate_promocodes_for_user, promocodes_for_user_rows
+    from user.views import feed_queryset
+
+    if not (user := User.objects.select_related("other").first()):
+        print("feed: no users in the database, skipped")
+        return
+
+    queryset = feed_queryset(user, {})
+    list(promocodes_for_user_rows(queryset, user)[:limit])  # warm up connection and caches
+
+    print("feed instances:", _measure(lambda: list(queryset.select_related("company")[:limit])))
+    print("feed dicts:    ", _measure(
+        lambda: list(annotate_promocodes_for_user(queryset, user).values(*PROMOCODE_FOR_USER_VALUES)[:limit])
+    ))
+    print("feed rows:     ", _measure(lambda: list(promocodes_for_user_rows(queryset, user)[:limit])))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--no-db", action="store_true")
+    args = parser.parse_args()
+
+    bench_synthetic(args.limit)
+    if not args.no_db:
+        bench_feed(args.limit)
+
+
+if __name__ == "__main__":
+    main()
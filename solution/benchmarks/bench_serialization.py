@@ -0,0 +1,109 @@
+"""
+Feed page serialization: PromocodeForUserSerializer + JSONRenderer vs the
+values() fast path + ORJSONRenderer.
+
+    python benchmarks/bench_serialization.py --pages 50 --limit 50
+
+The renderer part runs on synthetic rows and needs nothing. The feed part reads
+the first user's feed from the configured database, so run it against a filled
+one (e.g. after the tavern suite or a dataset import) and skip it with --no-db.
+CPU time is process_time, so waiting on the database is not counted.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+
+import django
+
+django.setup()  # the imports below need the configured settings
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from core.renderers import ORJSONRenderer  # noqa: E402
+
+
+def _synthetic_page(limit):
+    return [
+        {
+            "promo_id": uuid.uuid4(),
+            "company_id": uuid.uuid4(),
+            "company_name": "Benchmark company",
+            "description": "Synthetic promo description " * 3,
+            "image_url": "https://cdn.example.com/image.jpg",
+            "active": True,
+            "is_activated_by_user": False,
+            "like_count": i,
+            "is_liked_by_user": bool(i % 2),
+            "comment_count": i * 2,
+            "created_at": datetime(2025, 1, 1, tzinfo=timezone.utc),
+        }
+        for i in range(limit)
+    ]
+
+
+def _measure(fn, pages):
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    for _ in range(pages):
+        fn()
+    return {
+        "cpu_ms_per_page": round((time.process_time() - cpu_started) * 1000 / pages, 3),
+        "wall_ms_per_page": round((time.perf_counter() - wall_started) * 1000 / pages, 3),
+    }
+
+
+def bench_renderers(pages, limit):
+    page = _synthetic_page(limit)
+    print("render json:  ", _measure(lambda: JSONRenderer().render(page), pages))
+    print("render orjson:", _measure(lambda: ORJSONRenderer().render(page), pages))
+
+
+def bench_feed(pages, limit):
+    from user.models import User
+    from user.representations import promocodes_for_user_rows, promocodes_for_user_representation
+    from user.serializers import PromocodeForUserSerializer
+    from user.views import feed_queryset
+
+    if not (user := User.objects.select_related("other").first()):
+        print("feed: no users in the database, skipped")
+        return
+
+    queryset = feed_queryset(user, {})
+
+    def serializer_path():
+        promocodes = list(queryset[:limit])
+        data = PromocodeForUserSerializer(promocodes, many=True, context={"user": user}).data
+        return JSONRenderer().render(data)
+
+    def fast_path():
+        rows = list(promocodes_for_user_rows(queryset, user)[:limit])
+        return ORJSONRenderer().render(promocodes_for_user_representation(rows))
+
+    for name, fn in (("serializer", serializer_path), ("fast path ", fast_path)):
+        with CaptureQueriesContext(connection) as queries:
+            fn()
+        print(f"feed {name}:", {**_measure(fn, pages), "queries_per_page": len(queries)})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--no-db", action="store_true")
+    args = parser.parse_args()
+
+    bench_renderers(args.pages, args.limit)
+    if not args.no_db:
+        bench_feed(args.pages, args.limit)
+
+
+if __name__ == "__main__":
+    main()
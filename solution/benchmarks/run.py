@@ -0,0 +1,386 @@
+"""
+Endpoint benchmark: every route of user/urls.py and business/urls.py under load.
+
+    python benchmarks/run.py --requests 500 --concurrency 32 --output report.json
+    python benchmarks/run.py --compare benchmarks/baseline.json --threshold 0.15
+
+Needs Postgres and Redis reachable with the usual POSTGRES_* / REDIS_* variables.
+The runner migrates, starts an antifraud stand-in and the app the same way the
+Dockerfile does (gunicorn + uvicorn worker), seeds companies, promos and users
+through the API and then hits each endpoint --requests times from --concurrency
+threads. Use --base-url to benchmark an already running app instead; its
+ANTIFRAUD_ADDRESS has to point somewhere that answers.
+
+Queries per request come from the Server-Timing header (METRICS_ENABLED=1).
+With --compare, p95 latency or queries per request growing by more than
+--threshold against the stored report is a regression and the exit code is 1.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+SOLUTION_DIR = Path(__file__).resolve().parent.parent
+PASSWORD = "SuperStrongPassword2000!"
+QUERIES_RE = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _AntifraudHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        cache_until = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S.%f")
+        body = json.dumps({"ok": True, "cache_until": cache_until}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_antifraud() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", _free_port()), _AntifraudHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_app(port: int, antifraud_address: str, workers: int) -> subprocess.Popen:
+    env = {**os.environ, "ANTIFRAUD_ADDRESS": antifraud_address, "METRICS_ENABLED": "1"}
+    subprocess.run([sys.executable, "manage.py", "migrate", "--no-input"], cwd=SOLUTION_DIR, env=env, check=True)
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "app.asgi:application",
+            "-k", "uvicorn_worker.UvicornWorker", "-b", f"127.0.0.1:{port}", "-w", str(workers),
+        ],
+        cwd=SOLUTION_DIR,
+        env=env,
+        start_new_session=True,
+    )
+    for _ in range(100):
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/api/ping", timeout=1).status_code == 200:
+                return process
+        except requests.ConnectionError:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.2)
+    stop_app(process)
+    raise RuntimeError("app did not start")
+
+
+def stop_app(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+class Client:
+    """requests.Session per thread, sessions are not thread-safe."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def request(self, method, path, token=None, **kwargs) -> requests.Response:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        return self.session.request(method, f"{self.base_url}{path}", headers=headers, timeout=60, **kwargs)
+
+    def json(self, method, path, token=None, expected=(200, 201), **kwargs) -> dict:
+        response = self.request(method, path, token, **kwargs)
+        if response.status_code not in expected:
+            raise RuntimeError(f"{method} {path}: {response.status_code} {response.text[:200]}")
+        return response.json()
+
+
+_unique = itertools.count()
+
+
+def _email(prefix: str) -> str:
+    return f"{prefix}-{next(_unique)}-{uuid.uuid4().hex[:8]}@bench.example.com"
+
+
+def register_business(client: Client) -> tuple[str, str]:
+    email = _email("company")
+    data = client.json("POST", "/business/auth/sign-up", json={"name": "Benchmark company", "email": email, "password": PASSWORD})
+    return email, data["token"]
+
+
+def register_user(client: Client, country="ru") -> tuple[str, str]:
+    email = _email("user")
+    data = client.json("POST", "/user/auth/sign-up", json={
+        "name": "Bench", "surname": "User", "email": email, "password": PASSWORD,
+        "other": {"age": 25, "country": country},
+    })
+    return email, data["token"]
+
+
+def create_promo(client: Client, token: str, number: int) -> str:
+    if number % 4 == 0:
+        body = {"mode": "UNIQUE", "promo_unique": [f"code-{number}-{i}" for i in range(50)], "max_count": 1}
+    else:
+        body = {"mode": "COMMON", "promo_common": f"common-{number}", "max_count": 100000000}
+    body.update({
+        "description": f"Benchmark promo number {number}",
+        "target": {"categories": ["bench", f"category{number % 10}"]} if number % 2 else {},
+    })
+    return client.json("POST", "/business/promo", token, json=body)["id"]
+
+
+def seed(client: Client, args) -> dict:
+    """Companies with promos, users with likes, comments and activations on them."""
+    state = {}
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        state["companies"] = list(executor.map(lambda _: register_business(client), range(args.companies)))
+        promo_jobs = [
+            (token, company * args.promos_per_company + number)
+            for company, (_, token) in enumerate(state["companies"])
+            for number in range(args.promos_per_company)
+        ]
+        state["promos"] = list(executor.map(lambda job: create_promo(client, *job), promo_jobs))
+        state["users"] = list(executor.map(lambda _: register_user(client), range(args.users)))
+
+        def engage(user_index):
+            _, token = state["users"][user_index]
+            promos = state["promos"][user_index % 7::7][:20]
+            client.json("POST", "/user/promo/likes", token, json={
+                "actions": [{"promo_id": promo, "action": "like"} for promo in promos],
+            })
+            comments = []
+            for promo in promos[:5]:
+                comment = client.json("POST", f"/user/promo/{promo}/comments", token, json={"text": "Benchmark comment text"})
+                comments.append((promo, comment["id"]))
+            for promo in promos[:3]:
+                client.request("POST", f"/user/promo/{promo}/activate", token)
+            return comments
+
+        state["comments"] = list(executor.map(engage, range(len(state["users"]))))
+    return state
+
+
+def create_comments(client: Client, token: str, promos: list, count: int) -> list[tuple[str, str]]:
+    def create(i):
+        promo = promos[i % len(promos)]
+        return promo, client.json("POST", f"/user/promo/{promo}/comments", token, json={"text": "Comment to delete"})["id"]
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        return list(executor.map(create, range(count)))
+
+
+def scenarios(state: dict, client: Client, total: int) -> list:
+    """
+    (name, callable(i) -> Response); callables only use accounts nobody else logs into.
+    DELETE gets total comments of its own, created here, one per request.
+    """
+    _, company_token = state["companies"][0]
+    company_promos = state["promos"][:len(state["promos"]) // len(state["companies"])]
+    common_promos = [promo for number, promo in enumerate(company_promos) if number % 4]
+    _, user_token = state["users"][0]
+    promos = state["promos"]
+    own_comments = state["comments"][0]
+    _, deleting_token = register_user(client)
+    deletable_comments = create_comments(client, deleting_token, promos, total)
+
+    login_company, _ = register_business(client)
+    login_user, _ = register_user(client)
+
+    def pick(items, i):
+        return items[i % len(items)]
+
+    return [
+        ("GET /ping", lambda i: client.request("GET", "/ping")),
+        ("POST /business/auth/sign-up", lambda i: client.request("POST", "/business/auth/sign-up", json={
+            "name": "Benchmark company", "email": _email("company"), "password": PASSWORD,
+        })),
+        ("POST /business/auth/sign-in", lambda i: client.request("POST", "/business/auth/sign-in", json={
+            "email": login_company, "password": PASSWORD,
+        })),
+        ("POST /business/promo", lambda i: client.request("POST", "/business/promo", company_token, json={
+            "description": "Benchmark promo created under load", "target": {}, "max_count": 10,
+            "mode": "COMMON", "promo_common": f"load-{i}",
+        })),
+        ("GET /business/promo", lambda i: client.request("GET", "/business/promo?limit=10", company_token)),
+        ("GET /business/promo/<uuid>", lambda i: client.request("GET", f"/business/promo/{pick(company_promos, i)}", company_token)),
+        ("PATCH /business/promo/<uuid>", lambda i: client.request(
+            "PATCH", f"/business/promo/{pick(common_promos, i)}", company_token, json={"description": f"Updated promo {i}"},
+        )),
+        ("GET /business/promo/<uuid>/stat", lambda i: client.request("GET", f"/business/promo/{pick(company_promos, i)}/stat", company_token)),
+        ("POST /user/auth/sign-up", lambda i: client.request("POST", "/user/auth/sign-up", json={
+            "name": "Bench", "surname": "User", "email": _email("user"), "password": PASSWORD,
+            "other": {"age": 25, "country": "ru"},
+        })),
+        ("POST /user/auth/sign-in", lambda i: client.request("POST", "/user/auth/sign-in", json={
+            "email": login_user, "password": PASSWORD,
+        })),
+        ("GET /user/profile", lambda i: client.request("GET", "/user/profile", user_token)),
+        ("PATCH /user/profile", lambda i: client.request("PATCH", "/user/profile", user_token, json={"name": f"Bench{i % 10}"})),
+        ("GET /user/feed", lambda i: client.request("GET", "/user/feed?limit=10", user_token)),
+        ("GET /user/feed?category", lambda i: client.request("GET", "/user/feed?limit=10&category=bench&active=true", user_token)),
+        ("GET /user/promo/history", lambda i: client.request("GET", "/user/promo/history?limit=10", user_token)),
+        ("POST /user/promo/likes", lambda i: client.request("POST", "/user/promo/likes", user_token, json={
+            "actions": [{"promo_id": pick(promos, i + shift), "action": "like"} for shift in range(5)],
+        })),
+        ("GET /user/promo/<uuid>", lambda i: client.request("GET", f"/user/promo/{pick(promos, i)}", user_token)),
+        ("POST /user/promo/<uuid>/like", lambda i: client.request("POST", f"/user/promo/{pick(promos, i)}/like", user_token)),
+        ("DELETE /user/promo/<uuid>/like", lambda i: client.request("DELETE", f"/user/promo/{pick(promos, i)}/like", user_token)),
+        ("GET /user/promo/<uuid>/comments", lambda i: client.request("GET", f"/user/promo/{pick(promos, i)}/comments?limit=10", user_token)),
+        ("POST /user/promo/<uuid>/comments", lambda i: client.request(
+            "POST", f"/user/promo/{pick(promos, i)}/comments", user_token, json={"text": "Comment written under load"},
+        )),
+        ("GET /user/promo/<uuid>/comments/<uuid>", lambda i: client.request(
+            "GET", "/user/promo/{}/comments/{}".format(*pick(own_comments, i)), user_token,
+        )),
+        ("PUT /user/promo/<uuid>/comments/<uuid>", lambda i: client.request(
+            "PUT", "/user/promo/{}/comments/{}".format(*pick(own_comments, i)), user_token, json={"text": f"Edited comment {i}"},
+        )),
+        ("DELETE /user/promo/<uuid>/comments/<uuid>", lambda i: client.request(
+            "DELETE", "/user/promo/{}/comments/{}".format(*deletable_comments[i]), deleting_token,
+        )),
+        ("POST /user/promo/<uuid>/activate", lambda i: client.request("POST", f"/user/promo/{pick(common_promos, i)}/activate", user_token)),
+    ]
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def run_scenario(call, total: int, concurrency: int) -> dict:
+    latencies, queries, errors = [], [], 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        started = time.perf_counter()
+        response = call(i)
+        elapsed = time.perf_counter() - started
+        match = QUERIES_RE.search(response.headers.get("Server-Timing", ""))
+        with lock:
+            latencies.append(elapsed)
+            if match:
+                queries.append(int(match.group(1)))
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "queries_per_request": round(statistics.mean(queries), 2) if queries else None,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, current in report["endpoints"].items():
+        if not (previous := baseline["endpoints"].get(name)):
+            continue
+        for metric in ("p95_ms", "queries_per_request"):
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            if after > before * (1 + threshold) and after - before > (0.5 if metric == "queries_per_request" else 1.0):
+                regressions.append(f"{name}: {metric} {before} -> {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", help="benchmark a running app, e.g. http://localhost:8080/api")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=300, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--companies", type=int, default=5)
+    parser.add_argument("--promos-per-company", type=int, default=40)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--only", help="substring filter on endpoint names")
+    parser.add_argument("--output", default=f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    parser.add_argument("--compare", help="baseline report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    antifraud, app = None, None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        antifraud = start_antifraud()
+        port = _free_port()
+        app = start_app(port, f"127.0.0.1:{antifraud.server_address[1]}", args.workers)
+        base_url = f"http://127.0.0.1:{port}/api"
+
+    try:
+        client = Client(base_url)
+        seed_started = time.perf_counter()
+        state = seed(client, args)
+        print(f"seeded {len(state['promos'])} promos, {len(state['users'])} users in {time.perf_counter() - seed_started:.1f}s")
+
+        report = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "config": {
+                key: getattr(args, key)
+                for key in ("workers", "requests", "concurrency", "companies", "promos_per_company", "users")
+            },
+            "python": platform.python_version(),
+            "endpoints": {},
+        }
+        for name, call in scenarios(state, client, args.requests):
+            if args.only and args.only not in name:
+                continue
+            report["endpoints"][name] = result = run_scenario(call, args.requests, args.concurrency)
+            print(f"{name:45} {result}")
+    finally:
+        if app:
+            stop_app(app)
+        if antifraud:
+            antifraud.shutdown()
+
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print("report:", args.output)
+
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text()), args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import random
+
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from app.settings import COUNTER_SHARDS, COUNTER_SHARDS_MIN_COUNT
+from .models import Promocode, PromocodeCounterShard
+
+# Inventory of COMMON promos. A promo keeps common_count on its own row, or, when
+# shard_count > 0, spreads it over that many PromocodeCounterShard rows so concurrent
+# activations lock different rows. Either way an activation is one conditional
+# UPDATE ... WHERE remaining > 0, which cannot oversell: a claim that finds its row
+# empty changes nothing and tries elsewhere. Reads sum the shards, see common_left.
+
+
+def wants_shards(mode: str, max_count: int) -> bool:
+    return mode == "COMMON" and COUNTER_SHARDS > 1 and max_count >= COUNTER_SHARDS_MIN_COUNT
+
+
+def _forget_totals(promocode: Promocode) -> None:
+    for name in ("common_left", "common_used", "_shard_totals"):
+        promocode.__dict__.pop(name, None)
+
+
+def _split(total: int, parts: int) -> list[int]:
+    return [total // parts + (1 if slot < total % parts else 0) for slot in range(parts)]
+
+
+def create_shards(promocode: Promocode, shard_count: int = COUNTER_SHARDS) -> None:
+    """Moves the row counters of a promo into shard_count new shards, call with the promo row locked."""
+    remaining = _split(promocode.common_count, shard_count)
+    activations = _split(promocode.common_activations_count, shard_count)
+    PromocodeCounterShard.objects.bulk_create([
+        PromocodeCounterShard(promocode=promocode, slot=slot, remaining=remaining[slot], activations=activations[slot])
+        for slot in range(shard_count)
+    ])
+    promocode.shard_count = shard_count
+    promocode.common_count = promocode.common_activations_count = 0
+    promocode.save(update_fields=["shard_count", "common_count", "common_activations_count", "updated_at"])
+    _forget_totals(promocode)
+
+
+def merge_shards(promocode: Promocode) -> None:
+    """Folds the shards back into the row counters, call with the promo row locked."""
+    totals = rebalance_shards(promocode)
+    promocode.shards.all().delete()
+    promocode.shard_count = 0
+    promocode.common_count, promocode.common_activations_count = totals
+    promocode.save(update_fields=["shard_count", "common_count", "common_activations_count", "updated_at"])
+    _forget_totals(promocode)
+
+
+def rebalance_shards(promocode: Promocode, remaining: int = None, activations: int = None,
+                     delta: int = 0) -> tuple[int, int]:
+    """
+    Locks every shard and spreads the given totals evenly over them, the current
+    totals when omitted, with delta added to the remaining one. Returns the totals.
+    Claims wait for the locks meanwhile. Call inside a transaction.
+    """
+    shards = list(promocode.shards.select_for_update().order_by("slot"))
+    if remaining is None:
+        remaining = sum(shard.remaining for shard in shards)
+    remaining = max(remaining + delta, 0)
+    if activations is None:
+        activations = sum(shard.activations for shard in shards)
+
+    now = timezone.now()  # bulk_update skips auto_now
+    for shard, shard_remaining, shard_activations in zip(
+            shards, _split(remaining, len(shards)), _split(activations, len(shards))
+    ):
+        shard.remaining, shard.activations, shard.updated_at = shard_remaining, shard_activations, now
+    PromocodeCounterShard.objects.bulk_update(shards, ["remaining", "activations", "updated_at"])
+    _forget_totals(promocode)
+    return remaining, activations
+
+
+def claim_common(promocode: Promocode) -> bool:
+    """Takes one activation from the inventory, False when it ran out. Call inside the activation's transaction."""
+    if not promocode.shard_count:
+        return bool(Promocode.objects.filter(pk=promocode.pk, common_count__gt=0).update(
+            common_count=F("common_count") - 1,
+            common_activations_count=F("common_activations_count") + 1,
+            updated_at=Now(),
+        ))
+
+    def claim(**lookup):
+        return PromocodeCounterShard.objects.filter(promocode=promocode, remaining__gt=0, **lookup).update(
+            remaining=F("remaining") - 1,
+            activations=F("activations") + 1,
+            updated_at=Now(),
+        )
+
+    if claim(slot=random.randrange(promocode.shard_count)):
+        return True
+    # the slot ran dry: only the shards that still have something, in random order
+    slots = list(PromocodeCounterShard.objects.filter(promocode=promocode, remaining__gt=0).values_list("slot", flat=True))
+    random.shuffle(slots)
+    return any(claim(slot=slot) for slot in slots)
+
+
+def resize_common(promocode: Promocode, delta: int) -> list[str]:
+    """
+    Adds delta (max_count change) to the remaining inventory of a promo whose row is
+    locked. Returns the changed promo fields for the caller's save().
+    """
+    if not delta:
+        return []
+    if promocode.shard_count:
+        rebalance_shards(promocode, delta=delta)
+        return []
+    promocode.common_count = max(promocode.common_count + delta, 0)
+    return ["common_count"]
@@ -0,0 +1,82 @@
+import csv
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.db.models.functions import Lower
+
+from app.settings import EXPORT_CHUNK_SIZE
+from .models import PromocodeCommonActivation, PromocodeUniqueActivation
+
+# Streaming export of a promo's activations. Rows are written out as they are
+# fetched, a chunk at a time, so memory does not grow with the number of
+# activations. Under WSGI the rows come from a server-side cursor; under ASGI
+# the response is an async generator fetching keyset chunks, so no thread or
+# cursor is held while waiting on a slow client.
+
+EXPORT_COLUMNS = ("activated_at", "user_id", "country", "promo")
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def activations_rows(promocode):
+    """(pk, *EXPORT_COLUMNS) tuples in pk order, the pk is the keyset cursor."""
+    if promocode.mode == "UNIQUE":
+        activations = PromocodeUniqueActivation.objects.filter(promocode_instanse__promocode_set=promocode)
+    else:
+        activations = PromocodeCommonActivation.objects.filter(promocode_instanse__promocode_set=promocode)
+    return activations.annotate(country=Lower("user__other__country")).order_by("pk").values_list(
+        "pk", "created_at", "user__uuid", "country", "promocode_instanse__promocode"
+    )
+
+
+class _Line:
+    """File-like target for csv.writer that hands back the formatted line."""
+
+    def write(self, value):
+        return value
+
+
+_csv_writer = csv.writer(_Line())
+
+
+def _encoder(output):
+    if output == "csv":
+        def encode(row):
+            activated_at, user_id, country, promo = row
+            return _csv_writer.writerow((activated_at.isoformat(), user_id, country, promo)).encode()
+
+        return _csv_writer.writerow(EXPORT_COLUMNS).encode(), encode
+
+    def encode(row):
+        return orjson.dumps(dict(zip(EXPORT_COLUMNS, row)), option=orjson.OPT_APPEND_NEWLINE)
+
+    return b"", encode
+
+
+def stream_activations(rows, output):
+    """Sync body: one server-side cursor, EXPORT_CHUNK_SIZE rows per round trip."""
+    header, encode = _encoder(output)
+    if header:
+        yield header
+    lines = []
+    for pk, *row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        lines.append(encode(row))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield b"".join(lines)
+            lines.clear()
+    if lines:
+        yield b"".join(lines)
+
+
+async def astream_activations(rows, output):
+    """Async body: every chunk is a short keyset query, nothing is held across awaits."""
+    header, encode = _encoder(output)
+    if header:
+        yield header
+    last_pk = 0
+    while chunk := await sync_to_async(list)(rows.filter(pk__gt=last_pk)[:EXPORT_CHUNK_SIZE]):
+        yield b"".join(encode(row) for pk, *row in chunk)
+        last_pk = chunk[-1][0]
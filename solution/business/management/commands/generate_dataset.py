@@ -0,0 +1,327 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from business.models import Business, Target, Promocode, PromocodeCommonInstance, PromocodeUniqueInstance, \
+    PromocodeAction, Comment, PromocodeActivation, PromocodeCommonActivation, PromocodeUniqueActivation
+from core.models import EmailPasswordUser
+from user.models import User, TargetInfo
+
+COUNTRIES = ("ru", "kz", "by", "uz", "am", "ge", "us", "de", "gb", "fr", "tr", "cn")
+COUNTRY_WEIGHTS = (55, 10, 7, 5, 3, 3, 4, 3, 3, 2, 3, 2)
+CATEGORIES = ("food", "travel", "tech", "fashion", "sport", "beauty", "kids", "books", "games", "music", "auto", "home")
+COMMENT_TEXTS = (
+    "Отличный промокод, сработал с первого раза!",
+    "Скидка применилась, но только на часть товаров.",
+    "Пользуюсь уже второй месяц, всем советую.",
+    "Не понял условий акции, поясните пожалуйста.",
+    "Промокод не подошёл для моего региона.",
+)
+
+
+class _CopyWriter:
+    """
+    COPY into the own table of one model, multi-table parents are written separately.
+    Fields missing from a row get the model default, uuids come from the seeded rng.
+    """
+
+    def __init__(self, cursor, model, rng, now):
+        self.fields = model._meta.local_concrete_fields
+        self.rng = rng
+        self.now = now
+        self.rows = 0
+        quote_name = connection.ops.quote_name
+        columns = ", ".join(quote_name(field.column) for field in self.fields)
+        self._copy_manager = cursor.cursor.copy(f"COPY {quote_name(model._meta.db_table)} ({columns}) FROM STDIN")
+
+    def __enter__(self):
+        self._copy = self._copy_manager.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._copy_manager.__exit__(*exc_info)
+
+    def _default(self, field):
+        if isinstance(field, models.UUIDField):
+            return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+            return self.now
+        return field.get_default()
+
+    def write(self, **values):
+        self._copy.write_row([
+            values[field.attname] if field.attname in values else self._default(field)
+            for field in self.fields
+        ])
+        self.rows += 1
+
+
+class _PromoPlan:
+    __slots__ = ("company_id", "mode", "codes", "activations", "max_count")
+
+    def __init__(self, company_id, mode, codes, activations, max_count):
+        self.company_id = company_id
+        self.mode = mode
+        self.codes = codes
+        self.activations = activations
+        self.max_count = max_count
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-loads a synthetic dataset with COPY: companies, users, promos with targets, unique codes, "
+        "likes, comments and activations. Same --seed on the same database gives the same rows. "
+        "Every generated account signs in with --password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--businesses", type=int, default=200)
+        parser.add_argument("--users", type=int, default=200_000)
+        parser.add_argument("--promos", type=int, default=20_000)
+        parser.add_argument("--unique-share", type=float, default=0.3, help="share of promos in UNIQUE mode")
+        parser.add_argument("--codes-per-unique-promo", type=int, default=1000)
+        parser.add_argument("--activations-per-promo", type=int, default=50, help="average")
+        parser.add_argument("--likes-per-user", type=int, default=15, help="average")
+        parser.add_argument("--comments", type=int, default=500_000)
+        parser.add_argument("--password", default="SuperStrongPassword2000!")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("generate_dataset loads data with COPY and needs PostgreSQL.")
+        if not options["businesses"] or not options["users"]:
+            raise CommandError("--businesses and --users must be positive.")
+
+        self.rng = random.Random(options["seed"])
+        self.now = timezone.now()
+        self.options = options
+        started = time.perf_counter()
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.cursor = cursor
+            self.ids = {
+                model: (model.objects.aggregate(max_id=Max("pk"))["max_id"] or 0) + 1
+                for model in (EmailPasswordUser, TargetInfo, Target, Promocode, PromocodeCommonInstance,
+                              PromocodeUniqueInstance, PromocodeAction, Comment, PromocodeActivation)
+            }
+            self.user_ids = range(self.ids[EmailPasswordUser], self.ids[EmailPasswordUser] + options["users"])
+            self.business_ids = range(self.user_ids.stop, self.user_ids.stop + options["businesses"])
+
+            self._accounts(make_password(options["password"]))
+            plans = self._plan_promos()
+            self._promos(plans)
+            self._codes(plans)
+            self._activations(plans)
+            self._likes(len(plans))
+            self._comments(len(plans))
+
+            for sql in connection.ops.sequence_reset_sql(no_style(), list(self.ids)):
+                cursor.execute(sql)
+
+        self.stdout.write(self.style.SUCCESS(f"done in {time.perf_counter() - started:.1f}s"))
+
+    def _writer(self, model):
+        return _CopyWriter(self.cursor, model, self.rng, self.now)
+
+    def _report(self, writer, model, started):
+        self.stdout.write(f"{model._meta.db_table}: {writer.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    def _table(self, model, rows):
+        started = time.perf_counter()
+        with self._writer(model) as writer:
+            for row in rows:
+                writer.write(**row)
+        self._report(writer, model, started)
+
+    def _past(self, days):
+        return self.now - timedelta(seconds=self.rng.randrange(days * 86400))
+
+    def _accounts(self, password):
+        target_info_start = self.ids[TargetInfo]
+
+        def target_infos():
+            for offset in range(len(self.user_ids)):
+                yield {
+                    "id": target_info_start + offset,
+                    "age": min(100, int(self.rng.triangular(14, 80, 27))),
+                    "country": self.rng.choices(COUNTRIES, COUNTRY_WEIGHTS)[0],
+                }
+
+        def accounts():
+            for model_type, ids in (("USER", self.user_ids), ("BUSINESS", self.business_ids)):
+                for pk in ids:
+                    email = f"{model_type.lower()}{pk}@dataset.example.com"
+                    yield {
+                        "id": pk, "email": email, "username": email, "password": password,
+                        "model_type": model_type, "date_joined": self._past(365),
+                    }
+
+        self._table(TargetInfo, target_infos())
+        self._table(EmailPasswordUser, accounts())
+        self._table(User, (
+            {
+                "emailpassworduser_ptr_id": pk,
+                "name": f"Имя{pk % 1000}",
+                "surname": f"Фамилия{pk % 997}",
+                "avatar_url": None,
+                "other_id": target_info_start + offset,
+            }
+            for offset, pk in enumerate(self.user_ids)
+        ))
+        self._table(Business, (
+            {"emailpassworduser_ptr_id": pk, "name": f"Компания {pk}"} for pk in self.business_ids
+        ))
+
+    def _plan_promos(self):
+        average = self.options["activations_per_promo"]
+        plans = []
+        for _ in range(self.options["promos"]):
+            company_id = self.rng.choice(self.business_ids)
+            activations = self.rng.randint(0, 2 * average)
+            if self.rng.random() < self.options["unique_share"]:
+                codes = self.options["codes_per_unique_promo"]
+                plans.append(_PromoPlan(company_id, "UNIQUE", codes, min(activations, codes), 1))
+            else:
+                max_count = self.rng.choice((100, 1000, 10_000, 100_000))
+                plans.append(_PromoPlan(company_id, "COMMON", 1, min(activations, max_count), max_count))
+        return plans
+
+    def _target(self, pk):
+        kind = self.rng.random()
+        target = {"id": pk, "age_from": None, "age_until": None, "country": None, "categories": None}
+        if kind < 0.35:
+            return target
+        if kind < 0.6:
+            target["age_from"] = self.rng.randint(14, 30)
+            target["age_until"] = min(100, target["age_from"] + self.rng.randint(5, 40))
+        elif kind < 0.8:
+            target["country"] = self.rng.choices(COUNTRIES, COUNTRY_WEIGHTS)[0]
+        else:
+            target["categories"] = self.rng.sample(CATEGORIES, self.rng.randint(1, 3))
+            if self.rng.random() < 0.3:
+                target["country"] = self.rng.choices(COUNTRIES, COUNTRY_WEIGHTS)[0]
+        return target
+
+    def _active_window(self):
+        kind = self.rng.random()
+        if kind < 0.5:
+            return None, None
+        if kind < 0.7:
+            return self._past(60), None
+        if kind < 0.85:
+            return None, self.now + timedelta(days=self.rng.randint(1, 90))
+        if kind < 0.95:
+            return self._past(120) - timedelta(days=120), self._past(30)  # expired
+        return self.now + timedelta(days=self.rng.randint(1, 30)), None
+
+    def _promos(self, plans):
+        target_start, promo_start = self.ids[Target], self.ids[Promocode]
+        self._table(Target, (self._target(target_start + number) for number in range(len(plans))))
+
+        def promos():
+            for number, plan in enumerate(plans):
+                active_from, active_until = self._active_window()
+                created_at = self._past(180)
+                is_common = plan.mode == "COMMON"
+                yield {
+                    "id": promo_start + number,
+                    "company_id": plan.company_id,
+                    "description": f"Промо-акция номер {number}: скидки для постоянных клиентов",
+                    "image_url": None,
+                    "target_id": target_start + number,
+                    "max_count": plan.max_count,
+                    "common_count": plan.max_count - plan.activations if is_common else 0,
+                    "unique_count": 0 if is_common else plan.codes - plan.activations,
+                    "common_activations_count": plan.activations if is_common else 0,
+                    "unique_activations_count": 0 if is_common else plan.activations,
+                    "active_from": active_from,
+                    "active_until": active_until,
+                    "mode": plan.mode,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+
+        self._table(Promocode, promos())
+
+    def _code_ranges(self, plans):
+        """(promo_id, first code id) per promo, code ids are handed out in promo order."""
+        promo_start = self.ids[Promocode]
+        next_code = {"COMMON": self.ids[PromocodeCommonInstance], "UNIQUE": self.ids[PromocodeUniqueInstance]}
+        for number, plan in enumerate(plans):
+            yield promo_start + number, plan, next_code[plan.mode]
+            next_code[plan.mode] += plan.codes
+
+    def _codes(self, plans):
+        ranges = list(self._code_ranges(plans))
+        self._table(PromocodeCommonInstance, (
+            {"id": first_code, "promocode": f"common-{promo_id}", "is_activated": False, "promocode_set_id": promo_id}
+            for promo_id, plan, first_code in ranges if plan.mode == "COMMON"
+        ))
+        self._table(PromocodeUniqueInstance, (
+            {
+                "id": first_code + offset,
+                "promocode": f"u{promo_id}-{offset}",
+                "is_activated": offset < plan.activations,  # the first codes are the activated ones
+                "promocode_set_id": promo_id,
+            }
+            for promo_id, plan, first_code in ranges if plan.mode == "UNIQUE"
+            for offset in range(plan.codes)
+        ))
+
+    def _activations(self, plans):
+        ranges = list(self._code_ranges(plans))
+        activation_start = self.ids[PromocodeActivation]
+        self._table(PromocodeActivation, (
+            {"id": activation_start + number, "user_id": self.rng.choice(self.user_ids)}
+            for number in range(sum(plan.activations for plan in plans))
+        ))
+
+        def children(mode):
+            activation_id = activation_start
+            for _, plan, first_code in ranges:
+                for offset in range(plan.activations):
+                    if plan.mode == mode:
+                        yield {
+                            "promocodeactivation_ptr_id": activation_id,
+                            "promocode_instanse_id": first_code + (offset if mode == "UNIQUE" else 0),
+                            "created_at": self._past(90),
+                        }
+                    activation_id += 1
+
+        self._table(PromocodeCommonActivation, children("COMMON"))
+        self._table(PromocodeUniqueActivation, children("UNIQUE"))
+
+    def _likes(self, promo_count):
+        promo_start, like_start = self.ids[Promocode], self.ids[PromocodeAction]
+        average = self.options["likes_per_user"]
+
+        def likes():
+            pk = like_start
+            for user_id in self.user_ids:
+                count = min(promo_count, self.rng.randint(0, 2 * average))
+                for promo_offset in self.rng.sample(range(promo_count), count):
+                    yield {"id": pk, "promocode_id": promo_start + promo_offset, "user_id": user_id, "type": "like"}
+                    pk += 1
+
+        self._table(PromocodeAction, likes())
+
+    def _comments(self, promo_count):
+        promo_start, comment_start = self.ids[Promocode], self.ids[Comment]
+        self._table(Comment, (
+            {
+                "id": comment_start + number,
+                "promocode_id": promo_start + self.rng.randrange(promo_count),
+                "user_id": self.rng.choice(self.user_ids),
+                "text": self.rng.choice(COMMENT_TEXTS),
+                "created_at": self._past(90),
+            }
+            for number in range(self.options["comments"] if promo_count else 0)
+        ))
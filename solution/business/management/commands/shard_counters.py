@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from business.counters import create_shards, merge_shards
+from business.models import Promocode
+
+
+class Command(BaseCommand):
+    help = "Moves the counters of a COMMON promo into N shard rows, or back onto the promo row with --shards 0."
+
+    def add_arguments(self, parser):
+        parser.add_argument("promo_id", help="uuid of the promo")
+        parser.add_argument("--shards", type=int, required=True, help="number of shards, 0 to merge them back")
+
+    def handle(self, *args, promo_id, shards, **options):
+        if not 0 <= shards <= 1024:
+            raise CommandError("--shards must be between 0 and 1024")
+
+        with transaction.atomic():
+            if not (promocode := Promocode.objects.select_for_update().filter(uuid=promo_id).first()):
+                raise CommandError(f"promo {promo_id} not found")
+            if promocode.mode != "COMMON":
+                raise CommandError("only COMMON promos have shardable counters")
+
+            if promocode.shard_count:
+                merge_shards(promocode)
+            if shards:
+                create_shards(promocode, shards)
+
+        self.stdout.write(f"{promo_id}: {promocode.shard_count} shards, {promocode.common_left} left")
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.5 on 2026-10-19 06:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0007_alter_promocode_image_url'),
+        ('user', '0002_alter_user_avatar_url'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['promocode', '-created_at'], name='comment_promo_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='promocode',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='business.promocode'),
+        ),
+    ]
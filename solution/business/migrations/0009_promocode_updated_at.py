@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0008_comment_promo_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocode',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
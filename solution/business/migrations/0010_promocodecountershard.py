@@ -0,0 +1,33 @@
+# Generated by Django 5.1.5 on 2026-10-19 07:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0009_promocode_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocode',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='PromocodeCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('remaining', models.IntegerField()),
+                ('activations', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('promocode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='business.promocode')),
+            ],
+            options={
+                'unique_together': {('promocode', 'slot')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0010_promocodecountershard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocodecommonactivation',
+            name='reservation_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0011_promocodecommonactivation_reservation_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocode',
+            name='queued_activation',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-19 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0012_promocode_queued_activation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='promocodeaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
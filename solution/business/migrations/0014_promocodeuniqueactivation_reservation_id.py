@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0013_comment_updated_at_promocodeaction_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocodeuniqueactivation',
+            name='reservation_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+    ]
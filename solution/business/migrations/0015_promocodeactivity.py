@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-19 08:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0014_promocodeuniqueactivation_reservation_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromocodeActivity',
+            fields=[
+                ('promocode', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity', serialize=False, to='business.promocode')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='updated_at',
+        ),
+        migrations.RemoveField(
+            model_name='promocodeaction',
+            name='updated_at',
+        ),
+    ]
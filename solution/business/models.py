@@ -1,15 +1,18 @@
 import uuid
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from django.core.exceptions import ValidationError
 from django.core.validators import MinLengthValidator, MaxLengthValidator, MinValueValidator, \
     MaxValueValidator
 from django.contrib.postgres.fields import ArrayField
-from django.db import models
+from django.db import connection, models
+from django.db.models import Case, F, Max, OuterRef, Subquery, Sum, When
 from django.utils import timezone
+from django.utils.functional import cached_property
 from rest_framework import serializers
 
 from core.models import EmailPasswordUser
+from core.utils import subquery_sum
 from user.models import User
 
 
@@ -70,15 +73,21 @@ class Promocode(models.Model):
     )
     target = models.OneToOneField(Target, on_delete=models.CASCADE, null=True)
     max_count = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(100000000)])
-    common_count = models.IntegerField(default=0)
+    common_count = models.IntegerField(default=0)  # unused while shard_count > 0, see common_left
     unique_count = models.IntegerField(default=0)
     common_activations_count = models.IntegerField(default=0)
     unique_activations_count = models.IntegerField(default=0)
     active_from = models.DateTimeField(blank=True, null=True)
     active_until = models.DateTimeField(blank=True, null=True)
     mode = models.CharField(max_length=20, choices=MODE_CHOICES)
+    # 0: the COMMON counters live on this row, otherwise in that many PromocodeCounterShard rows
+    shard_count = models.PositiveSmallIntegerField(default=0)
+    # activations go through a FIFO queue and are answered with a ticket, see user/activation_queue.py
+    queued_activation = models.BooleanField(default=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped by edits and activations; likes and comments bump PromocodeActivity instead
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if self.target is not None and self.target.age_from is not None and self.target.age_until is not None:
@@ -89,6 +98,49 @@ class Promocode(models.Model):
     def __str__(self):
         return str(self.uuid)
 
+    # common_counters() annotations of the same names replace both properties
+
+    @cached_property
+    def common_left(self) -> int:
+        """Remaining COMMON activations, summed over the shards for a sharded promo."""
+        return self._shard_totals["remaining"] if self.shard_count else self.common_count
+
+    @cached_property
+    def common_used(self) -> int:
+        return self._shard_totals["activations"] if self.shard_count else self.common_activations_count
+
+    @cached_property
+    def _shard_totals(self) -> dict:
+        totals = self.shards.aggregate(remaining=Sum("remaining"), activations=Sum("activations"))
+        return {key: value or 0 for key, value in totals.items()}
+
+
+class PromocodeCounterShard(models.Model):
+    """A slot of a sharded COMMON promo's inventory, activations claim from a random slot."""
+    promocode = models.ForeignKey(Promocode, on_delete=models.CASCADE, related_name="shards")
+    slot = models.PositiveSmallIntegerField()
+    remaining = models.IntegerField()
+    activations = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("promocode", "slot")
+
+
+def common_counters() -> dict:
+    """common_left and common_used as annotations, the shard subqueries only run for sharded promos."""
+    shards = PromocodeCounterShard.objects.all()
+    return {
+        "common_left": Case(
+            When(shard_count=0, then=F("common_count")),
+            default=subquery_sum(shards, "promocode", "remaining"),
+        ),
+        "common_used": Case(
+            When(shard_count=0, then=F("common_activations_count")),
+            default=subquery_sum(shards, "promocode", "activations"),
+        ),
+    }
+
 class PromocodeCommonInstance(models.Model):
     promocode = models.CharField(
         max_length=30,
@@ -106,24 +158,89 @@ class PromocodeUniqueInstance(models.Model):
     promocode_set = models.ForeignKey('Promocode', on_delete=models.CASCADE, related_name='unique_codes')
 
 def promocode_is_active(promocode, current_time=None):
+    return promocode_values_is_active(
+        promocode.active_from,
+        promocode.active_until,
+        promocode.mode,
+        promocode.common_left,
+        promocode.unique_count,
+        current_time,
+    )
+
+
+def promocode_values_is_active(active_from, active_until, mode, common_left, unique_count, current_time=None):
+    """promocode_is_active for list endpoints that read plain values() rows."""
     if current_time is None:
         current_time = timezone.now() + timedelta(hours=3)  # UTC+3
 
-    if promocode.active_from is not None and promocode.active_from > current_time:
+    if active_from is not None and active_from > current_time:
         return False
-    if promocode.active_until is not None and promocode.active_until < current_time:
+    if active_until is not None and active_until < current_time:
         return False
 
-    if promocode.mode == 'COMMON':
-        if promocode.common_count <= 0:
+    if mode == 'COMMON':
+        if common_left <= 0:
             return False
-    elif promocode.mode == 'UNIQUE':
-        if promocode.unique_count <= 0:
+    elif mode == 'UNIQUE':
+        if unique_count <= 0:
             return False
 
     return True
 
 
+def promocodes_last_modified(queryset, offset=0, limit=None, current_time=None) \
+        -> tuple[datetime | None, list[tuple[int, int | None]]]:
+    """
+    Latest change of the promos on one page of the queryset and their activity
+    versions, read from page-size rows instead of aggregates over the whole set.
+    Besides updated_at, a promo also changes when it starts or ends by time alone, so
+    passed active_from/active_until boundaries count as modifications, and a sharded
+    promo's activations only touch its shards. Likes and comments bump PromocodeActivity.
+    """
+    if current_time is None:
+        current_time = timezone.now() + timedelta(hours=3)  # UTC+3, as in promocode_values_is_active
+
+    shards_updated_at = Subquery(
+        PromocodeCounterShard.objects.filter(promocode=OuterRef("pk"))
+        .order_by().values("promocode").annotate(updated_at=Max("updated_at")).values("updated_at")
+    )
+    rows = queryset.annotate(shards_updated_at=shards_updated_at).values_list(
+        "pk", "updated_at", "shards_updated_at", "active_from", "active_until", "activity__version",
+    )
+    rows = list(rows[offset:None if limit is None else offset + limit])
+
+    changes = []
+    for _, updated_at, shards_updated_at, active_from, active_until, _ in rows:
+        changes += [updated_at, shards_updated_at]
+        changes += [
+            boundary - timedelta(hours=3) for boundary in (active_from, active_until)
+            if boundary is not None and boundary <= current_time
+        ]
+    return max(filter(None, changes), default=None), [(pk, version) for pk, *_, version in rows]
+
+
+class PromocodeActivity(models.Model):
+    """
+    Version of a promo's likes and comments. They bump this row instead of the promo
+    row, so they never wait on activations or edits, see bump_promocode_activity.
+    """
+    promocode = models.OneToOneField(Promocode, on_delete=models.CASCADE, primary_key=True, related_name="activity")
+    version = models.BigIntegerField(default=0)
+
+
+def bump_promocode_activity(promocode_ids) -> None:
+    """One upsert, in id order so concurrent bumps lock the rows in the same order."""
+    if not promocode_ids:
+        return
+    table = PromocodeActivity._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (promocode_id, version) SELECT unnest(%s::bigint[]), 1 "
+            f"ON CONFLICT (promocode_id) DO UPDATE SET version = {table}.version + 1",
+            [sorted(set(promocode_ids))],
+        )
+
+
 class PromocodeAction(models.Model):
     promocode = models.ForeignKey(Promocode, on_delete=models.CASCADE, related_name="likes")
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -135,12 +252,18 @@ class PromocodeAction(models.Model):
 
 class Comment(models.Model):
     uuid = models.UUIDField(unique=True, default=uuid.uuid4, editable=False)
-    promocode = models.ForeignKey(Promocode, on_delete=models.CASCADE, related_name="comments")
+    # indexed through comment_promo_created_idx below
+    promocode = models.ForeignKey(Promocode, on_delete=models.CASCADE, related_name="comments", db_index=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.CharField(validators=[MinLengthValidator(10), MaxLengthValidator(1000)], max_length=1000)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["promocode", "-created_at"], name="comment_promo_created_idx"),
+        ]
+
     def __str__(self):
         return str(self.uuid)
 
@@ -150,7 +273,11 @@ class PromocodeActivation(models.Model):
 class PromocodeUniqueActivation(PromocodeActivation):
     promocode_instanse = models.ForeignKey(PromocodeUniqueInstance, on_delete=models.CASCADE, related_name="unique_activations")
     created_at = models.DateTimeField(auto_now_add=True)
+    # the ticket of a queued activation, a worker replaying it after a crash finds the code here
+    reservation_id = models.UUIDField(null=True, blank=True, unique=True)
 
 class PromocodeCommonActivation(PromocodeActivation):
     promocode_instanse = models.ForeignKey(PromocodeCommonInstance, on_delete=models.CASCADE, related_name="common_activations")
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+    # set when persisted from a Redis reservation or a queued activation, makes a redelivered one a no-op
+    reservation_id = models.UUIDField(null=True, blank=True, unique=True)
\ No newline at end of file
@@ -1,8 +1,9 @@
 from rest_framework.permissions import BasePermission
+
 from .models import Business
 
-def get_business(uuid):
-    return Business.objects.get(uuid=uuid)
+def get_business(principal):
+    return Business.objects.get(uuid=principal.uuid)
 
 class IsBusinessAuthenticated(BasePermission):
 
@@ -10,6 +11,7 @@ class IsBusinessAuthenticated(BasePermission):
         return request.user.is_authenticated and request.user.model_type == 'BUSINESS'
 
 class IsPromocodeOwner(BasePermission):
+    """Compares against the promo's company, views select_related("company") so no query is needed."""
 
     def has_object_permission(self, request, view, obj):
-        return obj.company == get_business(request.user.uuid)
+        return obj.company.uuid == request.user.uuid
@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from datetime import datetime
+from operator import attrgetter
+from uuid import UUID
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import OuterRef, Subquery
+from rest_framework import serializers
+
+from core.utils import subquery_count, values_rows, values_for_fields
+from .models import PromocodeAction, PromocodeCommonInstance, PromocodeUniqueInstance, promocode_values_is_active, \
+    common_counters
+
+# Company promo list without PromocodeSerializer: the codes and the like counter
+# are annotated onto the page query and dicts are built from slotted values_list() rows.
+
+# output key -> values_list() names it is built from, in PromocodeSerializer order.
+# A ?fields= subset selects only their columns: unselected annotations and joins drop out of the query.
+PROMOCODE_FIELDS = {
+    "description": ("description",),
+    "image_url": ("image_url",),
+    "target": ("target__age_from", "target__age_until", "target__country", "target__categories"),
+    "max_count": ("max_count",),
+    "active_from": ("active_from",),
+    "active_until": ("active_until",),
+    "mode": ("mode",),
+    "promo_common": ("mode", "promo_common"),
+    "promo_unique": ("mode", "promo_unique"),
+    "promo_id": ("uuid",),
+    "company_id": ("company__uuid",),
+    "company_name": ("company__name",),
+    "like_count": ("like_count",),
+    "used_count": ("common_used", "unique_activations_count"),
+    "active": ("active_from", "active_until", "mode", "common_left", "unique_count"),
+}
+
+PROMOCODE_VALUES = values_for_fields(PROMOCODE_FIELDS, PROMOCODE_FIELDS)
+
+TARGET_FIELDS = ("age_from", "age_until", "country", "categories")
+
+
+@dataclass(slots=True)
+class PromocodeRow:
+    # None only in ?fields= subsets, where the field is not selected; full rows are built positionally
+    description: str | None = None
+    image_url: str | None = None
+    target_age_from: int | None = None
+    target_age_until: int | None = None
+    target_country: str | None = None
+    target_categories: list[str] | None = None
+    max_count: int | None = None
+    active_from: datetime | None = None
+    active_until: datetime | None = None
+    mode: str | None = None
+    promo_common: str | None = None
+    promo_unique: list[str] | None = None
+    uuid: UUID | None = None
+    company_uuid: UUID | None = None
+    company_name: str | None = None
+    like_count: int | None = None
+    common_used: int | None = None
+    unique_activations_count: int | None = None
+    common_left: int | None = None
+    unique_count: int | None = None
+
+
+_date_field = serializers.DateTimeField(format="%Y-%m-%d")
+
+
+def promocodes_rows(queryset, fields=PROMOCODE_FIELDS):
+    return values_rows(queryset.annotate(
+        **common_counters(),
+        like_count=subquery_count(PromocodeAction.objects.all(), "promocode"),
+        promo_common=Subquery(
+            PromocodeCommonInstance.objects.filter(promocode_set=OuterRef("pk")).order_by("pk").values("promocode")[:1]
+        ),
+        promo_unique=ArraySubquery(
+            PromocodeUniqueInstance.objects.filter(promocode_set=OuterRef("pk")).order_by("pk").values("promocode")
+        ),
+    ), PromocodeRow, *values_for_fields(fields, PROMOCODE_FIELDS))
+
+
+def _date(value):
+    return _date_field.to_representation(value) if value is not None else None
+
+
+_PROMOCODE_GETTERS = {
+    "description": attrgetter("description"),
+    "image_url": attrgetter("image_url"),
+    "target": lambda row: {
+        field: value for field in TARGET_FIELDS if (value := getattr(row, f"target_{field}")) is not None
+    },
+    "max_count": attrgetter("max_count"),
+    "active_from": lambda row: _date(row.active_from),
+    "active_until": lambda row: _date(row.active_until),
+    "mode": attrgetter("mode"),
+    "promo_common": lambda row: row.promo_common if row.mode == "COMMON" else None,
+    "promo_unique": lambda row: row.promo_unique if row.mode == "UNIQUE" else None,
+    "promo_id": attrgetter("uuid"),
+    "company_id": attrgetter("company_uuid"),
+    "company_name": attrgetter("company_name"),
+    "like_count": attrgetter("like_count"),
+    "used_count": lambda row: row.common_used + row.unique_activations_count,
+    "active": lambda row: promocode_values_is_active(
+        row.active_from, row.active_until, row.mode, row.common_left, row.unique_count
+    ),
+}
+
+
+def promocode_representation(row: PromocodeRow, fields=PROMOCODE_FIELDS) -> dict:
+    """Same keys and order as PromocodeSerializer, nulls dropped like ClearNullMixin does."""
+    result = {field: _PROMOCODE_GETTERS[field](row) for field in fields}
+    return {key: value for key, value in result.items() if value is not None}
+
+
+def promocodes_representation(rows, fields=PROMOCODE_FIELDS) -> list[dict]:
+    return [promocode_representation(row, fields) for row in rows]
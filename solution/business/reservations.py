@@ -0,0 +1,132 @@
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from app.settings import COMMON_RESERVATIONS, RESERVATION_TTL
+from core.redis_client import redis_conn, get_async_redis
+from .models import Promocode
+
+# COMMON_RESERVATIONS=redis: activations of COMMON promos take a unit from a Redis
+# copy of the inventory instead of the database counters. One Lua script checks the
+# active window, the remaining count and the set of users holding a reservation,
+# takes the unit and appends the reservation to a stream, so bursts never wait on
+# Postgres. `manage.py persist_reservations` writes the stream to Postgres, which
+# stays the source of truth: a reservation that cannot be persisted is compensated
+# here. The Redis copy is seeded from common_left on first use and follows
+# max_count and window changes, see sync_reservation().
+# Until the stream is persisted it is the only record of activations already answered
+# with a code, so this mode needs a durable Redis (AOF, appendfsync everysec as in
+# docker-compose.yaml): a Redis that restarts empty loses them and reseeds a stale inventory.
+
+STREAM_KEY = "resv:stream"
+INVENTORY_KEY = "resv:promo:{}"
+USERS_KEY = "resv:users:{}"
+
+RESERVED = "OK"
+DUPLICATE = "DUP"  # the user already holds a unit, nothing is taken
+INACTIVE = "INACTIVE"
+EMPTY = "EMPTY"
+_MISS = "MISS"
+
+# KEYS: inventory, users, stream; ARGV: now, user id, promo id, reservation id, ttl
+_RESERVE = """
+if redis.call("EXISTS", KEYS[1]) == 0 then return "MISS" end
+local inventory = redis.call("HMGET", KEYS[1], "left", "from", "until")
+local now = tonumber(ARGV[1])
+if inventory[2] ~= "" and tonumber(inventory[2]) > now then return "INACTIVE" end
+if inventory[3] ~= "" and tonumber(inventory[3]) < now then return "INACTIVE" end
+if redis.call("SISMEMBER", KEYS[2], ARGV[2]) == 1 then return "DUP" end
+if tonumber(inventory[1]) <= 0 then return "EMPTY" end
+redis.call("HINCRBY", KEYS[1], "left", -1)
+redis.call("SADD", KEYS[2], ARGV[2])
+redis.call("XADD", KEYS[3], "*", "reservation", ARGV[4], "promo", ARGV[3], "user", ARGV[2])
+redis.call("EXPIRE", KEYS[1], ARGV[5])
+redis.call("EXPIRE", KEYS[2], ARGV[5])
+return "OK"
+"""
+
+# KEYS: inventory; ARGV: left, from, until, ttl. Only when missing, a concurrent seed keeps the first one
+_SEED = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    redis.call("HSET", KEYS[1], "left", ARGV[1], "from", ARGV[2], "until", ARGV[3])
+    redis.call("EXPIRE", KEYS[1], ARGV[4])
+end
+"""
+
+# KEYS: inventory, users; ARGV: user id, 1 to give the unit back, 0 when Postgres has none left
+_COMPENSATE = """
+redis.call("SREM", KEYS[2], ARGV[1])
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    if ARGV[2] == "1" then
+        redis.call("HINCRBY", KEYS[1], "left", 1)
+    else
+        redis.call("HSET", KEYS[1], "left", 0)
+    end
+end
+"""
+
+# KEYS: inventory; ARGV: max_count delta, from, until
+_SYNC = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    local left = math.max(tonumber(redis.call("HGET", KEYS[1], "left")) + tonumber(ARGV[1]), 0)
+    redis.call("HSET", KEYS[1], "left", left, "from", ARGV[2], "until", ARGV[3])
+end
+"""
+
+_reserve = redis_conn.register_script(_RESERVE)
+_seed = redis_conn.register_script(_SEED)
+_compensate = redis_conn.register_script(_COMPENSATE)
+_sync = redis_conn.register_script(_SYNC)
+
+
+def reservations_enabled(promocode: Promocode) -> bool:
+    return COMMON_RESERVATIONS == "redis" and promocode.mode == "COMMON"
+
+
+def _timestamp(value) -> str:
+    return str(value.timestamp()) if value is not None else ""
+
+
+def _window(promocode: Promocode) -> list[str]:
+    return [_timestamp(promocode.active_from), _timestamp(promocode.active_until)]
+
+
+def _reserve_args(promocode: Promocode, user_id: int) -> tuple[list, list]:
+    now = timezone.now() + timedelta(hours=3)  # UTC+3, as in promocode_values_is_active
+    return (
+        [INVENTORY_KEY.format(promocode.id), USERS_KEY.format(promocode.id), STREAM_KEY],
+        [now.timestamp(), user_id, promocode.id, uuid.uuid4().hex, RESERVATION_TTL],
+    )
+
+
+def reserve_common(promocode: Promocode, user_id: int) -> str:
+    """Takes a unit for the user in one round trip, seeding the inventory first if Redis has none."""
+    keys, args = _reserve_args(promocode, user_id)
+    if (result := _reserve(keys=keys, args=args).decode()) == _MISS:
+        _seed(keys=keys[:1], args=[promocode.common_left, *_window(promocode), RESERVATION_TTL])
+        result = _reserve(keys=keys, args=args).decode()
+    return result
+
+
+async def areserve_common(promocode: Promocode, user_id: int) -> str:
+    client = get_async_redis()
+    keys, args = _reserve_args(promocode, user_id)
+    if (result := (await client.register_script(_RESERVE)(keys=keys, args=args)).decode()) == _MISS:
+        left = await sync_to_async(getattr)(promocode, "common_left")  # a query for sharded promos
+        await client.register_script(_SEED)(keys=keys[:1], args=[left, *_window(promocode), RESERVATION_TTL])
+        result = (await client.register_script(_RESERVE)(keys=keys, args=args)).decode()
+    return result
+
+
+def compensate_reservation(promocode_id: int, user_id: int, restock: bool) -> None:
+    """Undoes a reservation Postgres did not take, restock=False also empties the Redis inventory."""
+    _compensate(keys=[INVENTORY_KEY.format(promocode_id), USERS_KEY.format(promocode_id)],
+                args=[user_id, int(restock)])
+
+
+def sync_reservation(promocode: Promocode, max_count_delta: int) -> None:
+    """Carries a max_count or window change over to a seeded inventory, call after the commit."""
+    if reservations_enabled(promocode):
+        _sync(keys=[INVENTORY_KEY.format(promocode.id)], args=[max_count_delta, *_window(promocode)])
@@ -1,15 +1,18 @@
-from collections import defaultdict
-
 from django.core.validators import MinLengthValidator, RegexValidator, MaxLengthValidator, MinValueValidator, \
     MaxValueValidator
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Lower
 from rest_framework import serializers
 from drf_writable_nested.serializers import WritableNestedModelSerializer
 from rest_framework.exceptions import ValidationError
 
+from business.counters import create_shards, resize_common, wants_shards
 from business.models import Business, Promocode, Target, password_length_validator, promocode_is_active, \
     PromocodeCommonInstance, PromocodeUniqueInstance, PromocodeUniqueActivation, PromocodeCommonActivation
+from business.reservations import sync_reservation
 from core.utils import clean_country
-from core.serializers import ClearNullMixin, StrictCharField, StrictIntegerField, StrictURLField
+from core.serializers import ClearNullMixin, SparseFieldsMixin, StrictCharField, StrictIntegerField, StrictURLField
 from core.utils import validate_country_code
 
 
@@ -20,8 +23,8 @@ class RegisterBusinessSerializer(serializers.ModelSerializer):
     )
     class Meta:
         model = Business
-        fields = ("name", "email", "password", "model_type")
-        write_only_fields = ("password", "model_type")
+        fields = ("name", "email", "password")
+        write_only_fields = ("password",)
 
 
 class LoginBusinessSerializer(serializers.Serializer):
@@ -118,6 +121,7 @@ class CreatePromocodeSerializer(WritableNestedModelSerializer):
             "mode",
             "promo_common",
             "promo_unique",
+            "queued_activation",
         ]
 
     def validate(self, data):
@@ -178,6 +182,8 @@ class CreatePromocodeSerializer(WritableNestedModelSerializer):
             PromocodeUniqueInstance.objects.bulk_create(unique_codes)
 
         promocode_set.save()
+        if wants_shards(promocode_set.mode, promocode_set.max_count):
+            create_shards(promocode_set)
         return promocode_set
 
 
@@ -187,7 +193,7 @@ class PromocodeUniqueInstanceSerializer(serializers.ModelSerializer):
         fields = ("promocode",)
 
 
-class PromocodeSerializer(WritableNestedModelSerializer, ClearNullMixin):
+class PromocodeSerializer(SparseFieldsMixin, WritableNestedModelSerializer, ClearNullMixin):
     target = TargetSerializer()
     promo_id = serializers.SerializerMethodField()
     company_id = serializers.SerializerMethodField()
@@ -214,6 +220,7 @@ class PromocodeSerializer(WritableNestedModelSerializer, ClearNullMixin):
         validators=[MinLengthValidator(1), MaxLengthValidator(350)]
     )
     max_count = StrictIntegerField(validators=[MinValueValidator(0), MaxValueValidator(100000000)])
+    queued_activation = serializers.BooleanField(write_only=True, required=False)
 
     def get_promo_id(self, obj):
         return obj.uuid
@@ -236,7 +243,7 @@ class PromocodeSerializer(WritableNestedModelSerializer, ClearNullMixin):
         return None
 
     def get_used_count(self, obj):
-        return obj.common_activations_count + obj.unique_activations_count
+        return obj.common_used + obj.unique_activations_count
 
     def get_promo_unique(self, obj):
         if obj.mode == "UNIQUE":
@@ -267,6 +274,7 @@ class PromocodeSerializer(WritableNestedModelSerializer, ClearNullMixin):
             "like_count",
             "used_count",
             "active",
+            "queued_activation",
         )
         read_only_fields = (
             "uuid",
@@ -282,12 +290,41 @@ class PromocodeSerializer(WritableNestedModelSerializer, ClearNullMixin):
         )
 
     def update(self, instance, validated_data):
-        if 'active_until' in validated_data:
-            instance.active_until = validated_data['active_until']
-        if 'active_from' in validated_data:
-            instance.active_from = validated_data['active_from']
-        instance.save()
-        return super().update(instance, validated_data)
+        """
+        Writes only what changed: an UPDATE of the changed target columns and one of the
+        changed promo columns. A target in the request replaces the whole targeting, as the
+        nested serializer did, but in the existing row instead of a new one.
+        """
+        target_changed = False
+        if (target_data := validated_data.pop("target", None)) is not None:
+            target = instance.target or Target()
+            target_fields = [
+                field for field in TargetSerializer.Meta.fields if getattr(target, field) != target_data.get(field)
+            ]
+            for field in target_fields:
+                setattr(target, field, target_data.get(field))
+            if target.pk is None:
+                target.save()
+                validated_data["target"] = target
+            elif target_fields:
+                target.save(update_fields=target_fields)
+                target_changed = True
+
+        changed = [field for field, value in validated_data.items() if getattr(instance, field) != value]
+        max_count_delta = validated_data["max_count"] - instance.max_count if "max_count" in changed else 0
+        if max_count_delta and instance.mode == "COMMON":  # the inventory follows max_count
+            changed += resize_common(instance, max_count_delta)
+        for field in changed:
+            setattr(instance, field, validated_data.get(field, getattr(instance, field)))
+        if changed or target_changed:
+            instance.save(update_fields=[*changed, "updated_at"])
+        if {"max_count", "active_from", "active_until"} & set(changed):
+            transaction.on_commit(lambda: sync_reservation(instance, max_count_delta))
+        return instance
+
+
+class ExportQueryParamsSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=["csv", "ndjson"], default="csv", required=False)
 
 
 class ListPromocodesQueryParamsSerializer(serializers.Serializer):
@@ -309,7 +346,7 @@ class PromocodeStatSeriazlier(serializers.ModelSerializer):
     countries = serializers.SerializerMethodField()
 
     def get_activations_count(self, obj):
-        return obj.common_activations_count + obj.unique_activations_count
+        return obj.common_used + obj.unique_activations_count
 
     def get_countries(self, promocode):
         if promocode.mode == "UNIQUE":
@@ -317,17 +354,10 @@ class PromocodeStatSeriazlier(serializers.ModelSerializer):
         else:
             activations = PromocodeCommonActivation.objects.filter(promocode_instanse__promocode_set=promocode)
 
-        country_activation_count = defaultdict(int)
-
-        for activation in activations:
-            country = activation.user.other.country
-            country_activation_count[country.lower()] += 1
-
-        countries_list = [{"country": country.lower(), "activations_count": count} for country, count in
-                          country_activation_count.items()]
-
-        countries_list.sort(key=lambda x: x["country"].lower())
-        return countries_list
+        # grouped in the database, one query whatever the number of activations
+        countries = activations.values(country=Lower("user__other__country")) \
+            .annotate(activations_count=Count("pk")).order_by("country")
+        return list(countries)
 
     class Meta:
         model = Promocode
@@ -0,0 +1,32 @@
+import json
+
+from redis.exceptions import RedisError
+
+from core.redis_client import redis_conn
+from .models import Promocode
+from .serializers import PromocodeStatSeriazlier
+
+# Promo statistics are cached per activation count: any new activation changes the
+# key, so a cached value is never stale and nothing has to be deleted. Old keys
+# expire on their own. refresh_promocode_stats fills the new key after an activation.
+
+STATS_TTL = 60 * 60
+
+
+def _stats_key(promocode: Promocode) -> str:
+    return f"promo:stats:{promocode.id}:{promocode.common_used + promocode.unique_activations_count}"
+
+
+def compute_promocode_stats(promocode: Promocode) -> dict:
+    data = PromocodeStatSeriazlier(promocode).data
+    redis_conn.set(_stats_key(promocode), json.dumps(data), ex=STATS_TTL)
+    return data
+
+
+def promocode_stats(promocode: Promocode) -> dict:
+    try:
+        if cached := redis_conn.get(_stats_key(promocode)):
+            return json.loads(cached)
+        return compute_promocode_stats(promocode)
+    except RedisError:  # the cache only saves work, the stats are read from the database without it
+        return PromocodeStatSeriazlier(promocode).data
@@ -0,0 +1,49 @@
+from django.db import transaction
+
+from core.tasks import task
+from .counters import rebalance_shards
+from .models import Promocode, PromocodeCommonActivation, PromocodeUniqueActivation, PromocodeUniqueInstance
+from .stats import compute_promocode_stats
+
+# seconds a debounced task waits, triggers for the same promo in between share the run
+STATS_REFRESH_DELAY = 5.0
+RECONCILE_DELAY = 5.0
+
+
+@task()
+def refresh_promocode_stats(promocode_id: int) -> None:
+    """Warms the stats cache after activations, debounced: the stats endpoint computes a miss itself."""
+    if promocode := Promocode.objects.filter(pk=promocode_id).first():
+        compute_promocode_stats(promocode)
+
+
+@task()
+def reconcile_promocode_counters(promocode_id: int) -> None:
+    """Recounts the denormalized counters of a promo from its activation and code rows."""
+    with transaction.atomic():
+        if not (promocode := Promocode.objects.select_for_update().filter(pk=promocode_id).first()):
+            return
+        if promocode.mode == "COMMON":
+            if promocode.shard_count:
+                list(promocode.shards.select_for_update().order_by("slot"))  # claims in flight commit before the count
+            activations = PromocodeCommonActivation.objects.filter(promocode_instanse__promocode_set=promocode).count()
+            if promocode.shard_count:
+                rebalance_shards(promocode, max(promocode.max_count - activations, 0), activations)
+                return
+            counters = {
+                "common_activations_count": activations,
+                "common_count": max(promocode.max_count - activations, 0),
+            }
+        else:
+            counters = {
+                "unique_activations_count": PromocodeUniqueActivation.objects.filter(
+                    promocode_instanse__promocode_set=promocode
+                ).count(),
+                "unique_count": PromocodeUniqueInstance.objects.filter(promocode_set=promocode, is_activated=False).count(),
+            }
+
+        changed = [field for field, value in counters.items() if getattr(promocode, field) != value]
+        for field in changed:
+            setattr(promocode, field, counters[field])
+        if changed:
+            promocode.save(update_fields=[*changed, "updated_at"])
@@ -1,7 +1,7 @@
 from django.urls import path
 
 from .views import RegisterBusinessView, LoginBusinessView, PromocodeCreateListView, RetrieveUpdatePromocodeView, \
-    PromocodeStatisticsView
+    PromocodeStatisticsView, PromocodeActivationsExportView
 
 urlpatterns = [
     path("auth/sign-up", RegisterBusinessView.as_view(), name='business-sign-up'),
@@ -9,4 +9,5 @@ urlpatterns = [
     path("promo", PromocodeCreateListView.as_view()),
     path("promo/<str:uuid>", RetrieveUpdatePromocodeView.as_view()),
     path("promo/<str:uuid>/stat", PromocodeStatisticsView.as_view()),
+    path("promo/<str:uuid>/activations", PromocodeActivationsExportView.as_view()),
 ]
\ No newline at end of file
@@ -1,23 +1,31 @@
 from datetime import datetime
 
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
 from django.db.models import Q, F, Value
 from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from rest_framework import status
-from django.contrib.auth.hashers import make_password, check_password
 from rest_framework.exceptions import NotFound, PermissionDenied
 from rest_framework.generics import CreateAPIView, GenericAPIView, RetrieveUpdateAPIView
-from rest_framework.authtoken.models import Token
 from rest_framework.mixins import CreateModelMixin, ListModelMixin
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from app.exeptions import CustomException
 from app.pagination import PureLimitOffsetPagination
 from rest_framework.serializers import ValidationError
 
-from core.utils import is_valid_uuid, clean_country
+from core.hashing import verify_password
+from core.routers import ReadReplicaMixin
+from core.tokens import issue_token
+from core.utils import is_valid_uuid, clean_country, register_account, requested_fields, is_duplicate_email
 from business.models import Business, Promocode
+from business.exports import CONTENT_TYPES, activations_rows, astream_activations, stream_activations
 from business.permissions import IsBusinessAuthenticated, IsPromocodeOwner, get_business
+from business.representations import promocodes_rows, promocodes_representation, PROMOCODE_FIELDS
 from business.serializers import RegisterBusinessSerializer, LoginBusinessSerializer, CreatePromocodeSerializer, \
-    PromocodeSerializer, ListPromocodesQueryParamsSerializer, PromocodeStatSeriazlier
+    PromocodeSerializer, ListPromocodesQueryParamsSerializer, ExportQueryParamsSerializer
+from business.stats import promocode_stats
 
 
 class LoginBusinessView(APIView):
@@ -28,43 +36,33 @@ class LoginBusinessView(APIView):
         email = serializer.validated_data['email']
         password = serializer.validated_data['password']
 
-        if not (business := Business.objects.filter(email=email).first()) or not check_password(password, business.password):
+        if not (business := Business.objects.filter(email=email).first()) or not verify_password(password, business):
             return Response({
                 "message": "Неверный email или password.",
             }, status=status.HTTP_401_UNAUTHORIZED
             )
 
-        Token.objects.filter(user=business).delete()
-        token = Token.objects.create(user=business)
-
         return Response({
-            "token": token.key,
+            "token": issue_token(business),
         })
 
 class RegisterBusinessView(CreateAPIView):
     serializer_class = RegisterBusinessSerializer
-    def perform_create(self, serializer):
-        password = serializer.validated_data['password']
-        serializer.validated_data['password'] = make_password(password)
-
-        serializer.validated_data['model_type'] = "BUSINESS"
-        serializer.save()
 
     def create(self, request, *args, **kwargs):
-        email = request.data.get("email")
-        if Business.objects.filter(email=email).exists():
-            return Response({"message": "Компания с указанным email уже зарегистрирован."},
-                            status=status.HTTP_409_CONFLICT)
-
-        response = super().create(request, *args, **kwargs)
-
-        email = response.data.get("email")
-        business = Business.objects.get(email=email)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        token = Token.objects.create(user=business)
+        try:
+            business, token = register_account(serializer, "BUSINESS")
+        except IntegrityError as exc:
+            if not is_duplicate_email(exc):
+                raise
+            raise CustomException("Компания с указанным email уже зарегистрирован.", "message",
+                                  status.HTTP_409_CONFLICT)
 
         return Response({
-            "token": token.key,
+            "token": token,
             "company_id": business.uuid
         })
 
@@ -91,7 +89,7 @@ class PromocodeCreateListView(GenericAPIView, CreateModelMixin, ListModelMixin):
 
         sort_by = params.get("sort_by", "created_at")
 
-        queryset = get_business(self.request.user.uuid).promocodes.all()
+        queryset = get_business(self.request.user).promocodes.all()
 
         if country := self.request.query_params.get("country"):
             country_list = clean_country(country)
@@ -110,9 +108,13 @@ class PromocodeCreateListView(GenericAPIView, CreateModelMixin, ListModelMixin):
 
         return queryset.annotate(sort_field=order_field).order_by("-sort_field")
 
+    def list(self, request, *args, **kwargs):
+        fields = requested_fields(request.query_params, PROMOCODE_FIELDS)
+        page = self.paginate_queryset(promocodes_rows(self.get_queryset(), fields))
+        return self.get_paginated_response(promocodes_representation(page, fields))
+
     def perform_create(self, serializer):
-        uuid = self.request.user.uuid
-        serializer.validated_data["company"] = Business.objects.get(uuid=uuid)
+        serializer.validated_data["company"] = get_business(self.request.user)
 
         return super().perform_create(serializer)
 
@@ -124,39 +126,53 @@ class PromocodeCreateListView(GenericAPIView, CreateModelMixin, ListModelMixin):
 class RetrieveUpdatePromocodeView(RetrieveUpdateAPIView):
     permission_classes = (IsBusinessAuthenticated, IsPromocodeOwner,)
     serializer_class = PromocodeSerializer
-    queryset = Promocode.objects.all()
+    queryset = Promocode.objects.select_related("company", "target")
     lookup_field = "uuid"
     lookup_url_kwarg = "uuid"
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == "GET":  # updates always answer with the full promo
+            context["fields"] = requested_fields(self.request.query_params, PromocodeSerializer.Meta.fields)
+        return context
+
     def retrieve(self, request, uuid,*args, **kwargs):
         if not is_valid_uuid(uuid):
             raise ValidationError("Invalid UUID.")
         return super().retrieve(request, uuid, *args, **kwargs)
 
     def update(self, request, uuid, *args, **kwargs):
+        """One locked read of the promo with its target and company, then only the changed columns are written."""
+        partial = kwargs.pop("partial", False)
         if not is_valid_uuid(uuid):
             raise ValidationError("Invalid UUID.")
 
-        if not (promocode := Promocode.objects.filter(uuid=uuid).first()):
-            raise NotFound("Промокод не надйен.")
-
         for field in PromocodeSerializer.Meta.read_only_fields:
             if field in request.data:
                 raise ValidationError(f"Поле '{field}' не может быть изменено.")
 
-        if (max_count := request.data.get("max_count")) is not None:
-            if promocode.mode == "COMMON":
-                used_count = promocode.max_count - promocode.common_count
-                if used_count > max_count:
-                    raise ValidationError("max_count > used_count")
+        with transaction.atomic():
+            # of=("self",): the target is an outer join and the company row must stay unlocked
+            if not (promocode := self.get_queryset().select_for_update(of=("self",)).filter(uuid=uuid).first()):
+                raise NotFound("Промокод не надйен.")
+            self.check_object_permissions(request, promocode)
+
+            if (max_count := request.data.get("max_count")) is not None:
+                if promocode.mode == "COMMON":
+                    if promocode.common_used > max_count:
+                        raise ValidationError("max_count > used_count")
+
+                else:
+                    if max_count != 1:
+                        raise ValidationError("max_count > 1")
 
-            else:
-                if max_count != 1:
-                    raise ValidationError("max_count > 1")
+            serializer = self.get_serializer(promocode, data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
 
-        return super().update(request, *args, **kwargs)
+        return Response(serializer.data)
 
-class PromocodeStatisticsView(APIView):
+class PromocodeStatisticsView(ReadReplicaMixin, APIView):
     permission_classes = (IsBusinessAuthenticated, IsPromocodeOwner,)
 
     def get(self, request, *args, **kwargs):
@@ -167,8 +183,37 @@ class PromocodeStatisticsView(APIView):
         if not (promocode := Promocode.objects.filter(uuid=uuid).first()):
             raise NotFound("Промокод не надйен.")
 
-        if not promocode.company == get_business(self.request.user.uuid):
+        if not promocode.company == get_business(self.request.user):
             raise PermissionDenied("низя")
 
-        response_data = PromocodeStatSeriazlier(promocode).data
-        return Response(response_data)
+        return Response(promocode_stats(promocode))
+
+
+class PromocodeActivationsExportView(ReadReplicaMixin, APIView):
+    """Activations of the promo as CSV or NDJSON (?output=), streamed while they are read."""
+    permission_classes = (IsBusinessAuthenticated,)
+
+    def get(self, request, uuid, *args, **kwargs):
+        if not is_valid_uuid(uuid):
+            raise ValidationError("Invalid UUID.")
+
+        params_serializer = ExportQueryParamsSerializer(data=request.query_params)
+        params_serializer.is_valid(raise_exception=True)
+        output = params_serializer.validated_data["output"]
+
+        if not (promocode := Promocode.objects.select_related("company").filter(uuid=uuid).first()):
+            raise NotFound("Промокод не надйен.")
+
+        if not promocode.company == get_business(self.request.user):
+            raise PermissionDenied("низя")
+
+        rows = activations_rows(promocode)
+        rows = rows.using(rows.db)  # the body is read after dispatch has left replica_reads()
+        if isinstance(request._request, ASGIRequest):
+            content = astream_activations(rows, output)
+        else:
+            content = stream_activations(rows, output)
+
+        response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[output])
+        response["Content-Disposition"] = f'attachment; filename="promo-{uuid}-activations.{output}"'
+        return response
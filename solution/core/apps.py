@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+from app.settings import TRACING_ENABLED
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core.metrics import install_query_wrapper
+        from core.slow_queries import install_slow_query_wrapper
+
+        connection_created.connect(install_query_wrapper, dispatch_uid="core.metrics.query_wrapper")
+        connection_created.connect(install_slow_query_wrapper, dispatch_uid="core.slow_queries.slow_query_wrapper")
+
+        if TRACING_ENABLED:
+            from core.tracing import install_tracing_query_wrapper, install_serializer_spans
+
+            connection_created.connect(install_tracing_query_wrapper, dispatch_uid="core.tracing.query_wrapper")
+            install_serializer_spans()
@@ -0,0 +1,101 @@
+from asgiref.sync import sync_to_async
+from django.utils.cache import patch_vary_headers
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView, exception_handler
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of APIView for I/O-bound endpoints served over ASGI.
+    DRF has no async views, so this one reuses its authentication, permissions,
+    exception handler and content negotiation to keep responses identical to the sync views.
+    Handlers are coroutines returning a rest_framework Response.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    content_negotiation_class = api_settings.DEFAULT_CONTENT_NEGOTIATION_CLASS
+    permission_classes = ()
+    settings = api_settings
+
+    # what the browsable API renderer asks of a view
+    allowed_methods = APIView.allowed_methods
+    get_view_name = APIView.get_view_name
+    get_view_description = APIView.get_view_description
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.request = Request(
+            request,
+            parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+            authenticators=[auth() for auth in self.authentication_classes],
+        )
+
+        try:
+            await self.initial(self.request)
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            response = await handler(self.request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        return self.finalize_response(response)
+
+    async def initial(self, request):
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+
+        await sync_to_async(lambda: request.user)()  # both token kinds read Redis or the database
+
+        self.check_permissions(request)
+
+    def check_permissions(self, request):
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.authenticators and not request.successful_authenticator:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, "message", None))
+
+    def perform_content_negotiation(self, request, force=False):
+        """The renderer for the Accept header, as APIView picks it. force: the first one instead of a 406."""
+        renderers = [renderer() for renderer in self.renderer_classes]
+        try:
+            return self.content_negotiation_class().select_renderer(request, renderers)
+        except exceptions.NotAcceptable:
+            if force:
+                return renderers[0], renderers[0].media_type
+            raise
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            if self.request.authenticators:
+                exc.auth_header = self.request.authenticators[0].authenticate_header(self.request)
+            else:
+                exc.status_code = 403
+
+        response = exception_handler(exc, {"view": self, "request": self.request})
+        if response is None:
+            raise exc
+        return response
+
+    def finalize_response(self, response):
+        if not isinstance(response, Response):  # plain Django responses, e.g. 304 from conditional_get
+            return response
+        if not hasattr(self.request, "accepted_renderer"):  # failed before or in the negotiation itself
+            self.request.accepted_renderer, self.request.accepted_media_type = \
+                self.perform_content_negotiation(self.request, force=True)
+        response.accepted_renderer = self.request.accepted_renderer
+        response.accepted_media_type = self.request.accepted_media_type
+        response.renderer_context = {"view": self, "request": self.request, "response": response}
+        if len(self.renderer_classes) > 1:
+            patch_vary_headers(response, ("Accept",))
+        return response.render()
@@ -0,0 +1,74 @@
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+# Conditional GET for polled read endpoints. A view computes cheap validators
+# (the last change of the data it would return and anything else the body depends
+# on) before doing the real work, and If-None-Match requests that still match are
+# answered with 304 without running the handler. Last-Modified is informational
+# only: it has one-second resolution and cannot reflect deletes, so a request
+# carrying just If-Modified-Since always gets the full response.
+
+
+@dataclass(frozen=True)
+class Validators:
+    etag: str
+    last_modified: datetime | None = None
+
+    @classmethod
+    def build(cls, *parts, last_modified: datetime | None = None) -> "Validators":
+        """Weak ETag over parts and last_modified: the same body is not promised byte for byte."""
+        digest = hashlib.sha1(repr((*parts, last_modified)).encode()).hexdigest()[:32]
+        return cls(f'W/"{digest}"', last_modified)
+
+    @property
+    def timestamp(self) -> int | None:
+        return int(self.last_modified.timestamp()) if self.last_modified is not None else None
+
+    def not_modified(self, request):
+        return get_conditional_response(request, etag=self.etag)
+
+    def apply(self, response):
+        if response.status_code != 200:
+            return response
+        response.headers["ETag"] = self.etag
+        if self.last_modified is not None:
+            response.headers["Last-Modified"] = http_date(self.timestamp)
+        patch_cache_control(response, private=True, no_cache=True)  # clients revalidate every time
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+
+def conditional_get(handler):
+    """
+    Decorator for GET handlers of APIView and AsyncAPIView, the DRF take on
+    django.views.decorators.http.condition. The view's get_validators(request, ...)
+    runs after authentication and permissions and returns Validators, or None to skip.
+    """
+    if iscoroutinefunction(handler):
+        @wraps(handler)
+        async def async_wrapper(self, request, *args, **kwargs):
+            validators = await sync_to_async(self.get_validators)(request, *args, **kwargs)
+            if validators is None:
+                return await handler(self, request, *args, **kwargs)
+            if (response := validators.not_modified(request)) is not None:
+                return response
+            return validators.apply(await handler(self, request, *args, **kwargs))
+
+        return async_wrapper
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        validators = self.get_validators(request, *args, **kwargs)
+        if validators is None:
+            return handler(self, request, *args, **kwargs)
+        if (response := validators.not_modified(request)) is not None:
+            return response
+        return validators.apply(handler(self, request, *args, **kwargs))
+
+    return wrapper
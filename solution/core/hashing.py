@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework.exceptions import APIException
+from rest_framework import status
+
+from app.settings import PASSWORD_HASHING_WORKERS, PASSWORD_HASHING_QUEUE_SIZE, PASSWORD_HASHING_TIMEOUT
+
+
+class HashingOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Сервис перегружен, попробуйте позже."
+
+
+class _HashingPool:
+    """
+    Bounded pool for password hashing. PBKDF2 releases the GIL inside hashlib,
+    so hashes run in parallel while the request thread just waits on the future.
+    Requests beyond workers + queue_size are rejected instead of piling up.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hashing")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _run(self, fn, *args):
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+            self._slots.release()
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingOverloaded()
+        with self._lock:
+            self.pending += 1
+        return self._executor.submit(self._run, fn, *args)
+
+    def result(self, future):
+        """The future's result, 503 when the queue ahead of it takes longer than PASSWORD_HASHING_TIMEOUT."""
+        try:
+            return future.result(timeout=PASSWORD_HASHING_TIMEOUT)
+        except FutureTimeoutError:
+            # the hash still runs and frees its slot when done, cancelling would leak the slot
+            with self._lock:
+                self.timed_out += 1
+            raise HashingOverloaded()
+
+    def call(self, fn, *args):
+        return self.result(self.submit(fn, *args))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+
+hashing_pool = _HashingPool(PASSWORD_HASHING_WORKERS, PASSWORD_HASHING_QUEUE_SIZE)
+
+
+def hash_password(password: str) -> str:
+    return hashing_pool.call(make_password, password)
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    hashed = []
+    for start in range(0, len(passwords), hashing_pool.workers):  # never more than the pool can take
+        futures = [hashing_pool.submit(make_password, password) for password in passwords[start:start + hashing_pool.workers]]
+        hashed.extend(hashing_pool.result(future) for future in futures)
+    return hashed
+
+
+def _check_password(password, encoded):
+    needs_upgrade = []
+    is_correct = check_password(password, encoded, setter=needs_upgrade.append)
+    return is_correct, bool(needs_upgrade)
+
+
+def verify_password(password: str, user) -> bool:
+    """
+    Checks the password off-thread. Hashes made by a legacy hasher (MD5) are
+    re-hashed with the preferred one and saved on successful login.
+    """
+    is_correct, needs_upgrade = hashing_pool.call(_check_password, password, user.password)
+    if is_correct and needs_upgrade:
+        user.password = hash_password(password)
+        type(user).objects.filter(pk=user.pk).update(password=user.password)
+    return is_correct
@@ -0,0 +1,42 @@
+import signal
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from app.settings import OUTBOX_BATCH_SIZE, OUTBOX_SINK_DIR
+from core.outbox import relay
+
+
+class Command(BaseCommand):
+    help = (
+        "Drains the event outbox to append-only NDJSON files, at least once, in batches. "
+        "SIGTERM finishes the current batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sink", default=OUTBOX_SINK_DIR, help="directory of the NDJSON files")
+        parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=1.0, help="seconds to wait when the outbox is empty")
+        parser.add_argument("--once", action="store_true", help="drain what is there and exit")
+
+    def handle(self, *args, sink, batch_size, interval, once, **options):
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        relayed = 0
+        while not stopping:
+            if moved := relay(batch_size, Path(sink)):
+                relayed += moved
+                continue
+            if once:
+                break
+            time.sleep(interval)
+
+        self.stdout.write(f"relayed: {relayed}")
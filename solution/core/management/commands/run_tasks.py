@@ -0,0 +1,45 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import autodiscover_modules
+
+from core.redis_client import redis_conn
+from core.tasks import QUEUE_KEY, SCHEDULED_KEY, promote_due_tasks, registry, requeue_dead, run_message
+
+
+class Command(BaseCommand):
+    help = "Runs background tasks from Redis. Start one process per worker, SIGTERM finishes the current task."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queues", default="default", help="comma separated, earlier queues first")
+        parser.add_argument("--burst", action="store_true", help="exit once the queues and due retries are empty")
+        parser.add_argument("--requeue-dead", dest="requeue", action="store_true", help="move dead-lettered tasks back and exit")
+
+    def handle(self, *args, queues, burst, requeue, **options):
+        if requeue:
+            self.stdout.write(f"requeued: {requeue_dead()}")
+            return
+
+        autodiscover_modules("tasks")
+        queue_keys = [QUEUE_KEY.format(queue.strip()) for queue in queues.split(",") if queue.strip()]
+        self.stdout.write(f"tasks: {', '.join(sorted(registry))}\nqueues: {', '.join(queue_keys)}")
+
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        stats = {"done": 0, "failed": 0}
+        while not stopping:
+            promote_due_tasks()
+            if (popped := redis_conn.brpop(queue_keys, timeout=1)) is None:
+                if burst and not redis_conn.zcount(SCHEDULED_KEY, "-inf", "+inf"):
+                    break
+                continue
+            stats["done" if run_message(popped[1]) else "failed"] += 1
+
+        self.stdout.write(f"done: {stats['done']}, failed: {stats['failed']}")
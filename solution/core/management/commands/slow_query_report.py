@@ -0,0 +1,73 @@
+import json
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from app.settings import SLOW_QUERY_LOG
+from core.slow_queries import read_log, normalize_sql, plan_shape
+
+
+class Command(BaseCommand):
+    help = "Aggregates the slow query log by fingerprint: count, latency, routes and plan changes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=SLOW_QUERY_LOG)
+        parser.add_argument("--since", type=datetime.fromisoformat, help="ISO timestamp with timezone")
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, log, since, top, **options):
+        groups = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": defaultdict(int), "plans": {}})
+
+        for entry in read_log(Path(log)):
+            if since and datetime.fromisoformat(entry["at"]) < since:
+                continue
+            group = groups[entry["fingerprint"]]
+            group["count"] += 1
+            group["total_ms"] += entry["duration_ms"]
+            group["max_ms"] = max(group["max_ms"], entry["duration_ms"])
+            group["routes"][entry["route"] or "-"] += 1
+            group["sql"] = normalize_sql(entry["sql"])
+            if plan := entry.get("plan"):
+                # last plan per shape, shapes in order of first appearance
+                group["plans"][plan_shape(plan)] = {
+                    "at": entry["at"],
+                    "execution_ms": plan.get("Execution Time"),
+                    "total_cost": plan["Plan"].get("Total Cost"),
+                }
+
+        report = sorted(
+            (
+                {
+                    "fingerprint": key,
+                    "count": group["count"],
+                    "total_ms": round(group["total_ms"], 2),
+                    "mean_ms": round(group["total_ms"] / group["count"], 2),
+                    "max_ms": group["max_ms"],
+                    "routes": dict(group["routes"]),
+                    "plan_changed": len(group["plans"]) > 1,
+                    "plans": [{"shape": shape, **info} for shape, info in group["plans"].items()],
+                    "sql": group["sql"],
+                }
+                for key, group in groups.items()
+            ),
+            key=lambda item: item["total_ms"],
+            reverse=True,
+        )[:top]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        for item in report:
+            flag = self.style.WARNING(" PLAN CHANGED") if item["plan_changed"] else ""
+            self.stdout.write(
+                f"{item['fingerprint']}  x{item['count']}  total {item['total_ms']}ms  "
+                f"mean {item['mean_ms']}ms  max {item['max_ms']}ms{flag}"
+            )
+            self.stdout.write(f"  routes: {', '.join(f'{route} ({count})' for route, count in item['routes'].items())}")
+            for plan in item["plans"]:
+                self.stdout.write(f"  plan {plan['at']}: {plan['shape']} (execution {plan['execution_ms']}ms)")
+            self.stdout.write(f"  {item['sql'][:500]}\n")
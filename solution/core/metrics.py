@@ -0,0 +1,159 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from core.hashing import hashing_pool
+
+# Per-request counters live in a contextvar, so they follow the request into
+# sync_to_async threads and async views alike. Finished requests are folded into
+# a process-wide registry rendered in the Prometheus text format by /api/metrics.
+# Every gunicorn worker keeps its own registry, the scraper sums them up.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TIMED_KINDS = ("db", "redis", "antifraud")
+
+_request_metrics = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self, request=None):
+        self.request = request
+        self.started = time.perf_counter()
+        self.calls = dict.fromkeys(TIMED_KINDS, 0)
+        self.seconds = dict.fromkeys(TIMED_KINDS, 0.0)
+
+    def record(self, kind: str, duration: float) -> None:
+        self.calls[kind] += 1
+        self.seconds[kind] += duration
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        units = {"db": "queries", "redis": "calls", "antifraud": "calls"}
+        entries = [
+            f'{kind};dur={self.seconds[kind] * 1000:.2f};desc="{self.calls[kind]} {units[kind]}"'
+            for kind in TIMED_KINDS
+        ]
+        entries.append(f"total;dur={self.total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def collect_request_metrics(request=None):
+    metrics = RequestMetrics(request)
+    token = _request_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _request_metrics.reset(token)
+
+
+def current_route() -> str | None:
+    """"GET api/user/feed" for the request being served, None outside of one."""
+    if (metrics := _request_metrics.get()) is None or metrics.request is None:
+        return None
+    match = metrics.request.resolver_match
+    return f"{metrics.request.method} {match.route if match else metrics.request.path}"
+
+
+@contextmanager
+def timed(kind: str):
+    """Adds the duration of the block to the current request, no-op outside of one."""
+    if (metrics := _request_metrics.get()) is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record(kind, time.perf_counter() - started)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    if (metrics := _request_metrics.get()) is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record("db", time.perf_counter() - started)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """connection_created handler, the pool reconnects the same wrapper object many times."""
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels)
+
+
+class _Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (method, route, status) -> [bucket counts..., sum, count]
+        self._counters = {}  # (name, (method, route)) -> value
+
+    def observe(self, method: str, route: str, status: int, metrics: RequestMetrics) -> None:
+        duration = metrics.total
+        key = (method, route, str(status))
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    histogram[index] += 1
+            histogram[-2] += duration
+            histogram[-1] += 1
+
+            for kind in TIMED_KINDS:
+                for name, value in (
+                        (f"http_request_{kind}_calls_total", metrics.calls[kind]),
+                        (f"http_request_{kind}_seconds_total", metrics.seconds[kind]),
+                ):
+                    counter_key = (name, (method, route))
+                    self._counters[counter_key] = self._counters.get(counter_key, 0) + value
+
+    def render(self, gauges: dict) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+            counters = dict(self._counters)
+
+        for (method, route, status), histogram in sorted(histograms.items()):
+            labels = _labels((("method", method), ("route", route), ("status", status)))
+            for bound, count in zip(LATENCY_BUCKETS, histogram):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {histogram[-2]}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {histogram[-1]}")
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, (method, route)), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{name}{{{_labels((('method', method), ('route', route)))}}} {value}")
+
+        for name, value in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = _Registry()
+
+
+def render_metrics() -> str:
+    gauges = {f"password_hashing_{name}": value for name, value in hashing_pool.stats().items()}
+    return registry.render(gauges)
@@ -1,15 +1,187 @@
+import hmac
+import random
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async, async_to_sync
+from django.core.exceptions import MiddlewareNotUsed
 from django.http import JsonResponse
 from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+
+from app.settings import METRICS_ENABLED, PROFILING_TOKEN, PROFILING_SAMPLE_RATE, TRACING_ENABLED
+from core.metrics import collect_request_metrics, registry
+from core.profiling import Sampler, save_profile
+from core.routers import pin_to_primary
+from core.tokens import is_signed_token, load_signed_token
+from core.tracing import start_trace, activate
+
+
+class TracingMiddleware:
+    """Root span of the request, continues the caller's traceparent when there is one."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not TRACING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        return start_trace(
+            f"{request.method} {request.path}",
+            request.headers.get("traceparent"),
+            **{"http.method": request.method, "http.target": request.get_full_path()},
+        )
+
+    def _finish(self, root, request, response):
+        if match := request.resolver_match:
+            root.name = f"{request.method} {match.route}"
+            root.attributes["http.route"] = match.route
+            root.attributes["code.function"] = getattr(match.func, "view_class", match.func).__name__
+        root.attributes["http.status_code"] = response.status_code
+        if root.sampled:
+            response["X-Trace-Id"] = root.trace_id
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with activate(self._start(request)) as root:
+            return self._finish(root, request, self.get_response(request))
+
+    async def __acall__(self, request):
+        with activate(self._start(request)) as root:
+            return self._finish(root, request, await self.get_response(request))
+
+
+class RequestMetricsMiddleware:
+    """
+    Counts SQL queries, Redis calls and antifraud requests made while serving the
+    request, returns them in Server-Timing and feeds the /api/metrics histograms.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _after(self, request, response, metrics):
+        route = request.resolver_match.route if request.resolver_match else "unmatched"
+        registry.observe(request.method, route, response.status_code, metrics)
+        response["Server-Timing"] = metrics.server_timing()
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with collect_request_metrics(request) as metrics:
+            return self._after(request, self.get_response(request), metrics)
+
+    async def __acall__(self, request):
+        with collect_request_metrics(request) as metrics:
+            return self._after(request, await self.get_response(request), metrics)
+
+
+def has_profiling_token(request) -> bool:
+    token = request.headers.get("X-Profile-Token")
+    return bool(PROFILING_TOKEN and token and hmac.compare_digest(token, PROFILING_TOKEN))
+
+
+class ProfilingMiddleware:
+    """
+    Samples the call stacks of a request carrying X-Profile-Token, or of a
+    PROFILING_SAMPLE_RATE share of requests, and answers with X-Profile-Id.
+    Other requests go straight through.
+    """
+    sync_capable = True
+    async_capable = True
 
-class ValidateAuthTokenMiddleware:
     def __init__(self, get_response):
+        if not PROFILING_TOKEN and not PROFILING_SAMPLE_RATE:
+            raise MiddlewareNotUsed()
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _should_profile(self, request) -> bool:
+        return has_profiling_token(request) or bool(PROFILING_SAMPLE_RATE and random.random() < PROFILING_SAMPLE_RATE)
+
+    def _profile(self, request, get_response):
+        with Sampler(threading.get_ident()) as sampler:
+            response = get_response(request)
+        response["X-Profile-Id"] = save_profile(sampler, request, response)
+        return response
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._should_profile(request):
+            return self.get_response(request)
+        return self._profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not self._should_profile(request):
+            return await self.get_response(request)
+        # Drive the request from one worker thread: sync views and the ORM calls of
+        # async views are thread-sensitive, so they all run on the sampled thread.
+        return await sync_to_async(self._profile)(request, async_to_sync(self.get_response))
+
+
+class ValidateAuthTokenMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _validate(self, request):
         auth_header = request.headers.get('Authorization')
         if auth_header:
             token = auth_header.split(' ')[-1]
             if not (5 <= len(token) <= 300):
                 return JsonResponse({"error": 'Token must be between 5 and 300 characters.'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        return self.get_response(request)
\ No newline at end of file
+            if is_signed_token(token):
+                if (payload := load_signed_token(token)) is None:
+                    return JsonResponse({"error": 'Invalid or expired token.'}, status=status.HTTP_401_UNAUTHORIZED)
+                request.token_payload = payload
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._validate(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self._validate(request) or await self.get_response(request)
+
+
+class ReplicaStickinessMiddleware:
+    """Pins the caller's token to the primary after any successful write."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _after(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._after(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._after(request, await self.get_response(request))
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_emailpassworduser_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailpassworduser',
+            name='token_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0003_emailpassworduser_token_version'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='emailpassworduser',
+            constraint=models.UniqueConstraint(fields=('email', 'model_type'), name='unique_email_per_model_type'),
+        ),
+    ]
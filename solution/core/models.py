@@ -1,14 +1,37 @@
 import uuid
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinLengthValidator, MaxLengthValidator, RegexValidator
 from django.db import models
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+
+from core.tokens import SignedTokenUser, cache_token_version, get_cached_token_version
 
 
 class BearerTokenAuthentication(TokenAuthentication):
     keyword = 'Bearer'
 
+    def authenticate(self, request):
+        # signed tokens are already verified by ValidateAuthTokenMiddleware
+        if (payload := getattr(request._request, "token_payload", None)) is not None:
+            principal = SignedTokenUser(payload)
+            self.check_token_version(principal)
+            return principal, payload
+        return super().authenticate(request)
+
+    @staticmethod
+    def check_token_version(principal):
+        """Revoked signed tokens are rejected here, for every view, db tokens are simply deleted."""
+        version = get_cached_token_version(principal.uuid)
+        if version is None:
+            version = EmailPasswordUser.objects.filter(uuid=principal.uuid).values_list("token_version", flat=True).first()
+            if version is None:
+                raise AuthenticationFailed("Токен отозван.")
+            cache_token_version(principal.uuid, version)
+        if principal.token_version != version:
+            raise AuthenticationFailed("Токен отозван.")
+
 def password_length_validator(value):
     if len(value) > 60:
         raise ValidationError("Password must not exceed 60 characters.")
@@ -30,8 +53,26 @@ class EmailPasswordUser(AbstractUser):
 
     model_type = models.CharField(choices=[('BUSINESS', 'Business'), ('USER', 'User')], blank=True, null=True)
     username = models.CharField(max_length=120)
+    token_version = models.IntegerField(default=0)
     USERNAME_FIELD = "uuid"
     REQUIRED_FIELDS = ["password"]
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # users and businesses may share an email, accounts of one type may not
+            models.UniqueConstraint(fields=["email", "model_type"], name="unique_email_per_model_type"),
+        ]
+
     def __str__(self):
         return str(self.uuid)
+
+
+class OutboxEvent(models.Model):
+    """
+    Domain event written in the same transaction as the change it describes,
+    manage.py relay_outbox moves the rows to the analytics sink and deletes them.
+    """
+    id = models.BigAutoField(primary_key=True)
+    type = models.CharField(max_length=32)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
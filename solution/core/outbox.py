@@ -0,0 +1,58 @@
+import json
+import os
+import socket
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from app.settings import OUTBOX_SINK_DIR
+from core.models import OutboxEvent
+
+# Transactional outbox for analytics. Writers add an OutboxEvent inside the
+# transaction of the change itself, so an event exists exactly when the change
+# was committed. relay() drains committed events in id order to append-only
+# NDJSON files: a batch is written and fsynced before its rows are deleted, so
+# delivery is at least once and consumers deduplicate by the event id.
+
+
+def record(type: str, **payload) -> None:
+    """Call inside the transaction of the change."""
+    OutboxEvent.objects.create(type=type, payload=payload)
+
+
+def record_many(type: str, payloads) -> None:
+    OutboxEvent.objects.bulk_create([OutboxEvent(type=type, payload=payload) for payload in payloads])
+
+
+def _sink_path(sink_dir: Path) -> Path:
+    # one file per relay process and hour, concurrent relays never interleave lines
+    hour = datetime.now(timezone.utc).strftime("%Y%m%d-%H")
+    return sink_dir / f"events-{hour}-{socket.gethostname()}-{os.getpid()}.ndjson"
+
+
+def relay(batch_size: int, sink_dir: Path = Path(OUTBOX_SINK_DIR)) -> int:
+    """Moves one batch to the sink, returns its size. SKIP LOCKED lets several relays drain in parallel."""
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .order_by("id")
+            .values_list("id", "type", "payload", "created_at")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        sink_dir.mkdir(parents=True, exist_ok=True)
+        with _sink_path(sink_dir).open("a", encoding="utf-8") as sink:
+            sink.writelines(
+                json.dumps(
+                    {"id": id, "type": type, "at": created_at, **payload}, cls=DjangoJSONEncoder, ensure_ascii=False
+                ) + "\n"
+                for id, type, payload, created_at in events
+            )
+            sink.flush()
+            os.fsync(sink.fileno())
+
+        OutboxEvent.objects.filter(id__in=[event[0] for event in events]).delete()
+    return len(events)
@@ -0,0 +1,99 @@
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from app.settings import BASE_DIR, PROFILING_DIR, PROFILING_INTERVAL, PROFILING_KEEP
+
+# Sampling profiler for single requests. A background thread reads the stack of
+# the request thread from sys._current_frames() every PROFILING_INTERVAL seconds
+# and counts identical stacks. Output is the folded format (one "a;b;c count"
+# line per stack) that flamegraph.pl and speedscope read directly.
+
+PROFILE_ID_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+
+_profiles_dir = Path(PROFILING_DIR)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    try:
+        filename = str(Path(filename).relative_to(BASE_DIR))
+    except ValueError:
+        filename = "/".join(Path(filename).parts[-2:])  # site-packages/django/... -> django/...
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+
+
+class Sampler:
+    def __init__(self, thread_id: int, interval: float = PROFILING_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if (frame := sys._current_frames().get(self.thread_id)) is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def save_profile(sampler: Sampler, request, response) -> str:
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    _profiles_dir.mkdir(parents=True, exist_ok=True)
+    (_profiles_dir / f"{profile_id}.folded").write_text(sampler.folded())
+    (_profiles_dir / f"{profile_id}.json").write_text(json.dumps({
+        "id": profile_id,
+        "method": request.method,
+        "path": request.get_full_path(),
+        "route": request.resolver_match.route if request.resolver_match else None,
+        "status": response.status_code,
+        "duration_ms": round(sampler.duration * 1000, 2),
+        "samples": sum(sampler.stacks.values()),
+        "interval_ms": sampler.interval * 1000,
+    }))
+    _prune()
+    return profile_id
+
+
+def _prune():
+    metas = sorted(_profiles_dir.glob("*.json"))
+    for meta in metas[:max(0, len(metas) - PROFILING_KEEP)]:
+        meta.unlink(missing_ok=True)
+        meta.with_suffix(".folded").unlink(missing_ok=True)
+
+
+def list_profiles() -> list[dict]:
+    if not _profiles_dir.exists():
+        return []
+    return [json.loads(meta.read_text()) for meta in sorted(_profiles_dir.glob("*.json"), reverse=True)]
+
+
+def load_profile(profile_id: str) -> str | None:
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = _profiles_dir / f"{profile_id}.folded"
+    return path.read_text() if path.exists() else None
@@ -0,0 +1,41 @@
+import asyncio
+import weakref
+
+import redis
+import redis.asyncio
+
+from app.settings import REDIS_HOST, REDIS_PORT, REDIS_DB
+from core.metrics import timed
+from core.tracing import span
+
+
+class Redis(redis.Redis):
+    """Every command is counted into the request metrics and traced."""
+
+    def execute_command(self, *args, **options):
+        with timed("redis"), span(f"redis {args[0]}", "client", **{"db.system": "redis"}):
+            return super().execute_command(*args, **options)
+
+
+class AsyncRedis(redis.asyncio.Redis):
+    async def execute_command(self, *args, **options):
+        with timed("redis"), span(f"redis {args[0]}", "client", **{"db.system": "redis"}):
+            return await super().execute_command(*args, **options)
+
+
+redis_conn = Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB,
+)
+
+
+# async clients are bound to the event loop they were created in
+_async_conns = weakref.WeakKeyDictionary()
+
+
+def get_async_redis() -> AsyncRedis:
+    loop = asyncio.get_running_loop()
+    if loop not in _async_conns:
+        _async_conns[loop] = AsyncRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+    return _async_conns[loop]
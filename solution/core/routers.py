@@ -0,0 +1,76 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from rest_framework.permissions import SAFE_METHODS
+
+from app.settings import REPLICA_DATABASES, REPLICA_STICKY_SECONDS
+from core.redis_client import redis_conn
+
+_read_from_replica = ContextVar("read_from_replica", default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _read_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Everything goes to the primary unless the current request runs inside
+    replica_reads(), which only ReadReplicaMixin views turn on.
+    """
+
+    def db_for_read(self, model, **hints):
+        if REPLICA_DATABASES and _read_from_replica.get():
+            return random.choice(REPLICA_DATABASES)
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+def _sticky_key(request):
+    if not (auth_header := request.headers.get("Authorization")):
+        return None
+    return f"replica:pinned:{hashlib.sha256(auth_header.encode()).hexdigest()}"
+
+
+def pin_to_primary(request):
+    """Called after a successful write: the same token reads its own writes for a while."""
+    if REPLICA_DATABASES and (key := _sticky_key(request)):
+        redis_conn.set(key, 1, ex=REPLICA_STICKY_SECONDS)
+
+
+def is_pinned_to_primary(request) -> bool:
+    if not REPLICA_DATABASES:
+        return True
+    key = _sticky_key(request)
+    return key is not None and redis_conn.exists(key) > 0
+
+
+class ReadReplicaMixin:
+    """For read-only endpoints: safe requests read from a replica unless the caller wrote recently."""
+
+    def dispatch(self, request, *args, **kwargs):
+        use_replica = request.method in SAFE_METHODS and not is_pinned_to_primary(request)
+        if iscoroutinefunction(super().dispatch):
+            return self._adispatch(use_replica, request, *args, **kwargs)
+        with replica_reads(use_replica):
+            return super().dispatch(request, *args, **kwargs)
+
+    async def _adispatch(self, use_replica, request, *args, **kwargs):
+        with replica_reads(use_replica):
+            return await super().dispatch(request, *args, **kwargs)
@@ -1,5 +1,3 @@
-from collections import OrderedDict
-
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
@@ -8,12 +6,20 @@ class ClearNullMixin(serializers.Serializer):
     def to_representation(self, instance):
         result = super().to_representation(instance)
 
-        if result.get("max_count") is not None and result.get("target") is None: # =)
+        if result.get("max_count") is not None and "target" in result and result["target"] is None: # =)
             result["target"] = {}
 
-        return OrderedDict(
-            [(key, result[key]) for key in result if result[key] is not None]
-        )
+        return {key: value for key, value in result.items() if value is not None}
+
+class SparseFieldsMixin:
+    """Keeps only the fields in context["fields"] (?fields=), dropped method fields never run their queries."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if (requested := self.context.get("fields")) is not None:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
 
 class StrictFieldMixin:
     base_type = None
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.settings import SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_LOG, SLOW_QUERY_EXPLAIN_RATE
+from core.metrics import current_route
+
+# Statements slower than SLOW_QUERY_THRESHOLD_MS are appended to SLOW_QUERY_LOG as
+# NDJSON with the route and parameters. A SLOW_QUERY_EXPLAIN_RATE share of slow
+# SELECTs is run again under EXPLAIN (ANALYZE, BUFFERS) on a separate cursor, so
+# the plan sits next to the timing. manage.py slow_query_report groups the log by
+# fingerprint.
+
+_log_lock = threading.Lock()
+_log_path = Path(SLOW_QUERY_LOG)
+
+_IN_LIST_RE = re.compile(r"\bIN \((?:%s, )*%s\)", re.IGNORECASE)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Same text for the same statement shape: literals and IN lists collapsed."""
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    sql = _LITERAL_RE.sub("?", sql)
+    return _SPACES_RE.sub(" ", sql).strip()
+
+
+def fingerprint(sql: str) -> str:
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()[:16]
+
+
+def _is_select(sql: str) -> bool:
+    # EXPLAIN ANALYZE executes the statement, anything that writes is never explained
+    return sql.lstrip().upper().startswith("SELECT") and " FOR UPDATE" not in sql.upper()
+
+
+def _explain(connection, sql, params):
+    # raw cursor: bypasses the wrappers and leaves the caller's result set alone
+    with connection.connection.cursor() as cursor:
+        if connection.in_atomic_block:  # a failing EXPLAIN must not abort the caller's transaction
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+            return cursor.fetchone()[0][0]
+        except Exception:
+            if connection.in_atomic_block:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        finally:
+            if connection.in_atomic_block:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+
+
+def _write(entry: dict) -> None:
+    line = json.dumps(entry, default=str, ensure_ascii=False) + "\n"
+    with _log_lock:
+        _log_path.parent.mkdir(parents=True, exist_ok=True)
+        with _log_path.open("a", encoding="utf-8") as log:
+            log.write(line)
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms < SLOW_QUERY_THRESHOLD_MS:
+        return result
+
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "duration_ms": round(duration_ms, 2),
+        "route": current_route(),
+        "fingerprint": fingerprint(sql),
+        "sql": sql,
+        "params": None if many else params,
+    }
+    connection = context["connection"]
+    if not many and _is_select(sql) and random.random() < SLOW_QUERY_EXPLAIN_RATE \
+            and connection.vendor == "postgresql" and not connection.needs_rollback:
+        try:
+            entry["plan"] = _explain(connection, sql, params)
+        except Exception as exc:
+            entry["explain_error"] = str(exc)
+    _write(entry)
+    return result
+
+
+def install_slow_query_wrapper(sender, connection, **kwargs):
+    if SLOW_QUERY_THRESHOLD_MS and slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_wrapper)
+
+
+def plan_shape(plan: dict) -> str:
+    """Node types and the relations/indexes they touch, without costs: changes when the plan does."""
+    node = plan.get("Plan", plan)
+    label = node["Node Type"]
+    if target := node.get("Index Name") or node.get("Relation Name"):
+        label += f"[{target}]"
+    children = ",".join(plan_shape(child) for child in node.get("Plans", ()))
+    return f"{label}({children})" if children else label
+
+
+def read_log(path: Path = _log_path):
+    if not path.exists():
+        return
+    with path.open(encoding="utf-8") as log:
+        for line in log:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,141 @@
+import json
+import time
+import traceback
+import uuid
+
+from django.db import close_old_connections, transaction
+
+from app.settings import TASKS_EAGER, TASKS_DEAD_LIMIT
+from core.redis_client import redis_conn
+
+# Background tasks on the existing Redis, for side effects the response does not
+# wait for. delay() pushes a JSON message onto a list per queue once the current
+# transaction commits, `manage.py run_tasks` pops and runs them. A failed task is
+# retried with exponential backoff through a sorted set of scheduled messages, and
+# after max_retries lands in the dead-letter list. Delivery is at most once per
+# attempt: a worker killed mid-task loses it, so only non-critical work goes here.
+# TASKS_EAGER=1 runs tasks inline at delay() time, for local runs without a worker.
+# debounce() folds a burst of triggers with the same key into one delayed run.
+
+QUEUE_KEY = "tasks:queue:{}"
+SCHEDULED_KEY = "tasks:scheduled"
+DEAD_KEY = "tasks:dead"
+DEBOUNCE_KEY = "tasks:debounce:{}:{}"
+
+registry = {}
+
+# moves due scheduled messages to their queues atomically, so two workers never take the same one
+_PROMOTE_DUE = redis_conn.register_script("""
+local due = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, 100)
+for _, message in ipairs(due) do
+    redis.call("ZREM", KEYS[1], message)
+    redis.call("LPUSH", "tasks:queue:" .. cjson.decode(message)["queue"], message)
+end
+return #due
+""")
+
+
+class Task:
+    def __init__(self, func, name, queue, max_retries, retry_delay):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def _message(self, args, kwargs) -> str:
+        return json.dumps({
+            "id": uuid.uuid4().hex,
+            "task": self.name,
+            "queue": self.queue,
+            "args": args,
+            "kwargs": kwargs,
+            "attempt": 0,
+        })
+
+    def delay(self, *args, **kwargs) -> None:
+        """Runs the task in a worker after the current transaction commits. Arguments must be JSON."""
+        message = self._message(args, kwargs)
+        if TASKS_EAGER:
+            transaction.on_commit(lambda: self._run_eager(message))
+        else:
+            transaction.on_commit(lambda: redis_conn.lpush(QUEUE_KEY.format(self.queue), message))
+
+    def debounce(self, key, seconds: float, *args, **kwargs) -> None:
+        """
+        delay() that runs seconds later, once for every debounce() with the same key in
+        between: a burst of triggers costs one run, and that run sees the state after it.
+        """
+        message = self._message(args, kwargs)
+        if TASKS_EAGER:
+            transaction.on_commit(lambda: self._run_eager(message))
+        else:
+            transaction.on_commit(lambda: self._schedule_once(key, seconds, message))
+
+    def _schedule_once(self, key, seconds: float, message: str) -> None:
+        if redis_conn.set(DEBOUNCE_KEY.format(self.name, key), 1, nx=True, px=int(seconds * 1000)):
+            redis_conn.zadd(SCHEDULED_KEY, {message: time.time() + seconds})
+
+    def _run_eager(self, message):
+        message = json.loads(message)  # same argument round trip as through Redis
+        self.func(*message["args"], **message["kwargs"])
+
+
+def task(name=None, queue="default", max_retries=3, retry_delay=5.0):
+    """Registers a function as a task, retried max_retries times, retry_delay * 2**attempt seconds apart."""
+    def decorator(func):
+        registered = Task(func, name or f"{func.__module__}.{func.__qualname__}", queue, max_retries, retry_delay)
+        registry[registered.name] = registered
+        return registered
+
+    return decorator
+
+
+def promote_due_tasks() -> int:
+    return _PROMOTE_DUE(keys=[SCHEDULED_KEY], args=[time.time()])
+
+
+def _dead_letter(message: dict, error: str) -> None:
+    redis_conn.pipeline() \
+        .lpush(DEAD_KEY, json.dumps({**message, "error": error, "failed_at": time.time()})) \
+        .ltrim(DEAD_KEY, 0, TASKS_DEAD_LIMIT - 1) \
+        .execute()
+
+
+def run_message(raw: bytes) -> bool:
+    """Runs one popped message, schedules a retry or dead-letters it on failure. True on success."""
+    message = json.loads(raw)
+    if (registered := registry.get(message["task"])) is None:
+        _dead_letter(message, f"unknown task {message['task']}")
+        return False
+
+    close_old_connections()  # the worker's equivalent of a request boundary
+    try:
+        registered.func(*message["args"], **message["kwargs"])
+        return True
+    except Exception:
+        error = traceback.format_exc()
+        message["attempt"] += 1
+        if message["attempt"] > registered.max_retries:
+            _dead_letter(message, error)
+        else:
+            retry_at = time.time() + registered.retry_delay * 2 ** (message["attempt"] - 1)
+            redis_conn.zadd(SCHEDULED_KEY, {json.dumps(message): retry_at})
+        return False
+    finally:
+        close_old_connections()
+
+
+def requeue_dead(limit=None) -> int:
+    """Puts dead-lettered messages back on their queues with a fresh attempt counter."""
+    requeued = 0
+    while (limit is None or requeued < limit) and (raw := redis_conn.rpop(DEAD_KEY)):
+        message = json.loads(raw)
+        message.pop("error", None)
+        message.pop("failed_at", None)
+        redis_conn.lpush(QUEUE_KEY.format(message["queue"]), json.dumps({**message, "attempt": 0}))
+        requeued += 1
+    return requeued
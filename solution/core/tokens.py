@@ -0,0 +1,92 @@
+import uuid
+
+from django.core import signing
+from django.db.models import F
+from rest_framework.authtoken.models import Token
+from redis.exceptions import RedisError
+
+from app.settings import AUTH_TOKEN_MODE, SIGNED_TOKEN_MAX_AGE
+from core.redis_client import redis_conn
+
+SIGNED_TOKEN_SALT = "core.tokens.signed"
+# current token_version per account, so signed tokens are checked on every request
+# without a database read; revoke_tokens overwrites it, the TTL bounds a missed write
+TOKEN_VERSION_TTL = 5 * 60
+
+
+class SignedTokenUser:
+    """
+    Principal restored from a signed token, no database row behind it.
+    BearerTokenAuthentication has already compared token_version with the current one.
+    """
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+
+    def __init__(self, payload: dict):
+        self.uuid = uuid.UUID(payload["uuid"])  # compared with the uuid fields of loaded rows
+        self.model_type = payload["model_type"]
+        self.token_version = payload["ver"]
+
+    def __str__(self):
+        return str(self.uuid)
+
+
+def is_signed_token(token: str) -> bool:
+    return ":" in token  # db tokens are plain hex keys
+
+
+def load_signed_token(token: str) -> dict | None:
+    try:
+        return signing.loads(token, salt=SIGNED_TOKEN_SALT, max_age=SIGNED_TOKEN_MAX_AGE)
+    except signing.BadSignature:  # also covers SignatureExpired
+        return None
+
+
+def _make_signed_token(user) -> str:
+    payload = {
+        "uuid": str(user.uuid),
+        "model_type": user.model_type,
+        "ver": user.token_version,
+    }
+    return signing.dumps(payload, salt=SIGNED_TOKEN_SALT)
+
+
+def _token_version_key(account_uuid) -> str:
+    return f"token:version:{account_uuid}"
+
+
+def get_cached_token_version(account_uuid) -> int | None:
+    try:
+        version = redis_conn.get(_token_version_key(account_uuid))
+    except RedisError:  # the database is read instead
+        return None
+    return None if version is None else int(version)
+
+
+def cache_token_version(account_uuid, version: int) -> None:
+    try:
+        redis_conn.set(_token_version_key(account_uuid), version, ex=TOKEN_VERSION_TTL)
+    except RedisError:
+        pass
+
+
+def revoke_tokens(user) -> None:
+    """Invalidates every token issued to the user so far, both signed and db-backed."""
+    Token.objects.filter(user=user).delete()
+    type(user).objects.filter(pk=user.pk).update(token_version=F("token_version") + 1)
+    user.refresh_from_db(fields=["token_version"])
+    cache_token_version(user.uuid, user.token_version)
+
+
+def issue_token(user, revoke_previous=True) -> str:
+    """
+    Login keeps a single active session per account: previous tokens are revoked
+    before the new one is issued, in both modes.
+    """
+    if revoke_previous:
+        revoke_tokens(user)
+
+    if AUTH_TOKEN_MODE == "signed":
+        return _make_signed_token(user)
+    return Token.objects.create(user=user).key
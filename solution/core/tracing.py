@@ -0,0 +1,226 @@
+import json
+import logging
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+import requests
+from rest_framework import serializers
+
+from app.settings import TRACING_SAMPLE_RATIO, TRACING_EXPORTER, TRACING_FILE, TRACING_OTLP_ENDPOINT, \
+    TRACING_SERVICE_NAME
+
+# Minimal W3C trace-context tracing. The middleware starts a server span per request,
+# continuing an incoming traceparent or sampling a TRACING_SAMPLE_RATIO share of new
+# traces. Child spans (serializers, queries, Redis commands, antifraud calls) attach
+# to the span in the contextvar. Unsampled requests only carry ids for propagation,
+# span() is a no-op for them. Finished traces go to an NDJSON file or to an OTLP/HTTP
+# collector from a background thread.
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_current_span = ContextVar("current_span", default=None)
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "sampled", "attributes", "error",
+                 "start_ns", "end_ns", "_finished")
+
+    def __init__(self, name, trace_id, parent_id=None, kind="internal", sampled=True, finished=None, **attributes):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.attributes = attributes
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._finished = [] if finished is None else finished  # shared by all spans of the trace
+
+    def child(self, name, kind="internal", **attributes):
+        return Span(name, self.trace_id, self.span_id, kind, self.sampled, self._finished, **attributes)
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        self._finished.append(self)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def start_trace(name, traceparent=None, **attributes) -> Span:
+    """Root span of a request, sampled when the caller's trace is or by TRACING_SAMPLE_RATIO."""
+    if traceparent and (match := TRACEPARENT_RE.match(traceparent.strip().lower())):
+        trace_id, parent_id, flags = match.groups()
+        sampled = bool(int(flags, 16) & 1)
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+        sampled = random.random() < TRACING_SAMPLE_RATIO
+    return Span(name, trace_id, parent_id, "server", sampled, **attributes)
+
+
+@contextmanager
+def activate(root: Span):
+    token = _current_span.set(root)
+    try:
+        yield root
+    except Exception as exc:
+        root.error = repr(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        root.end()
+        if root.sampled:
+            exporter.export(root._finished)
+
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    """Child of the current span; yields None and records nothing outside a sampled trace."""
+    if (parent := _current_span.get()) is None or not parent.sampled:
+        yield None
+        return
+    current = parent.child(name, kind, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as exc:
+        current.error = repr(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def outgoing_headers() -> dict:
+    """traceparent of the current span for outbound HTTP calls, empty outside a request."""
+    if (current := _current_span.get()) is None:
+        return {}
+    return {"traceparent": current.traceparent}
+
+
+def tracing_query_wrapper(execute, sql, params, many, context):
+    if (parent := _current_span.get()) is None or not parent.sampled:
+        return execute(sql, params, many, context)
+    with span("db.query", "client", **{"db.system": context["connection"].vendor, "db.statement": sql[:2000]}):
+        return execute(sql, params, many, context)
+
+
+def install_tracing_query_wrapper(sender, connection, **kwargs):
+    if tracing_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(tracing_query_wrapper)
+
+
+def install_serializer_spans():
+    """Wraps Serializer.data and is_valid, the DRF layer has no hook of its own."""
+    def traced_data(fget):
+        def data(self):
+            name = type(getattr(self, "child", self)).__name__
+            with span(f"serialize {name}", **{"serializer.many": isinstance(self, serializers.ListSerializer)}):
+                return fget(self)
+        return property(data)
+
+    def traced_is_valid(is_valid):
+        def wrapper(self, *args, **kwargs):
+            with span(f"validate {type(self).__name__}"):
+                return is_valid(self, *args, **kwargs)
+        return wrapper
+
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        cls.data = traced_data(cls.data.fget)
+    serializers.BaseSerializer.is_valid = traced_is_valid(serializers.BaseSerializer.is_valid)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_payload(spans) -> dict:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACING_SERVICE_NAME}}]},
+        "scopeSpans": [{
+            "scope": {"name": "core.tracing"},
+            "spans": [
+                {
+                    "traceId": item.trace_id,
+                    "spanId": item.span_id,
+                    **({"parentSpanId": item.parent_id} if item.parent_id else {}),
+                    "name": item.name,
+                    "kind": SPAN_KINDS[item.kind],
+                    "startTimeUnixNano": str(item.start_ns),
+                    "endTimeUnixNano": str(item.end_ns),
+                    "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in item.attributes.items()],
+                    "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+                }
+                for item in spans
+            ],
+        }],
+    }]}
+
+
+class _Exporter:
+    """Ships finished traces from a daemon thread, requests never wait on the collector."""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def export(self, spans):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(list(spans))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                if TRACING_EXPORTER == "otlp":
+                    requests.post(TRACING_OTLP_ENDPOINT, json=_otlp_payload(spans), timeout=5)
+                else:
+                    path = Path(TRACING_FILE)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    with path.open("a", encoding="utf-8") as file:
+                        file.writelines(json.dumps(item.to_dict(), default=str) + "\n" for item in spans)
+            except Exception:
+                logger.warning("trace export failed, %d spans dropped", len(spans), exc_info=True)
+
+
+exporter = _Exporter()
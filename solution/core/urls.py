@@ -1,6 +1,9 @@
 from django.urls import path
-from .views import ping
+from .views import ping, metrics, profiles, profile
 
 urlpatterns = [
     path("ping", ping),
+    path("metrics", metrics),
+    path("profiles", profiles),
+    path("profiles/<str:profile_id>", profile),
 ]
\ No newline at end of file
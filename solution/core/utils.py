@@ -1,7 +1,17 @@
+import dataclasses
 import uuid
+from functools import cache
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.query import ValuesListIterable
 from django_countries.fields import countries as isocountries
 from rest_framework.exceptions import ValidationError
 
+from core.hashing import hash_password
+from core.tokens import issue_token
+
 
 def is_valid_uuid(*uuid_list) -> bool:
     try:
@@ -26,4 +36,97 @@ def clean_country(country) -> list[str]:
         if len(country_item) != 2 or not isinstance(country_item, str):
             raise ValidationError
 
-    return country
\ No newline at end of file
+    return country
+
+
+def register_account(serializer, model_type: str, hashed_password: str = None):
+    """
+    Creates the account and its token in one transaction. Email uniqueness is left
+    to the unique_email_per_model_type constraint, callers map its IntegrityError to 409.
+    """
+    if hashed_password is None:
+        hashed_password = hash_password(serializer.validated_data["password"])
+
+    with transaction.atomic():
+        account = serializer.save(password=hashed_password, model_type=model_type)
+        token = issue_token(account, revoke_previous=False)
+    return account, token
+
+
+def is_duplicate_email(exc: IntegrityError) -> bool:
+    """True when the IntegrityError comes from unique_email_per_model_type, any other one is a bug, not a 409."""
+    return getattr(getattr(exc.__cause__, "diag", None), "constraint_name", None) == "unique_email_per_model_type"
+
+
+def subquery_count(queryset, outer_field: str):
+    """Correlated COUNT(*) of queryset rows pointing at the outer row, 0 when there are none."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{outer_field: OuterRef("pk")})
+            .order_by()
+            .values(outer_field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def subquery_sum(queryset, outer_field: str, field: str):
+    """Correlated SUM(field) of queryset rows pointing at the outer row, 0 when there are none."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{outer_field: OuterRef("pk")})
+            .order_by()
+            .values(outer_field)
+            .annotate(total=Sum(field))
+            .values("total")
+        ),
+        0,
+    )
+
+
+@cache
+def _row_iterable(row_class, attributes):
+    # a subclass per row class and column set: querysets keep _iterable_class across slicing and cloning
+    if attributes == tuple(field.name for field in dataclasses.fields(row_class))[:len(attributes)]:
+        class RowIterable(ValuesListIterable):
+            def __iter__(self):
+                for values in super().__iter__():
+                    yield row_class(*values)
+    else:  # a ?fields= subset, the rest of the row keeps its defaults
+        class RowIterable(ValuesListIterable):
+            def __iter__(self):
+                for values in super().__iter__():
+                    yield row_class(**dict(zip(attributes, values)))
+
+    return RowIterable
+
+
+def values_rows(queryset, row_class, *values):
+    """
+    values_list(*values) yielding row_class rows instead of tuples: slotted read-only rows
+    for list endpoints, no model instances or per-row dicts. Each value fills the dataclass
+    field of the same name with "__" replaced by "_" (company__name -> company_name).
+    """
+    clone = queryset.values_list(*values)
+    clone._iterable_class = _row_iterable(row_class, tuple(value.replace("__", "_") for value in values))
+    return clone
+
+
+def requested_fields(query_params, available) -> tuple[str, ...]:
+    """
+    ?fields=a,b: the requested subset of available in available order,
+    all of them without the parameter. Unknown names are a 400.
+    """
+    if not (raw := query_params.get("fields", "").strip()):
+        return tuple(available)
+    requested = {field.strip() for field in raw.split(",") if field.strip()}
+    if unknown := requested.difference(available):
+        raise ValidationError({"fields": f"Неизвестные поля: {', '.join(sorted(unknown))}."})
+    return tuple(field for field in available if field in requested)
+
+
+def values_for_fields(fields, field_values) -> tuple[str, ...]:
+    """values_list() names behind the requested output fields, deduplicated in order."""
+    return tuple(dict.fromkeys(value for field in fields for value in field_values[field]))
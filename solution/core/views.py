@@ -1,6 +1,30 @@
+from django.http import HttpResponse, Http404, JsonResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from app.settings import METRICS_ENABLED
+from core.metrics import render_metrics
+from core.middlewares import has_profiling_token
+from core.profiling import list_profiles, load_profile
+
 @api_view()
 def ping(request):
-    return Response({"status": "PROOOOOOOD"})
\ No newline at end of file
+    return Response({"status": "PROOOOOOOD"})
+
+
+def metrics(request):
+    if not METRICS_ENABLED:
+        raise Http404()
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def profiles(request):
+    if not has_profiling_token(request):
+        raise Http404()
+    return JsonResponse(list_profiles(), safe=False)
+
+
+def profile(request, profile_id):
+    if not has_profiling_token(request) or (folded := load_profile(profile_id)) is None:
+        raise Http404()
+    return HttpResponse(folded, content_type="text/plain; charset=utf-8")
@@ -0,0 +1,44 @@
+"""
+In-process tests of the Django app, run with pytest-django. The tavern suite in
+tests/ talks to a running server instead and needs neither Django nor this setup.
+
+    cd solution && python -m pytest django_tests
+
+django_db tests run on a throwaway test database of the configured Postgres and are
+skipped when it is not reachable. Redis is the configured server, but DB index
+TEST_REDIS_DB (django_tests/settings.py), so no test touches the keys the app uses;
+tests that need Redis take the `redis_db` fixture, which skips when it is not reachable.
+"""
+import pytest
+from django.db import connection, OperationalError
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.settings import REDIS_DB
+from core.redis_client import redis_conn
+
+
+def pytest_configure(config):
+    if REDIS_DB == 0:  # app.settings was imported before django_tests.settings could pick the index
+        raise pytest.UsageError("the tests would run on Redis DB 0, use DJANGO_SETTINGS_MODULE=django_tests.settings")
+
+
+@pytest.fixture
+def redis_db():
+    """The test Redis DB, emptied before the test."""
+    try:
+        redis_conn.flushdb()
+    except RedisConnectionError as exc:
+        pytest.skip(f"redis is not reachable: {exc}")
+    return redis_conn
+
+
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(django_db_modify_db_settings, django_db_blocker):
+    """Runs before the test database is created: skip instead of erroring without Postgres."""
+    with django_db_blocker.unblock():
+        try:
+            connection.ensure_connection()
+        except OperationalError as exc:
+            pytest.skip(f"postgres is not reachable: {exc}")
+        finally:
+            connection.close()
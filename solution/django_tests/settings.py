@@ -0,0 +1,6 @@
+"""The app's settings on a Redis DB index of the tests' own, TEST_REDIS_DB (15 by default)."""
+import os
+
+os.environ["REDIS_DB"] = os.environ.get("TEST_REDIS_DB", "15")
+
+from app.settings import *  # noqa: E402,F403
@@ -0,0 +1,63 @@
+"""
+Queued activations worked off by `manage.py run_activation_queue`.
+
+    cd solution && python -m pytest django_tests/test_activation_queue.py
+"""
+import uuid
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from business.models import Business, Promocode, PromocodeCommonInstance, PromocodeUniqueInstance, \
+    PromocodeCommonActivation, PromocodeUniqueActivation
+from user.activation_queue import ACTIVATED, activation_result, enqueue_activation
+from user.models import User, TargetInfo
+from user.views import activate_for_user
+
+# the worker commits and takes its own connections, the queue is in the test Redis DB
+pytestmark = [pytest.mark.usefixtures("redis_db"), pytest.mark.django_db(transaction=True)]
+
+
+def _queued_promo(mode: str) -> tuple[Promocode, User]:
+    suffix = uuid.uuid4().hex[:12]
+    company = Business.objects.create(
+        email=f"company-{suffix}@queue.test", username="company", model_type="BUSINESS", name="Queue",
+    )
+    if mode == "UNIQUE":
+        promocode = Promocode.objects.create(
+            company=company, description="Уникальные коды через очередь", max_count=1, unique_count=2,
+            mode="UNIQUE", queued_activation=True,
+        )
+        PromocodeUniqueInstance.objects.bulk_create(
+            PromocodeUniqueInstance(promocode=f"unique-{suffix}-{number}", promocode_set=promocode) for number in range(2)
+        )
+    else:
+        promocode = Promocode.objects.create(
+            company=company, description="Общий код через очередь", max_count=5, common_count=5,
+            mode="COMMON", queued_activation=True,
+        )
+        PromocodeCommonInstance.objects.create(promocode=f"common-{suffix}", promocode_set=promocode)
+    user = User.objects.create(
+        email=f"user-{suffix}@queue.test", username="user", model_type="USER",
+        name="Имя", surname="Фамилия", other=TargetInfo.objects.create(age=25, country="ru"),
+    )
+    return promocode, user
+
+
+@pytest.mark.parametrize("mode, activations", [
+    ("UNIQUE", PromocodeUniqueActivation),
+    ("COMMON", PromocodeCommonActivation),
+])
+def test_replayed_ticket_gets_the_persisted_code(mode, activations):
+    promocode, user = _queued_promo(mode)
+    ticket = enqueue_activation(promocode, user.id)
+    # a worker committed the activation and died before finish_request
+    code = activate_for_user(user, promocode, reservation_id=ticket, user_checked=True)
+    assert code is not None
+
+    call_command("run_activation_queue", burst=True, stdout=StringIO(), stderr=StringIO())
+
+    result = activation_result(ticket, user.id, str(promocode.uuid))
+    assert result["status"] == ACTIVATED and result["promo"] == code
+    assert activations.objects.filter(user=user).count() == 1
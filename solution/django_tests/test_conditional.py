@@ -0,0 +1,85 @@
+"""
+Conditional GET of the feed and promo detail: likes and comments on the page change the
+ETag, activity on promos outside the requested page does not.
+
+    cd solution && python -m pytest django_tests/test_conditional.py
+"""
+import uuid
+
+import pytest
+from django.test import Client
+
+from business.models import Business, Promocode, PromocodeCommonInstance, Target
+from core.tokens import issue_token
+from user.models import User, TargetInfo
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def feed():
+    suffix = uuid.uuid4().hex[:12]
+    company = Business.objects.create(
+        email=f"company-{suffix}@conditional.test", username="company", model_type="BUSINESS", name="Conditional",
+    )
+    promos = []
+    for number in range(3):
+        promo = Promocode.objects.create(
+            company=company, description=f"Промокод {number} для условных запросов", max_count=10, mode="COMMON",
+            target=Target.objects.create(),
+        )
+        PromocodeCommonInstance.objects.create(promocode=f"conditional-{suffix}-{number}", promocode_set=promo)
+        promos.append(promo)
+    user = User.objects.create(
+        email=f"user-{suffix}@conditional.test", username="user", model_type="USER",
+        name="Имя", surname="Фамилия", other=TargetInfo.objects.create(age=25, country="ru"),
+    )
+    return Client(HTTP_AUTHORIZATION=f"Bearer {issue_token(user)}"), promos  # newest first in the feed
+
+
+def _revalidate(client, path, etag):
+    return client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+
+def test_feed_etag_follows_the_page(feed):
+    client, promos = feed
+    path = "/api/user/feed?limit=2"
+    etag = client.get(path).headers["ETag"]
+    assert _revalidate(client, path, etag).status_code == 304
+
+    client.post(f"/api/user/promo/{promos[0].uuid}/like")  # not on the page
+    assert _revalidate(client, path, etag).status_code == 304
+
+    client.post(f"/api/user/promo/{promos[2].uuid}/like")
+    response = _revalidate(client, path, etag)
+    assert response.status_code == 200
+    liked = response.headers["ETag"]
+
+    client.delete(f"/api/user/promo/{promos[2].uuid}/like")
+    response = _revalidate(client, path, liked)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag  # the version moved on, an unlike is not a rollback
+
+
+def test_feed_etag_follows_the_total_count(feed):
+    client, promos = feed
+    path = "/api/user/feed?limit=2"
+    etag = client.get(path).headers["ETag"]
+
+    Promocode.objects.filter(pk=promos[0].pk).delete()  # off the page, only X-Total-Count changes
+    assert _revalidate(client, path, etag).status_code == 200
+
+
+def test_promo_etag_follows_comments(feed):
+    client, promos = feed
+    path = f"/api/user/promo/{promos[0].uuid}"
+    etag = client.get(path).headers["ETag"]
+
+    comment = client.post(f"{path}/comments", {"text": "Отличный промокод"}, content_type="application/json").json()
+    response = _revalidate(client, path, etag)
+    assert response.status_code == 200
+    commented = response.headers["ETag"]
+    assert _revalidate(client, path, commented).status_code == 304
+
+    client.delete(f"{path}/comments/{comment['id']}")
+    assert _revalidate(client, path, commented).status_code == 200
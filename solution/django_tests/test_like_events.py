@@ -0,0 +1,60 @@
+"""
+Likes and their outbox events: only actions that change a row are recorded.
+
+    cd solution && python -m pytest django_tests/test_like_events.py
+"""
+import uuid
+
+import pytest
+from django.db import transaction
+
+from business.models import Business, Promocode, PromocodeAction
+from core.models import OutboxEvent
+from user.models import User, TargetInfo
+from user.views import like_promocodes, unlike_promocodes
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user_and_promos():
+    suffix = uuid.uuid4().hex[:12]
+    company = Business.objects.create(
+        email=f"company-{suffix}@likes.test", username="company", model_type="BUSINESS", name="Likes",
+    )
+    promos = [
+        Promocode.objects.create(company=company, description=f"Промокод {number} для лайков", max_count=10, mode="COMMON")
+        for number in range(3)
+    ]
+    user = User.objects.create(
+        email=f"user-{suffix}@likes.test", username="user", model_type="USER",
+        name="Имя", surname="Фамилия", other=TargetInfo.objects.create(age=25, country="ru"),
+    )
+    return user, [promo.id for promo in promos]
+
+
+def _events(type: str) -> list[int]:
+    return sorted(OutboxEvent.objects.filter(type=type).values_list("payload__promocode_id", flat=True))
+
+
+def test_repeated_like_is_recorded_once(user_and_promos):
+    user, promo_ids = user_and_promos
+    with transaction.atomic():
+        like_promocodes(user, promo_ids[:2], "like")
+    with transaction.atomic():
+        like_promocodes(user, promo_ids, "like")
+
+    assert _events("like") == sorted(promo_ids)  # the third promo once, the first two not again
+    assert PromocodeAction.objects.filter(user=user).count() == 3
+
+
+def test_unlike_records_only_removed_likes(user_and_promos):
+    user, promo_ids = user_and_promos
+    with transaction.atomic():
+        like_promocodes(user, promo_ids[:1], "like")
+    with transaction.atomic():
+        unlike_promocodes(user, promo_ids)
+        unlike_promocodes(user, promo_ids)
+
+    assert _events("unlike") == promo_ids[:1]
+    assert not PromocodeAction.objects.filter(user=user).exists()
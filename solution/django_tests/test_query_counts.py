@@ -0,0 +1,213 @@
+"""
+Query-count guard: every endpoint is called at two page sizes on two data
+volumes and must issue the same number of queries each time.
+
+    cd solution && python -m pytest django_tests/test_query_counts.py
+"""
+import re
+from collections import Counter
+from functools import cache
+from unittest import mock
+
+import pytest
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from business.counters import create_shards
+from business.models import Business, Promocode, Target, PromocodeCommonInstance, PromocodeUniqueInstance, \
+    PromocodeAction, Comment, PromocodeCommonActivation, PromocodeUniqueActivation
+from core.tokens import issue_token
+from user.activation_queue import enqueue_activation
+from user.models import User, TargetInfo
+
+pytestmark = pytest.mark.django_db
+
+PAGE_SIZES = (2, 10)
+VOLUMES = (4, 8)  # x3 promos, x2 users, each user likes, comments and activates everything
+PASSWORD = "HardPa$$w0rd!iamthewinner"
+
+
+@cache
+def _password_hash() -> str:
+    return make_password(PASSWORD)  # once, not per populated volume
+
+
+def _fingerprint(sql: str) -> str:
+    return re.sub(r"'[^']*'|\b\d+\b", "?", sql)
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _populate(volume: int, with_ticket: bool) -> dict:
+    company = Business.objects.create(
+        email=f"company{volume}@query-count.test", username="company", model_type="BUSINESS", name="Query count company",
+        password=_password_hash(),
+    )
+    users = [
+        User.objects.create(
+            email=f"user{volume}-{number}@query-count.test", username="user", model_type="USER",
+            name="Имя", surname="Фамилия", other=TargetInfo.objects.create(age=25, country="ru"),
+            password=_password_hash(),
+        )
+        for number in range(2 * volume)
+    ]
+
+    promos = []
+    for number in range(3 * volume):
+        is_unique = number % 3 == 0
+        promo = Promocode.objects.create(
+            company=company,
+            description=f"Промокод номер {number} для проверки",
+            target=Target.objects.create(categories=["food"] if number % 2 else None),
+            max_count=1 if is_unique else 1000,
+            mode="UNIQUE" if is_unique else "COMMON",
+        )
+        if is_unique:
+            codes = PromocodeUniqueInstance.objects.bulk_create(
+                PromocodeUniqueInstance(promocode=f"u{number}-{code}", promocode_set=promo) for code in range(len(users))
+            )
+            for user, code in zip(users, codes):
+                PromocodeUniqueActivation.objects.create(user=user, promocode_instanse=code)
+            PromocodeUniqueInstance.objects.filter(promocode_set=promo).update(is_activated=True)
+            promo.unique_count, promo.unique_activations_count = 1, len(users)
+            PromocodeUniqueInstance.objects.create(promocode=f"u{number}-spare", promocode_set=promo)
+        else:
+            code = PromocodeCommonInstance.objects.create(promocode=f"common-{number}", promocode_set=promo)
+            for user in users:
+                PromocodeCommonActivation.objects.create(user=user, promocode_instanse=code)
+            promo.common_count, promo.common_activations_count = promo.max_count - len(users), len(users)
+        promo.save()
+        if number % 3 == 2:  # sharded counters must not add per-promo queries either
+            create_shards(promo, 4)
+        promos.append(promo)
+
+        PromocodeAction.objects.bulk_create(PromocodeAction(promocode=promo, user=user, type="like") for user in users)
+        Comment.objects.bulk_create(
+            Comment(promocode=promo, user=user, text=f"Комментарий {turn} к промокоду") for user in users for turn in range(2)
+        )
+
+    queued = Promocode.objects.create(
+        company=company, description="Промокод с очередью активаций", target=Target.objects.create(),
+        max_count=1000, common_count=1000, mode="COMMON", queued_activation=True,
+    )
+    PromocodeCommonInstance.objects.create(promocode=f"queued-{volume}", promocode_set=queued)
+
+    user = users[0]
+    return {
+        "company_token": issue_token(company),
+        "company_email": company.email,
+        "user_token": issue_token(user),
+        "user_email": user.email,
+        "queued_promo": queued.uuid,
+        "ticket": enqueue_activation(queued, user.id) if with_ticket else None,
+        "promo": promos[1].uuid,
+        "unique_promo": promos[0].uuid,
+        "promos": [str(promo.uuid) for promo in promos],
+        "comment": Comment.objects.filter(user=user, promocode=promos[1]).first().uuid,
+    }
+
+
+ENDPOINTS = {
+    "business sign-up": (
+        None, "post", lambda d, n: "/api/business/auth/sign-up",
+        lambda d, n: {"name": "Новая компания", "email": "new-company@query-count.test", "password": PASSWORD},
+    ),
+    "business sign-in": (
+        None, "post", lambda d, n: "/api/business/auth/sign-in",
+        lambda d, n: {"email": d["company_email"], "password": PASSWORD},
+    ),
+    "business promo list": ("company_token", "get", lambda d, n: f"/api/business/promo?limit={n}", None),
+    "business promo list by date": (
+        "company_token", "get", lambda d, n: f"/api/business/promo?limit={n}&sort_by=active_until", None,
+    ),
+    "business promo detail": ("company_token", "get", lambda d, n: f"/api/business/promo/{d['unique_promo']}", None),
+    "business promo patch": (
+        "company_token", "patch", lambda d, n: f"/api/business/promo/{d['promo']}",
+        lambda d, n: {"description": "Обновлённое описание промокода", "max_count": 2000, "target": {"age_from": 18}},
+    ),
+    "business promo stat": ("company_token", "get", lambda d, n: f"/api/business/promo/{d['promo']}/stat", None),
+    "business promo activations": (
+        "company_token", "get", lambda d, n: f"/api/business/promo/{d['promo']}/activations", None,
+    ),
+    "user sign-up": (
+        None, "post", lambda d, n: "/api/user/auth/sign-up",
+        lambda d, n: {
+            "name": "Мария", "surname": "Смирнова", "email": "new-user@query-count.test", "password": PASSWORD,
+            "other": {"age": 30, "country": "RU"},
+        },
+    ),
+    "user sign-in": (
+        None, "post", lambda d, n: "/api/user/auth/sign-in", lambda d, n: {"email": d["user_email"], "password": PASSWORD},
+    ),
+    "user profile": ("user_token", "get", lambda d, n: "/api/user/profile", None),
+    "user profile patch": (
+        "user_token", "patch", lambda d, n: "/api/user/profile", lambda d, n: {"name": "Новое имя", "other": {"age": 31}},
+    ),
+    "user feed": ("user_token", "get", lambda d, n: f"/api/user/feed?limit={n}", None),
+    "user feed by category": ("user_token", "get", lambda d, n: f"/api/user/feed?limit={n}&category=food&active=true", None),
+    "user history": ("user_token", "get", lambda d, n: f"/api/user/promo/history?limit={n}", None),
+    "user promo detail": ("user_token", "get", lambda d, n: f"/api/user/promo/{d['promo']}", None),
+    "user like": ("user_token", "post", lambda d, n: f"/api/user/promo/{d['promo']}/like", None),
+    "user unlike": ("user_token", "delete", lambda d, n: f"/api/user/promo/{d['promo']}/like", None),
+    "user like batch": (
+        "user_token", "post", lambda d, n: "/api/user/promo/likes",
+        lambda d, n: {"actions": [{"promo_id": promo, "action": "unlike"} for promo in d["promos"][:n]]},
+    ),
+    "user comments": ("user_token", "get", lambda d, n: f"/api/user/promo/{d['promo']}/comments?limit={n}", None),
+    "user comment create": (
+        "user_token", "post", lambda d, n: f"/api/user/promo/{d['promo']}/comments",
+        lambda d, n: {"text": "Новый комментарий под нагрузкой"},
+    ),
+    "user comment detail": ("user_token", "get", lambda d, n: f"/api/user/promo/{d['promo']}/comments/{d['comment']}", None),
+    "user activate": ("user_token", "post", lambda d, n: f"/api/user/promo/{d['promo']}/activate", None),
+    "user activate unique": ("user_token", "post", lambda d, n: f"/api/user/promo/{d['unique_promo']}/activate", None),
+    "user activate queued": ("user_token", "post", lambda d, n: f"/api/user/promo/{d['queued_promo']}/activate", None),
+    "user activation result": (
+        "user_token", "get", lambda d, n: f"/api/user/promo/{d['queued_promo']}/activate/{d['ticket']}", None,
+    ),
+}
+# the ticket and the queue live in Redis
+REDIS_ENDPOINTS = {"user activate queued", "user activation result"}
+
+
+def _measure(name, volume, page_size):
+    token, method, path, body = ENDPOINTS[name]
+    try:
+        with transaction.atomic(), mock.patch("user.views.antifraud_success", return_value=True), \
+                mock.patch("user.async_views.aantifraud_success", return_value=True):
+            data = _populate(volume, with_ticket=name in REDIS_ENDPOINTS)
+            client = Client(HTTP_AUTHORIZATION=f"Bearer {data[token]}") if token else Client()
+            kwargs = {"data": body(data, page_size), "content_type": "application/json"} if body else {}
+            connection.queries_log.clear()  # a full log (9000 entries) makes the capture come back empty
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(path(data, page_size), **kwargs)
+                if response.streaming:  # the body is read from the database while it is sent
+                    b"".join(response.streaming_content)
+            raise _Rollback()
+    except _Rollback:
+        pass
+
+    assert response.status_code < 400, f"{name}: {response.status_code} {response.content[:300]}"
+    return [query["sql"] for query in queries.captured_queries]
+
+
+@pytest.mark.parametrize("name", ENDPOINTS)
+def test_query_count_is_constant(name, request):
+    if name in REDIS_ENDPOINTS:
+        request.getfixturevalue("redis_db")
+    runs = {(volume, page_size): _measure(name, volume, page_size) for volume in VOLUMES for page_size in PAGE_SIZES}
+    counts = {key: len(queries) for key, queries in runs.items()}
+
+    if len(set(counts.values())) > 1:
+        smallest = min(runs, key=lambda key: counts[key])
+        largest = max(runs, key=lambda key: counts[key])
+        extra = Counter(map(_fingerprint, runs[largest])) - Counter(map(_fingerprint, runs[smallest]))
+        pytest.fail(
+            f"{name}: query count depends on volume/page size, (volume, page size) -> queries: {counts}\n"
+            f"extra queries of {largest} compared to {smallest}:\n"
+            + "\n".join(f"{times} x {sql}" for sql, times in extra.most_common(20))
+        )
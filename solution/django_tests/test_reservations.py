@@ -0,0 +1,203 @@
+"""
+Redis reservations of COMMON promos (business/reservations.py) and their
+persistence by `manage.py persist_reservations`.
+
+    cd solution && python -m pytest django_tests/test_reservations.py
+"""
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from business.models import Business, Promocode, PromocodeCommonInstance, PromocodeCommonActivation
+from business.reservations import STREAM_KEY, INVENTORY_KEY, USERS_KEY, RESERVED, DUPLICATE, EMPTY, INACTIVE, \
+    compensate_reservation, reserve_common, sync_reservation
+from core.redis_client import redis_conn
+from user.management.commands import persist_reservations
+from user.management.commands.persist_reservations import GROUP, persist_reservation
+from user.models import User, TargetInfo
+
+# every test starts on an empty test Redis DB; persist_reservations commits, so the database ones are transactional
+pytestmark = pytest.mark.usefixtures("redis_db")
+persisting = pytest.mark.django_db(transaction=True)
+
+
+_next_id = iter(range(10 ** 9, 2 * 10 ** 9))
+
+
+def _promo(left=2, **window) -> Promocode:
+    """An unsaved promo is enough for Redis, its inventory is seeded from common_count."""
+    return Promocode(id=next(_next_id), mode="COMMON", max_count=left, common_count=left, **window)
+
+
+def _left(promocode_id: int) -> int:
+    return int(redis_conn.hget(INVENTORY_KEY.format(promocode_id), "left"))
+
+
+def _holds(promocode_id: int, user_id: int) -> bool:
+    return bool(redis_conn.sismember(USERS_KEY.format(promocode_id), user_id))
+
+
+def test_reserve_takes_a_unit_and_appends_the_reservation():
+    promocode = _promo(left=2)
+
+    assert reserve_common(promocode, 1) == RESERVED
+    assert _left(promocode.id) == 1
+    assert _holds(promocode.id, 1)
+
+    (_, fields), = redis_conn.xrange(STREAM_KEY)
+    assert int(fields[b"promo"]) == promocode.id and int(fields[b"user"]) == 1
+    uuid.UUID(fields[b"reservation"].decode())
+
+
+def test_reserve_twice_is_a_duplicate():
+    promocode = _promo(left=2)
+
+    assert reserve_common(promocode, 1) == RESERVED
+    assert reserve_common(promocode, 1) == DUPLICATE
+    assert _left(promocode.id) == 1
+    assert redis_conn.xlen(STREAM_KEY) == 1
+
+
+def test_reserve_from_an_empty_inventory():
+    promocode = _promo(left=1)
+
+    assert reserve_common(promocode, 1) == RESERVED
+    assert reserve_common(promocode, 2) == EMPTY
+    assert _left(promocode.id) == 0
+    assert not _holds(promocode.id, 2)
+
+
+@pytest.mark.parametrize("window", [
+    {"active_from": timezone.now() + timedelta(days=2)},
+    {"active_until": timezone.now() - timedelta(days=2)},
+])
+def test_reserve_outside_the_window(window):
+    promocode = _promo(left=2, **window)
+
+    assert reserve_common(promocode, 1) == INACTIVE
+    assert _left(promocode.id) == 2
+    assert redis_conn.xlen(STREAM_KEY) == 0
+
+
+def test_compensate_with_restock_gives_the_unit_back():
+    promocode = _promo(left=2)
+    reserve_common(promocode, 1)
+
+    compensate_reservation(promocode.id, 1, restock=True)
+    assert _left(promocode.id) == 2
+    assert not _holds(promocode.id, 1)
+    assert reserve_common(promocode, 1) == RESERVED
+
+
+def test_compensate_without_restock_empties_the_inventory():
+    promocode = _promo(left=5)
+    reserve_common(promocode, 1)
+
+    compensate_reservation(promocode.id, 1, restock=False)
+    assert _left(promocode.id) == 0
+    assert not _holds(promocode.id, 1)
+    assert reserve_common(promocode, 2) == EMPTY
+
+
+def test_sync_follows_max_count_changes():
+    promocode = _promo(left=3)
+    reserve_common(promocode, 1)
+
+    with mock.patch("business.reservations.COMMON_RESERVATIONS", "redis"):
+        sync_reservation(promocode, 10)
+        assert _left(promocode.id) == 12
+        sync_reservation(promocode, -20)
+        assert _left(promocode.id) == 0
+
+
+def _persisted_promo(left: int) -> tuple[Promocode, User]:
+    suffix = uuid.uuid4().hex[:12]
+    company = Business.objects.create(
+        email=f"company-{suffix}@reservations.test", username="company", model_type="BUSINESS", name="Reservations",
+    )
+    promocode = Promocode.objects.create(
+        company=company, description="Промокод для проверки резервов", max_count=left, common_count=left, mode="COMMON",
+    )
+    PromocodeCommonInstance.objects.create(promocode=f"resv-{suffix}", promocode_set=promocode)
+    user = User.objects.create(
+        email=f"user-{suffix}@reservations.test", username="user", model_type="USER",
+        name="Имя", surname="Фамилия", other=TargetInfo.objects.create(age=25, country="ru"),
+    )
+    return promocode, user
+
+
+def _only_entry() -> tuple[bytes, dict]:
+    (entry_id, fields), = redis_conn.xrange(STREAM_KEY)
+    return entry_id, fields
+
+
+@persisting
+def test_redelivered_entry_is_persisted_once():
+    promocode, user = _persisted_promo(left=2)
+    assert reserve_common(promocode, user.id) == RESERVED
+    entry_id, fields = _only_entry()
+
+    # the first consumer commits and dies before XACK: the entry is pending for its group
+    redis_conn.xgroup_create(STREAM_KEY, GROUP, id="0")
+    redis_conn.xreadgroup(GROUP, "dead-consumer", {STREAM_KEY: ">"})
+    assert persist_reservation(fields) == "persisted"
+
+    call_command("persist_reservations", burst=True, claim_after=0, stdout=StringIO())
+
+    assert PromocodeCommonActivation.objects.filter(reservation_id=fields[b"reservation"].decode()).count() == 1
+    assert redis_conn.xpending(STREAM_KEY, GROUP)["pending"] == 0
+    assert _left(promocode.id) == 1  # not restocked
+    assert _holds(promocode.id, user.id)
+
+
+@persisting
+def test_concurrent_consumers_do_not_restock():
+    promocode, user = _persisted_promo(left=2)
+    reserve_common(promocode, user.id)
+    _, fields = _only_entry()
+
+    activate_promocode = persist_reservations.activate_promocode
+
+    def taken_over(*args):
+        # the consumer the entry was claimed from commits between our check and our insert
+        activate_promocode(*args)
+        return activate_promocode(*args)
+
+    with mock.patch.object(persist_reservations, "activate_promocode", taken_over):
+        assert persist_reservation(fields) == "duplicate"
+
+    assert PromocodeCommonActivation.objects.filter(reservation_id=fields[b"reservation"].decode()).count() == 1
+    assert _left(promocode.id) == 1
+    assert _holds(promocode.id, user.id)
+
+
+@persisting
+def test_refused_reservation_is_compensated():
+    promocode, user = _persisted_promo(left=1)
+    reserve_common(promocode, user.id)
+    _, fields = _only_entry()
+    Promocode.objects.filter(pk=promocode.pk).update(common_count=0)  # Postgres ran out meanwhile
+
+    assert persist_reservation(fields) == "compensated"
+    assert _left(promocode.id) == 0
+    assert not _holds(promocode.id, user.id)
+
+
+@persisting
+def test_unknown_error_leaves_the_entry_pending():
+    promocode, user = _persisted_promo(left=2)
+    reserve_common(promocode, user.id)
+    redis_conn.xgroup_create(STREAM_KEY, GROUP, id="0")
+
+    with mock.patch.object(persist_reservations, "activate_promocode", side_effect=RuntimeError("boom")):
+        call_command("persist_reservations", burst=True, claim_after=3600,
+                     stdout=StringIO(), stderr=StringIO())
+
+    assert redis_conn.xpending(STREAM_KEY, GROUP)["pending"] == 1
+    assert _left(promocode.id) == 1  # still reserved, neither restocked nor zeroed
+    assert _holds(promocode.id, user.id)
@@ -0,0 +1,127 @@
+"""
+Background tasks on Redis (core/tasks.py): delivery, retries with backoff, the
+dead-letter list and debounced scheduling.
+
+    cd solution && python -m pytest django_tests/test_tasks.py
+"""
+import json
+import time
+from unittest import mock
+
+import pytest
+
+from core import tasks
+from core.redis_client import redis_conn
+from core.tasks import QUEUE_KEY, SCHEDULED_KEY, DEAD_KEY, DEBOUNCE_KEY, task, run_message, promote_due_tasks, \
+    requeue_dead
+
+# every test starts on an empty test Redis DB, never on the queues of the configured one;
+# delay() waits for the commit, so there is a database in autocommit mode as well
+pytestmark = [pytest.mark.usefixtures("redis_db"), pytest.mark.django_db(transaction=True)]
+
+QUEUE = "tests"
+calls = []
+
+
+@task(name="tests.record", queue=QUEUE)
+def record(*args, **kwargs):
+    calls.append((args, kwargs))
+
+
+@task(name="tests.fail", queue=QUEUE, max_retries=2, retry_delay=10.0)
+def fail():
+    raise RuntimeError("boom")
+
+
+@pytest.fixture(autouse=True)
+def no_calls():
+    calls.clear()
+
+
+def _queued() -> list[dict]:
+    return [json.loads(raw) for raw in redis_conn.lrange(QUEUE_KEY.format(QUEUE), 0, -1)]
+
+
+def _scheduled() -> list[tuple[dict, float]]:
+    return [(json.loads(raw), score) for raw, score in redis_conn.zrange(SCHEDULED_KEY, 0, -1, withscores=True)]
+
+
+def test_delay_queues_a_message_and_the_worker_runs_it():
+    record.delay(1, "a", flag=True)
+
+    message, = _queued()
+    assert message["task"] == "tests.record" and message["attempt"] == 0
+    assert run_message(redis_conn.rpop(QUEUE_KEY.format(QUEUE)))
+    assert calls == [((1, "a"), {"flag": True})]
+
+
+def test_eager_runs_inline_with_json_arguments():
+    with mock.patch.object(tasks, "TASKS_EAGER", True):
+        record.delay((1, 2))
+
+    assert calls == [(([1, 2],), {})]
+    assert _queued() == []
+
+
+def test_failure_is_retried_with_exponential_backoff():
+    fail.delay()
+    raw = redis_conn.rpop(QUEUE_KEY.format(QUEUE))
+
+    for attempt, backoff in [(1, 10.0), (2, 20.0)]:
+        before = time.time()
+        assert not run_message(raw)
+        (message, retry_at), = _scheduled()
+        assert message["attempt"] == attempt
+        assert before + backoff <= retry_at <= time.time() + backoff
+        raw = redis_conn.zpopmin(SCHEDULED_KEY)[0][0]
+
+    assert redis_conn.llen(DEAD_KEY) == 0
+
+
+def test_exhausted_retries_are_dead_lettered_and_can_be_requeued():
+    fail.delay()
+    raw = redis_conn.rpop(QUEUE_KEY.format(QUEUE))
+    for _ in range(fail.max_retries + 1):
+        run_message(raw)
+        if scheduled := redis_conn.zpopmin(SCHEDULED_KEY):
+            raw = scheduled[0][0]
+
+    dead = json.loads(redis_conn.lindex(DEAD_KEY, 0))
+    assert dead["attempt"] == fail.max_retries + 1 and "RuntimeError: boom" in dead["error"]
+
+    assert requeue_dead() == 1
+    message, = _queued()
+    assert message["attempt"] == 0 and "error" not in message and "failed_at" not in message
+    assert redis_conn.llen(DEAD_KEY) == 0
+
+
+def test_unknown_task_is_dead_lettered():
+    assert not run_message(json.dumps({"id": "x", "task": "tests.missing", "queue": QUEUE, "args": [], "kwargs": {},
+                                       "attempt": 0}))
+    assert "unknown task" in json.loads(redis_conn.lindex(DEAD_KEY, 0))["error"]
+
+
+def test_promote_moves_only_due_messages():
+    now = time.time()
+    redis_conn.zadd(SCHEDULED_KEY, {
+        json.dumps({"id": "due", "queue": QUEUE}): now - 1,
+        json.dumps({"id": "later", "queue": QUEUE}): now + 60,
+    })
+
+    assert promote_due_tasks() == 1
+    assert [message["id"] for message in _queued()] == ["due"]
+    assert [message["id"] for message, _ in _scheduled()] == ["later"]
+
+
+def test_debounce_schedules_one_run_per_burst():
+    before = time.time()
+    for value in range(3):
+        record.debounce("promo", 5.0, value)
+
+    (message, run_at), = _scheduled()
+    assert message["args"] == [0] and before + 5.0 <= run_at <= time.time() + 5.0
+    assert _queued() == []
+
+    redis_conn.delete(DEBOUNCE_KEY.format(record.name, "promo"))  # the window is over
+    record.debounce("promo", 5.0, 3)
+    assert len(_scheduled()) == 2
@@ -0,0 +1,80 @@
+"""
+Revoked signed tokens are rejected by every view, not only the ones loading the account.
+
+    cd solution && python -m pytest django_tests/test_tokens.py
+"""
+import uuid
+from unittest import mock
+
+import pytest
+from django.test import Client
+
+from business.models import Business, Promocode, PromocodeCommonInstance, Comment
+from core.tokens import issue_token, revoke_tokens, redis_conn, _token_version_key
+from user.models import User, TargetInfo
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures("redis_db")]
+
+
+@pytest.fixture
+def accounts():
+    suffix = uuid.uuid4().hex[:12]
+    company = Business.objects.create(
+        email=f"company-{suffix}@tokens.test", username="company", model_type="BUSINESS", name="Tokens",
+    )
+    promo = Promocode.objects.create(company=company, description="Промокод для токенов", max_count=10, mode="COMMON")
+    PromocodeCommonInstance.objects.create(promocode=f"tokens-{suffix}", promocode_set=promo)
+    user = User.objects.create(
+        email=f"user-{suffix}@tokens.test", username="user", model_type="USER",
+        name="Имя", surname="Фамилия", other=TargetInfo.objects.create(age=25, country="ru"),
+    )
+    comment = Comment.objects.create(promocode=promo, user=user, text="Комментарий")
+    return company, user, promo, comment
+
+
+def _signed_token(account) -> str:
+    with mock.patch("core.tokens.AUTH_TOKEN_MODE", "signed"):
+        return issue_token(account)
+
+
+def _paths(promo, comment):
+    return {
+        "USER": [
+            f"/api/user/promo/{promo.uuid}",
+            f"/api/user/promo/{promo.uuid}/comments",
+            f"/api/user/promo/{promo.uuid}/comments/{comment.uuid}",
+            "/api/user/feed",
+        ],
+        "BUSINESS": [f"/api/business/promo/{promo.uuid}", "/api/business/promo"],
+    }
+
+
+@pytest.mark.parametrize("model_type", ["USER", "BUSINESS"])
+def test_revoked_signed_token_is_rejected(accounts, model_type):
+    company, user, promo, comment = accounts
+    account = user if model_type == "USER" else company
+    client = Client(HTTP_AUTHORIZATION=f"Bearer {_signed_token(account)}")
+
+    etags = {}
+    for path in _paths(promo, comment)[model_type]:
+        response = client.get(path)
+        assert response.status_code == 200, path
+        etags[path] = response.headers.get("ETag")
+
+    revoke_tokens(account)
+
+    for path, etag in etags.items():
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        assert client.get(path, **headers).status_code == 401, path  # not a 304 either
+
+
+def test_version_is_read_from_database_without_cache(accounts):
+    _, user, promo, _ = accounts
+    client = Client(HTTP_AUTHORIZATION=f"Bearer {_signed_token(user)}")
+    assert client.get(f"/api/user/promo/{promo.uuid}/comments").status_code == 200
+
+    revoke_tokens(user)
+    redis_conn.delete(_token_version_key(user.uuid))
+
+    assert client.get(f"/api/user/promo/{promo.uuid}/comments").status_code == 401
+    assert int(redis_conn.get(_token_version_key(user.uuid))) == user.token_version
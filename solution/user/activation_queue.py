@@ -0,0 +1,157 @@
+import uuid
+
+from app.settings import ACTIVATION_TICKET_TTL
+from core.redis_client import redis_conn, get_async_redis
+
+# Queued activation for flash sales (Promocode.queued_activation). The endpoint only
+# appends the request to the promo's Redis stream and answers 202 with a ticket;
+# `manage.py run_activation_queue` workers take a promo's lock and work its stream off
+# in batches: the per-user checks (targeting, antifraud) of a batch run in parallel,
+# the inventory is then claimed strictly in arrival order, so users get codes first
+# come, first served and request latency does not depend on the burst. Clients poll the ticket,
+# optionally long-polling until the worker pushes the result. A user has at most
+# one queued ticket per promo, repeating the request returns it.
+
+STREAM_KEY = "actq:stream:{}"
+PROMOS_KEY = "actq:promos"  # promo ids with queued requests
+TICKET_KEY = "actq:ticket:{}"
+PENDING_KEY = "actq:pending:{}:{}"
+NOTIFY_KEY = "actq:notify:{}"
+LOCK_KEY = "actq:lock:{}"
+
+QUEUED = "queued"
+ACTIVATED = "activated"
+REJECTED = "rejected"
+
+# KEYS: pending, ticket, stream, promos; ARGV: ticket, user id, promo id, promo uuid, ttl
+_ENQUEUE = """
+local existing = redis.call("GET", KEYS[1])
+if existing then return existing end
+redis.call("SET", KEYS[1], ARGV[1], "EX", ARGV[5])
+redis.call("HSET", KEYS[2], "user", ARGV[2], "promo_id", ARGV[4], "status", "queued")
+redis.call("EXPIRE", KEYS[2], ARGV[5])
+redis.call("XADD", KEYS[3], "*", "ticket", ARGV[1], "user", ARGV[2])
+redis.call("SADD", KEYS[4], ARGV[3])
+return ARGV[1]
+"""
+
+# KEYS: ticket, pending, notify, stream; ARGV: status, code, stream entry id, ttl, ticket.
+# A finished ticket is never written again, and the pending key may already name the user's next ticket
+_FINISH = """
+redis.call("XDEL", KEYS[4], ARGV[3])
+if redis.call("HGET", KEYS[1], "status") ~= "queued" then return 0 end
+redis.call("HSET", KEYS[1], "status", ARGV[1], "promo", ARGV[2])
+redis.call("EXPIRE", KEYS[1], ARGV[4])
+if redis.call("GET", KEYS[2]) == ARGV[5] then redis.call("DEL", KEYS[2]) end
+redis.call("RPUSH", KEYS[3], 1)
+redis.call("EXPIRE", KEYS[3], 60)
+return 1
+"""
+
+# KEYS: lock; ARGV: lock token, ttl ms
+_EXTEND = """
+if redis.call("GET", KEYS[1]) ~= ARGV[1] then return 0 end
+return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+"""
+
+# KEYS: lock, stream, promos; ARGV: lock token, promo id
+_RELEASE = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then redis.call("DEL", KEYS[1]) end
+if redis.call("XLEN", KEYS[2]) == 0 then redis.call("SREM", KEYS[3], ARGV[2]) end
+"""
+
+_enqueue = redis_conn.register_script(_ENQUEUE)
+_finish = redis_conn.register_script(_FINISH)
+_release = redis_conn.register_script(_RELEASE)
+_extend = redis_conn.register_script(_EXTEND)
+
+
+def _enqueue_call(promocode, user_id: int) -> tuple[list, list]:
+    ticket = uuid.uuid4().hex
+    return (
+        [PENDING_KEY.format(promocode.id, user_id), TICKET_KEY.format(ticket), STREAM_KEY.format(promocode.id), PROMOS_KEY],
+        [ticket, user_id, promocode.id, str(promocode.uuid), ACTIVATION_TICKET_TTL],
+    )
+
+
+def enqueue_activation(promocode, user_id: int) -> str:
+    """Queues the user's activation and returns its ticket."""
+    keys, args = _enqueue_call(promocode, user_id)
+    return _enqueue(keys=keys, args=args).decode()
+
+
+async def aenqueue_activation(promocode, user_id: int) -> str:
+    keys, args = _enqueue_call(promocode, user_id)
+    return (await get_async_redis().register_script(_ENQUEUE)(keys=keys, args=args)).decode()
+
+
+def queued_response(ticket: str) -> dict:
+    return {"ticket": ticket, "status": QUEUED}
+
+
+def _ticket(raw: dict, ticket_id: str, user_id: int, promo_uuid: str) -> dict | None:
+    ticket = {key.decode(): value.decode() for key, value in raw.items()}
+    if not ticket or int(ticket["user"]) != user_id or ticket["promo_id"] != str(uuid.UUID(promo_uuid)):
+        return None
+    return {**ticket, "ticket": ticket_id}
+
+
+def activation_result(ticket_id: str, user_id: int, promo_uuid: str, wait: int = 0) -> dict | None:
+    """The caller's ticket, None for an unknown or foreign one. wait > 0 blocks until the result or timeout."""
+    ticket_id = uuid.UUID(ticket_id).hex
+    if (ticket := _ticket(redis_conn.hgetall(TICKET_KEY.format(ticket_id)), ticket_id, user_id, promo_uuid)) is None:
+        return None
+    if ticket["status"] == QUEUED and wait:
+        redis_conn.blpop([NOTIFY_KEY.format(ticket_id)], timeout=wait)
+        ticket = _ticket(redis_conn.hgetall(TICKET_KEY.format(ticket_id)), ticket_id, user_id, promo_uuid) or ticket
+    return ticket
+
+
+async def aactivation_result(ticket_id: str, user_id: int, promo_uuid: str, wait: int = 0) -> dict | None:
+    client = get_async_redis()
+    ticket_id = uuid.UUID(ticket_id).hex
+    if (ticket := _ticket(await client.hgetall(TICKET_KEY.format(ticket_id)), ticket_id, user_id, promo_uuid)) is None:
+        return None
+    if ticket["status"] == QUEUED and wait:
+        await client.blpop([NOTIFY_KEY.format(ticket_id)], timeout=wait)
+        ticket = _ticket(await client.hgetall(TICKET_KEY.format(ticket_id)), ticket_id, user_id, promo_uuid) or ticket
+    return ticket
+
+
+def lock_promo(promo_id: int, token: str, ttl_ms: int) -> bool:
+    """Only the lock holder reads a promo's stream, which keeps it first in, first out."""
+    return bool(redis_conn.set(LOCK_KEY.format(promo_id), token, nx=True, px=ttl_ms))
+
+
+def extend_lock(promo_id: int, token: str, ttl_ms: int) -> bool:
+    """Renews the lock if the token still holds it. False: another worker owns the promo now, stop touching it."""
+    return bool(_extend(keys=[LOCK_KEY.format(promo_id)], args=[token, ttl_ms]))
+
+
+def release_promo(promo_id: int, token: str) -> None:
+    _release(keys=[LOCK_KEY.format(promo_id), STREAM_KEY.format(promo_id), PROMOS_KEY], args=[token, promo_id])
+
+
+def queued_promos(count: int) -> list[int]:
+    """A random sample, so workers spread over the promos with queued requests."""
+    return [int(promo_id) for promo_id in redis_conn.srandmember(PROMOS_KEY, count)]
+
+
+def next_requests(promo_id: int, count: int) -> list[tuple[bytes, str, int]]:
+    """The oldest count requests of the promo as (stream entry id, ticket, user id)."""
+    return [
+        (entry_id, fields[b"ticket"].decode(), int(fields[b"user"]))
+        for entry_id, fields in redis_conn.xrange(STREAM_KEY.format(promo_id), count=count)
+    ]
+
+
+def finish_request(promo_id: int, entry_id: bytes, ticket: str, user_id: int, code: str | None) -> bool:
+    """
+    Stores the result, takes the request off the stream and wakes the long-polls of the ticket.
+    False when the ticket was already finished, its result is left as it is.
+    """
+    return bool(_finish(
+        keys=[TICKET_KEY.format(ticket), PENDING_KEY.format(promo_id, user_id), NOTIFY_KEY.format(ticket),
+              STREAM_KEY.format(promo_id)],
+        args=[ACTIVATED if code is not None else REJECTED, code or "", entry_id, ACTIVATION_TICKET_TTL, ticket],
+    ))
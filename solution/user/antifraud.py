@@ -1,15 +1,28 @@
+import asyncio
 import json
 import datetime as dt
-import redis
+import weakref
+
+import httpx
 import requests
 from requests import Response
 
-from app.settings import ANTIFRAUD_ADDRESS, REDIS_HOST, REDIS_PORT
+from app.settings import ANTIFRAUD_ADDRESS, ANTIFRAUD_TIMEOUT, REDIS_HOST, REDIS_PORT, REDIS_DB
+from core.metrics import timed
+from core.redis_client import redis_conn, AsyncRedis
+from core.tracing import span, outgoing_headers
+
+# async clients are bound to the event loop they were created in
+_async_clients = weakref.WeakKeyDictionary()
 
-redis_conn = redis.Redis(
-    host=REDIS_HOST,
-    port=REDIS_PORT
-)
+def _get_async_clients() -> tuple[AsyncRedis, httpx.AsyncClient]:
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = (
+            AsyncRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB),
+            httpx.AsyncClient(base_url=f"http://{ANTIFRAUD_ADDRESS}", timeout=ANTIFRAUD_TIMEOUT),
+        )
+    return _async_clients[loop]
 
 def _get_user_cached_info(user_email: str) -> dict: # utc time
     user_cached_info = {}
@@ -17,6 +30,13 @@ def _get_user_cached_info(user_email: str) -> dict: # utc time
         user_cached_info = json.loads(byted_user_cached_info)
     return user_cached_info
 
+async def _aget_user_cached_info(user_email: str) -> dict:
+    redis_client, _ = _get_async_clients()
+    user_cached_info = {}
+    if byted_user_cached_info := await redis_client.get(user_email):
+        user_cached_info = json.loads(byted_user_cached_info)
+    return user_cached_info
+
 def _set_user_cached_info(user_email: str, cache_until: str, success: bool):
     info = {
         "cache_until": cache_until,
@@ -24,14 +44,39 @@ def _set_user_cached_info(user_email: str, cache_until: str, success: bool):
     }
     redis_conn.set(user_email, json.dumps(info))
 
+async def _aset_user_cached_info(user_email: str, cache_until: str, success: bool):
+    redis_client, _ = _get_async_clients()
+    info = {
+        "cache_until": cache_until,
+        "success": success
+    }
+    await redis_client.set(user_email, json.dumps(info))
+
 def _get_antifraud_response(user_email: str, promocode_uuid: str) -> Response:
     data = {
         "user_email": user_email,
         "promo_id": promocode_uuid
     }
-    antifraud_response = requests.post(f"http://{ANTIFRAUD_ADDRESS}/api/validate", json=data)
+    url = f"http://{ANTIFRAUD_ADDRESS}/api/validate"
+    with timed("antifraud"), span("antifraud POST /api/validate", "client"):
+        antifraud_response = requests.post(url, json=data, headers=outgoing_headers(), timeout=ANTIFRAUD_TIMEOUT)
+    if antifraud_response.status_code != 200:
+        with timed("antifraud"), span("antifraud POST /api/validate", "client", retry=True):
+            antifraud_response = requests.post(url, json=data, headers=outgoing_headers(), timeout=ANTIFRAUD_TIMEOUT)
+
+    return antifraud_response
+
+async def _aget_antifraud_response(user_email: str, promocode_uuid: str) -> httpx.Response:
+    _, http_client = _get_async_clients()
+    data = {
+        "user_email": user_email,
+        "promo_id": promocode_uuid
+    }
+    with timed("antifraud"), span("antifraud POST /api/validate", "client"):
+        antifraud_response = await http_client.post("/api/validate", json=data, headers=outgoing_headers())
     if antifraud_response.status_code != 200:
-        antifraud_response = requests.post(f"http://{ANTIFRAUD_ADDRESS}/api/validate", json=data)
+        with timed("antifraud"), span("antifraud POST /api/validate", "client", retry=True):
+            antifraud_response = await http_client.post("/api/validate", json=data, headers=outgoing_headers())
 
     return antifraud_response
 
@@ -39,6 +84,10 @@ def _is_cache_until_passed(cache_until):
     cache_until = dt.datetime.strptime(cache_until, '%Y-%m-%dT%H:%M:%S.%f')
     return cache_until < dt.datetime.now()
 
+def is_antifraud_cached(user_email: str) -> bool:
+    cache_until = _get_user_cached_info(user_email).get("cache_until")
+    return cache_until is not None and not _is_cache_until_passed(cache_until)
+
 def antifraud_success(user_email: str, promocode_uuid: str) -> bool:
     cached_info = _get_user_cached_info(user_email)
 
@@ -48,7 +97,10 @@ def antifraud_success(user_email: str, promocode_uuid: str) -> bool:
     if cache_until is not None and not _is_cache_until_passed(cache_until):
         return success
 
-    antifraud_response = _get_antifraud_response(user_email, promocode_uuid)
+    try:
+        antifraud_response = _get_antifraud_response(user_email, promocode_uuid)
+    except requests.RequestException:  # timed out or unreachable
+        return False
     print("antifraud_response", antifraud_response)
     if antifraud_response.status_code != 200:
         return False
@@ -62,3 +114,27 @@ def antifraud_success(user_email: str, promocode_uuid: str) -> bool:
 
     return success
 
+async def aantifraud_success(user_email: str, promocode_uuid: str) -> bool:
+    cached_info = await _aget_user_cached_info(user_email)
+
+    cache_until = cached_info.get("cache_until")
+    success = cached_info.get("success")
+
+    if cache_until is not None and not _is_cache_until_passed(cache_until):
+        return success
+
+    try:
+        antifraud_response = await _aget_antifraud_response(user_email, promocode_uuid)
+    except httpx.HTTPError:
+        return False
+    if antifraud_response.status_code != 200:
+        return False
+
+    antifraud_response_data = antifraud_response.json()
+    success = antifraud_response_data.get("ok")
+    cache_until = antifraud_response_data.get("cache_until")
+
+    if cache_until is not None:
+        await _aset_user_cached_info(user_email, cache_until, success)
+
+    return success
@@ -0,0 +1,143 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework import status
+from rest_framework.exceptions import ValidationError, NotFound
+from rest_framework.response import Response
+
+from app.pagination import PureLimitOffsetPagination
+from business.models import Promocode, promocode_is_active, common_counters
+from business.reservations import reservations_enabled, areserve_common, RESERVED, DUPLICATE
+from business.tasks import reconcile_promocode_counters, RECONCILE_DELAY
+from core.async_views import AsyncAPIView
+from core.conditional import conditional_get
+from core.routers import ReadReplicaMixin
+from core.utils import is_valid_uuid, requested_fields
+from .activation_queue import aactivation_result, aenqueue_activation, queued_response
+from .antifraud import aantifraud_success
+from .permissions import IsUserAuthenticated, aget_user, get_user
+from .representations import promocodes_for_user_rows, promocodes_for_user_representation, PROMOCODE_FOR_USER_FIELDS
+from .serializers import FeedQueryParamSerializer, PromocodeForUserSerializer, ActivationResultQueryParamSerializer
+from .tasks import prefetch_antifraud
+from .views import feed_queryset, user_is_targeted, activate_promocode, feed_validators, promocode_validators, \
+    ticket_response, counters_promise_codes
+
+
+def _serialize_promocode(promocode, user, fields):
+    return PromocodeForUserSerializer(promocode, context={"user": user, "fields": fields}).data
+
+
+class AsyncFeedView(ReadReplicaMixin, AsyncAPIView):
+    permission_classes = (IsUserAuthenticated,)
+
+    def get_validators(self, request, *args, **kwargs):
+        return feed_validators(request, get_user(request.user))
+
+    @conditional_get
+    async def get(self, request, *args, **kwargs):
+        user = await aget_user(request.user)
+        params_serializer = FeedQueryParamSerializer(data=request.query_params)
+        params_serializer.is_valid(raise_exception=True)
+        fields = requested_fields(request.query_params, PROMOCODE_FOR_USER_FIELDS)
+
+        paginator = PureLimitOffsetPagination()
+        limit = paginator.get_limit(request)
+        offset = paginator.get_offset(request)
+
+        queryset = promocodes_for_user_rows(feed_queryset(user, params_serializer.validated_data), user, fields=fields)
+        count = await queryset.acount()
+        page = [row async for row in queryset[offset:offset + limit]] if count > offset else []
+
+        return Response(promocodes_for_user_representation(page, fields), headers={"X-Total-Count": count})
+
+
+class AsyncRetrievePromocodeForUserView(ReadReplicaMixin, AsyncAPIView):
+    permission_classes = (IsUserAuthenticated,)
+
+    def get_validators(self, request, uuid, *args, **kwargs):
+        return promocode_validators(request, uuid)
+
+    @conditional_get
+    async def get(self, request, uuid, *args, **kwargs):
+        if not is_valid_uuid(uuid):
+            raise ValidationError("Invalid UUID.")
+        fields = requested_fields(request.query_params, PromocodeForUserSerializer.Meta.fields)
+
+        user = await aget_user(request.user)
+        if not (promocode := await Promocode.objects.select_related("company").filter(uuid=uuid).afirst()):
+            raise Http404("No Promocode matches the given query.")
+
+        data = await sync_to_async(_serialize_promocode)(promocode, user, fields)
+        await sync_to_async(prefetch_antifraud.delay)(str(user.uuid), uuid)  # a viewed promo is often activated next
+        return Response(data)
+
+
+class AsyncActivatePromocode(AsyncAPIView):
+    """
+    Same flow as ActivatePromocode, but the antifraud call and the redis cache
+    are awaited instead of holding a worker thread.
+    """
+    permission_classes = (IsUserAuthenticated,)
+
+    async def post(self, request, promo_uuid, *args, **kwargs):
+        user = await aget_user(request.user)
+
+        if not is_valid_uuid(promo_uuid):
+            raise ValidationError("Invalid UUID.")
+
+        if not (
+                promocode := await Promocode.objects.select_related("target")
+                .annotate(common_left=common_counters()["common_left"])  # the property would query in the loop
+                .filter(uuid=promo_uuid).afirst()
+        ):
+            raise NotFound("Промокод не найден.")
+
+        if promocode.queued_activation:  # checked and activated by run_activation_queue
+            return Response(
+                queued_response(await aenqueue_activation(promocode, user.id)), status=status.HTTP_202_ACCEPTED
+            )
+
+        if promocode.mode == "COMMON":
+            promocode_instanse = await promocode.common_code.afirst()
+        else:  # unique mode
+            promocode_instanse = await promocode.unique_codes.filter(is_activated=False).afirst()
+
+        if promocode_instanse is None and counters_promise_codes(promocode):  # a code that is not there
+            await sync_to_async(reconcile_promocode_counters.debounce)(promocode.id, RECONCILE_DELAY, promocode.id)
+
+        if promocode_instanse is None or not promocode_is_active(promocode) \
+                or not user_is_targeted(user.other, promocode.target) \
+                or not await aantifraud_success(user.email, promo_uuid):
+            return Response(
+                {"detail": "Вы не можете активировать этот промокод."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        if reservations_enabled(promocode):  # written to Postgres by persist_reservations
+            activated = await areserve_common(promocode, user.id) in (RESERVED, DUPLICATE)
+        else:  # several dependent writes, the ORM has no async transactions yet
+            activated = await sync_to_async(activate_promocode)(user, promocode_instanse, promocode)
+        if not activated:
+            return Response(
+                {"detail": "Вы не можете активировать этот промокод."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        return Response(
+            {"promo": promocode_instanse.promocode},
+        )
+
+
+class AsyncActivationResultView(AsyncAPIView):
+    """ActivationResultView with the long-poll awaited, a waiting client holds no worker thread."""
+    permission_classes = (IsUserAuthenticated,)
+
+    async def get(self, request, promo_uuid, ticket, *args, **kwargs):
+        if not is_valid_uuid(promo_uuid, ticket):
+            raise ValidationError("Invalid UUID.")
+
+        params_serializer = ActivationResultQueryParamSerializer(data=request.query_params)
+        params_serializer.is_valid(raise_exception=True)
+
+        user = await aget_user(request.user)
+        if not (result := await aactivation_result(ticket, user.id, promo_uuid, params_serializer.validated_data["wait"])):
+            raise NotFound("Заявка не найдена.")
+        return ticket_response(result)
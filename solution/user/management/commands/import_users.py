@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from core.hashing import hash_passwords
+from core.utils import is_duplicate_email, register_account
+from user.serializers import RegisterUserSerializer
+
+
+class Command(BaseCommand):
+    help = "Imports users from an NDJSON file, one sign-up payload per line, through the regular registration path."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="NDJSON file, '-' for stdin")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, path, batch_size, **options):
+        stats = {"created": 0, "conflicts": 0, "invalid": 0}
+
+        stream = self.stdin if path == "-" else open(path, encoding="utf-8")
+        with stream:
+            batch = []
+            for line_number, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    payload = json.loads(line)
+                except json.JSONDecodeError:
+                    raise CommandError(f"line {line_number}: invalid json")
+
+                serializer = RegisterUserSerializer(data=payload)
+                if not serializer.is_valid():
+                    stats["invalid"] += 1
+                    self.stderr.write(f"line {line_number}: {serializer.errors}")
+                    continue
+
+                batch.append(serializer)
+                if len(batch) >= batch_size:
+                    self._import_batch(batch, stats)
+                    batch = []
+
+            self._import_batch(batch, stats)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"created: {stats['created']}, conflicts: {stats['conflicts']}, invalid: {stats['invalid']}"
+        ))
+
+    def _import_batch(self, batch, stats):
+        # hashing is the expensive part, run the whole batch through the pool at once
+        hashed_passwords = hash_passwords([serializer.validated_data["password"] for serializer in batch])
+
+        for serializer, hashed_password in zip(batch, hashed_passwords):
+            try:
+                register_account(serializer, "USER", hashed_password=hashed_password)
+            except IntegrityError as exc:
+                if not is_duplicate_email(exc):
+                    raise
+                stats["conflicts"] += 1
+            else:
+                stats["created"] += 1
@@ -0,0 +1,113 @@
+import os
+import signal
+import socket
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, IntegrityError, InterfaceError, OperationalError
+from redis.exceptions import ResponseError
+
+from business.models import Promocode, PromocodeCommonActivation
+from business.reservations import STREAM_KEY, compensate_reservation
+from core.redis_client import redis_conn
+from user.models import User
+from user.views import activate_promocode
+
+GROUP = "persist"
+
+
+def persist_reservation(fields: dict) -> str:
+    """
+    Writes one reservation through the regular activation path. Returns "persisted",
+    "duplicate" for a redelivery of a persisted one or "compensated" when Postgres
+    refused it. Anything else raises and the entry stays pending to be retried: only
+    a known refusal may give the unit back, a wrong one makes Redis oversell.
+    """
+    reservation_id = fields[b"reservation"].decode()
+    promocode_id, user_id = int(fields[b"promo"]), int(fields[b"user"])
+
+    if PromocodeCommonActivation.objects.filter(reservation_id=reservation_id).exists():
+        return "duplicate"
+
+    promocode = Promocode.objects.filter(pk=promocode_id).first()
+    user = User.objects.select_related("other").filter(pk=user_id).first()
+    if not (promocode_instanse := promocode and promocode.common_code.first()) or not user:
+        compensate_reservation(promocode_id, user_id, restock=True)
+        return "compensated"
+    try:
+        if activate_promocode(user, promocode_instanse, promocode, reservation_id):
+            return "persisted"
+    except IntegrityError:
+        # a consumer that took the entry over by XAUTOCLAIM while its first reader was still
+        # writing: whoever commits second hits the unique reservation_id
+        if PromocodeCommonActivation.objects.filter(reservation_id=reservation_id).exists():
+            return "duplicate"
+        raise
+    # Postgres has no units left although Redis had: Redis follows it
+    compensate_reservation(promocode_id, user_id, restock=False)
+    return "compensated"
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes Redis reservations of COMMON promos (COMMON_RESERVATIONS=redis) to Postgres. "
+        "Several processes share the stream through a consumer group, SIGTERM finishes the current batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--claim-after", type=float, default=60.0,
+                            help="seconds after which entries of a dead consumer are taken over")
+        parser.add_argument("--burst", action="store_true", help="exit once the stream is drained")
+
+    def handle(self, *args, batch_size, claim_after, burst, **options):
+        try:
+            redis_conn.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+        consumer = f"{socket.gethostname()}-{os.getpid()}"
+
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        stats = {"persisted": 0, "duplicate": 0, "compensated": 0, "failed": 0}
+        while not stopping:
+            # entries read but never acknowledged by a consumer that died, then new ones
+            entries = redis_conn.xautoclaim(
+                STREAM_KEY, GROUP, consumer, min_idle_time=int(claim_after * 1000), count=batch_size
+            )[1]
+            if not entries and (read := redis_conn.xreadgroup(
+                    GROUP, consumer, {STREAM_KEY: ">"}, count=batch_size, block=1000
+            )):
+                entries = read[0][1]
+            if not entries:
+                if burst:
+                    break
+                continue
+
+            close_old_connections()
+            for entry_id, fields in entries:
+                try:
+                    result = persist_reservation(fields)
+                except (OperationalError, InterfaceError) as exc:
+                    self.stderr.write(f"postgres unavailable, {entry_id.decode()} stays pending: {exc}")
+                    close_old_connections()
+                    time.sleep(1)
+                    break
+                except Exception:
+                    # not acknowledged: retried once --claim-after has passed
+                    traceback.print_exc()
+                    stats["failed"] += 1
+                    continue
+                stats[result] += 1
+                redis_conn.pipeline().xack(STREAM_KEY, GROUP, entry_id).xdel(STREAM_KEY, entry_id).execute()
+
+        self.stdout.write(", ".join(f"{key}: {value}" for key, value in stats.items()))
@@ -0,0 +1,139 @@
+import os
+import signal
+import socket
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, InterfaceError, OperationalError
+
+from business.models import Promocode, PromocodeCommonActivation, PromocodeUniqueActivation, promocode_is_active
+from user.activation_queue import extend_lock, finish_request, lock_promo, next_requests, queued_promos, release_promo
+from user.models import User
+from user.views import activate_for_user, user_checks_pass
+
+
+def check_requests(pool: ThreadPoolExecutor, promocode: Promocode, requests: list, users: dict) -> list[bool]:
+    """
+    user_checks_pass() of every request, run in parallel: they are independent of each
+    other and of the inventory, and the antifraud call would otherwise cap a promo at
+    one activation per antifraud round trip. No database access in the threads.
+    """
+    checks = [
+        pool.submit(user_checks_pass, users[user_id], promocode) if user_id in users else None
+        for _, _, user_id in requests
+    ]
+    return [check is not None and _passed(check) for check in checks]
+
+
+def _passed(check) -> bool:
+    try:
+        return bool(check.result())
+    except Exception:  # e.g. Redis gone mid-check: this request is refused, not the whole batch
+        traceback.print_exc()
+        return False
+
+
+def persisted_codes(tickets: list[str]) -> dict[uuid.UUID, str]:
+    """Codes of the tickets that were already activated, in either mode: the ticket doubles as reservation id."""
+    return {
+        reservation_id: code
+        for model in (PromocodeCommonActivation, PromocodeUniqueActivation)
+        for reservation_id, code in model.objects.filter(reservation_id__in=tickets)
+        .values_list("reservation_id", "promocode_instanse__promocode")
+    }
+
+
+def claim_request(promocode: Promocode, user: User, ticket: str, persisted: dict, checked: bool) -> str | None:
+    """The code the ticket's user gets, None when the activation is refused."""
+    # a worker that died between the commit and finish_request: hand out the same code again
+    if (code := persisted.get(uuid.UUID(ticket))) is not None:
+        return code
+    if not checked:
+        return None
+    return activate_for_user(user, promocode, reservation_id=ticket, user_checked=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Works off queued activations (Promocode.queued_activation). One worker at a time owns a promo: "
+        "the user checks of a batch run in parallel, codes are handed out in arrival order. "
+        "SIGTERM finishes the current batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50, help="requests per promo before moving on")
+        parser.add_argument("--check-threads", type=int, default=16, help="parallel targeting and antifraud checks")
+        parser.add_argument("--lock-ttl", type=float, default=30.0,
+                            help="seconds a dead worker's promo stays locked, longer than the checks of one batch")
+        parser.add_argument("--burst", action="store_true", help="exit once no promo has queued requests")
+
+    def handle(self, *args, batch_size, check_threads, lock_ttl, burst, **options):
+        token = f"{socket.gethostname()}-{os.getpid()}"
+        lock_ms = int(lock_ttl * 1000)
+        pool = ThreadPoolExecutor(max_workers=check_threads, thread_name_prefix="activation-checks")
+
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        stats = {"activated": 0, "rejected": 0, "failed": 0, "lock_lost": 0}
+        while not stopping:
+            if not (promo_ids := queued_promos(32)):
+                if burst:
+                    break
+                time.sleep(0.05)
+                continue
+
+            for promo_id in promo_ids:
+                if stopping or not lock_promo(promo_id, token, lock_ms):
+                    continue
+                try:
+                    # a bounded batch, then the next promo: promos with long queues do not starve the others
+                    self.work_batch(promo_id, next_requests(promo_id, batch_size), pool, token, lock_ms, stats)
+                except (OperationalError, InterfaceError) as exc:
+                    # the requests keep their place in the queue until Postgres is back
+                    self.stderr.write(f"postgres unavailable, promo {promo_id} paused: {exc}")
+                    time.sleep(1)
+                finally:
+                    release_promo(promo_id, token)
+
+        pool.shutdown()
+        close_old_connections()
+        self.stdout.write(", ".join(f"{key}: {value}" for key, value in stats.items()))
+
+    def work_batch(self, promo_id: int, requests: list, pool: ThreadPoolExecutor, token: str, lock_ms: int,
+                   stats: dict) -> None:
+        if not requests:
+            return
+        close_old_connections()
+        promocode = Promocode.objects.select_related("target").filter(pk=promo_id).first()
+        users = User.objects.select_related("other").in_bulk({user_id for _, _, user_id in requests})
+        persisted = persisted_codes([ticket for _, ticket, _ in requests])
+        if promocode and promocode_is_active(promocode):
+            checks = check_requests(pool, promocode, requests, users)
+        else:  # no antifraud calls for requests that are refused anyway
+            checks = [False] * len(requests)
+
+        for (entry_id, ticket, user_id), checked in zip(requests, checks):
+            # the checks may have outlasted the lock: once another worker owns the promo, nothing more is claimed here
+            if not extend_lock(promo_id, token, lock_ms):
+                stats["lock_lost"] += 1
+                return
+            try:
+                code = claim_request(promocode, users.get(user_id), ticket, persisted, checked) if promocode else None
+                stats["rejected" if code is None else "activated"] += 1
+            except (OperationalError, InterfaceError):
+                raise
+            except Exception:
+                traceback.print_exc()
+                stats["failed"] += 1
+                code = None
+            finish_request(promo_id, entry_id, ticket, user_id, code)
@@ -3,8 +3,11 @@ from rest_framework.permissions import BasePermission
 from user.models import User
 
 
-def get_user(uuid) -> User:
-    return User.objects.get(uuid=uuid)
+def get_user(principal) -> User:
+    return User.objects.select_related("other").get(uuid=principal.uuid)
+
+async def aget_user(principal) -> User:
+    return await User.objects.select_related("other").aget(uuid=principal.uuid)
 
 class IsUserAuthenticated(BasePermission):
     def has_permission(self, request, view):
@@ -14,4 +17,4 @@ class IsCommentOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method == "GET":
             return False
-        return obj.user == get_user(request.user.uuid)
+        return obj.user == get_user(request.user)
@@ -0,0 +1,119 @@
+from dataclasses import dataclass
+from datetime import datetime
+from operator import attrgetter
+from uuid import UUID
+
+from django.db.models import Exists, OuterRef, F
+
+from business.models import Promocode, PromocodeAction, Comment, PromocodeCommonActivation, \
+    PromocodeUniqueActivation, promocode_values_is_active, common_counters
+from core.utils import subquery_count, values_rows, values_for_fields
+
+# Hot read path of the feed and the activation history. Builds the same dicts as
+# PromocodeForUserSerializer, but from slotted rows of a single values_list() query
+# with every counter annotated, instead of one model instance and five queries per promo.
+
+# output key -> values_list() names it is built from, in PromocodeForUserSerializer order.
+# A ?fields= subset selects only their columns: unselected annotations and joins drop out of the query.
+PROMOCODE_FOR_USER_FIELDS = {
+    "promo_id": ("uuid",),
+    "company_id": ("company__uuid",),
+    "company_name": ("company__name",),
+    "description": ("description",),
+    "image_url": ("image_url",),
+    "active": ("active_from", "active_until", "mode", "common_left", "unique_count"),
+    "is_activated_by_user": ("is_common_activated", "is_unique_activated"),
+    "like_count": ("like_count",),
+    "is_liked_by_user": ("is_liked_by_user",),
+    "comment_count": ("comment_count",),
+}
+
+PROMOCODE_FOR_USER_VALUES = values_for_fields(PROMOCODE_FOR_USER_FIELDS, PROMOCODE_FOR_USER_FIELDS)
+
+
+@dataclass(slots=True)
+class PromocodeForUserRow:
+    # None only in ?fields= subsets, where the field is not selected; full rows are built positionally
+    uuid: UUID | None = None
+    company_uuid: UUID | None = None
+    company_name: str | None = None
+    description: str | None = None
+    image_url: str | None = None
+    active_from: datetime | None = None
+    active_until: datetime | None = None
+    mode: str | None = None
+    common_left: int | None = None
+    unique_count: int | None = None
+    is_common_activated: bool | None = None
+    is_unique_activated: bool | None = None
+    like_count: int | None = None
+    is_liked_by_user: bool | None = None
+    comment_count: int | None = None
+    activation_created_at: datetime | None = None  # history only
+
+
+def annotate_promocodes_for_user(queryset, user):
+    return queryset.annotate(
+        common_left=common_counters()["common_left"],
+        like_count=subquery_count(PromocodeAction.objects.all(), "promocode"),
+        comment_count=subquery_count(Comment.objects.all(), "promocode"),
+        is_liked_by_user=Exists(PromocodeAction.objects.filter(promocode=OuterRef("pk"), user=user)),
+        is_common_activated=Exists(PromocodeCommonActivation.objects.filter(
+            user=user, promocode_instanse__promocode_set=OuterRef("pk")
+        )),
+        is_unique_activated=Exists(PromocodeUniqueActivation.objects.filter(
+            user=user, promocode_instanse__promocode_set=OuterRef("pk")
+        )),
+    )
+
+
+def promocodes_for_user_rows(queryset, user, *extra_values, fields=PROMOCODE_FOR_USER_FIELDS):
+    return values_rows(
+        annotate_promocodes_for_user(queryset, user),
+        PromocodeForUserRow,
+        *values_for_fields(fields, PROMOCODE_FOR_USER_FIELDS),
+        *extra_values,
+    )
+
+
+_PROMOCODE_FOR_USER_GETTERS = {
+    "promo_id": attrgetter("uuid"),
+    "company_id": attrgetter("company_uuid"),
+    "company_name": attrgetter("company_name"),
+    "description": attrgetter("description"),
+    "image_url": attrgetter("image_url"),
+    "active": lambda row: promocode_values_is_active(
+        row.active_from, row.active_until, row.mode, row.common_left, row.unique_count
+    ),
+    "is_activated_by_user": lambda row: row.is_common_activated or row.is_unique_activated,
+    "like_count": attrgetter("like_count"),
+    "is_liked_by_user": attrgetter("is_liked_by_user"),
+    "comment_count": attrgetter("comment_count"),
+}
+
+
+def promocode_for_user_representation(row: PromocodeForUserRow, fields=PROMOCODE_FOR_USER_FIELDS) -> dict:
+    return {field: _PROMOCODE_FOR_USER_GETTERS[field](row) for field in fields}
+
+
+def promocodes_for_user_representation(rows, fields=PROMOCODE_FOR_USER_FIELDS) -> list[dict]:
+    return [promocode_for_user_representation(row, fields) for row in rows]
+
+
+def activation_history_rows(user, fields=PROMOCODE_FOR_USER_FIELDS):
+    """Activated promos of the user, newest activation first, one row per activation."""
+    common_activations = promocodes_for_user_rows(
+        Promocode.objects.filter(common_code__common_activations__user=user)
+        .annotate(activation_created_at=F("common_code__common_activations__created_at")),
+        user,
+        "activation_created_at",
+        fields=fields,
+    )
+    unique_activations = promocodes_for_user_rows(
+        Promocode.objects.filter(unique_codes__unique_activations__user=user)
+        .annotate(activation_created_at=F("unique_codes__unique_activations__created_at")),
+        user,
+        "activation_created_at",
+        fields=fields,
+    )
+    return common_activations.union(unique_activations, all=True).order_by("-activation_created_at")
@@ -4,9 +4,10 @@ from drf_writable_nested import WritableNestedModelSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from app.settings import ACTIVATION_MAX_WAIT
 from business.models import Promocode, Comment, promocode_is_active, PromocodeUniqueActivation, \
     PromocodeCommonActivation
-from core.serializers import ClearNullMixin, StrictIntegerField, StrictCharField, StrictURLField
+from core.serializers import ClearNullMixin, SparseFieldsMixin, StrictIntegerField, StrictCharField, StrictURLField
 from core.utils import validate_country_code
 from .models import User, TargetInfo, password_length_validator
 
@@ -36,8 +37,8 @@ class RegisterUserSerializer(WritableNestedModelSerializer):
     )
     class Meta:
         model = User
-        fields = ("name", "surname", "email", "avatar_url", "other", "password", "model_type")
-        write_only_fields = ("password", "model_type")
+        fields = ("name", "surname", "email", "avatar_url", "other", "password")
+        write_only_fields = ("password",)
 
     def validate(self, data):
         if data.get("avatar_url") == '':
@@ -93,7 +94,7 @@ class FeedQueryParamSerializer(serializers.Serializer):
     category = serializers.CharField(required=False, allow_null=True)
     active = serializers.BooleanField(required=False, allow_null=True)
 
-class PromocodeForUserSerializer(WritableNestedModelSerializer):
+class PromocodeForUserSerializer(SparseFieldsMixin, WritableNestedModelSerializer):
     promo_id = serializers.SerializerMethodField()
     company_id = serializers.SerializerMethodField()
     company_name = serializers.SerializerMethodField()
@@ -146,6 +147,13 @@ class PromocodeForUserSerializer(WritableNestedModelSerializer):
             "comment_count"
         )
 
+class LikeActionSerializer(serializers.Serializer):
+    promo_id = serializers.UUIDField()
+    action = serializers.ChoiceField(choices=["like", "unlike"])
+
+class LikeBatchSerializer(serializers.Serializer):
+    actions = serializers.ListField(child=LikeActionSerializer(), min_length=1, max_length=100)
+
 class CreateCommentSerializer(serializers.ModelSerializer):
     text = StrictCharField(validators=[MinLengthValidator(10), MaxLengthValidator(1000)], max_length=1000)
     class Meta:
@@ -164,10 +172,7 @@ class CommentUserSerializer(serializers.ModelSerializer, ClearNullMixin):
 class RetrieveCommentSerializer(serializers.ModelSerializer):
     id = serializers.SerializerMethodField()
     date = serializers.SerializerMethodField()
-    author = serializers.SerializerMethodField()
-
-    def get_author(self, obj):
-        return CommentUserSerializer(obj.user).data
+    author = CommentUserSerializer(source="user", read_only=True)
 
     def get_id(self, obj):
         return obj.uuid
@@ -197,3 +202,6 @@ class ListCommentsQueryParamSerializer(serializers.Serializer):
 class HistoryQueryParamSerializer(serializers.Serializer):
     limit = serializers.IntegerField(required=False, allow_null=True)
     offset = serializers.IntegerField(required=False, allow_null=True)
+
+class ActivationResultQueryParamSerializer(serializers.Serializer):
+    wait = serializers.IntegerField(required=False, default=0, min_value=0, max_value=ACTIVATION_MAX_WAIT)
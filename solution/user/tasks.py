@@ -0,0 +1,12 @@
+from core.tasks import task
+from .antifraud import antifraud_success, is_antifraud_cached
+from .models import User
+
+
+@task(max_retries=1)
+def prefetch_antifraud(user_uuid: str, promo_uuid: str) -> None:
+    """Warms the antifraud verdict cache of a user who is looking at a promo, before they activate it."""
+    if not (user := User.objects.filter(uuid=user_uuid).only("email").first()):
+        return
+    if not is_antifraud_cached(user.email):
+        antifraud_success(user.email, promo_uuid)
@@ -1,16 +1,24 @@
 from django.urls import path
+
+from app.settings import ASYNC_VIEWS
+from user.async_views import AsyncFeedView, AsyncRetrievePromocodeForUserView, AsyncActivatePromocode, \
+    AsyncActivationResultView
 from user.views import RegisterUserView, LoginUserView, RetrieveUpdateUserView, FeedView, RetrievePromocodeForUserView, \
-    LikePromocodeView, CreateListCommentView, RetrieveUpdateDeleteCommentView, ActivatePromocode, ActivationHistory
+    LikePromocodeView, LikePromocodeBatchView, CreateListCommentView, RetrieveUpdateDeleteCommentView, ActivatePromocode, ActivationHistory, \
+    ActivationResultView
 
 urlpatterns = [
     path("auth/sign-up", RegisterUserView.as_view()),
     path("auth/sign-in", LoginUserView.as_view()),
     path("profile", RetrieveUpdateUserView.as_view()),
-    path("feed", FeedView.as_view()),
+    path("feed", (AsyncFeedView if ASYNC_VIEWS else FeedView).as_view()),
     path("promo/history", ActivationHistory.as_view()),
-    path("promo/<str:uuid>", RetrievePromocodeForUserView.as_view()),
+    path("promo/likes", LikePromocodeBatchView.as_view()),
+    path("promo/<str:uuid>", (AsyncRetrievePromocodeForUserView if ASYNC_VIEWS else RetrievePromocodeForUserView).as_view()),
     path("promo/<str:uuid>/like", LikePromocodeView.as_view()),
     path("promo/<str:uuid>/comments", CreateListCommentView.as_view()),
     path("promo/<str:promo_uuid>/comments/<str:comment_uuid>", RetrieveUpdateDeleteCommentView.as_view()),
-    path("promo/<str:promo_uuid>/activate", ActivatePromocode.as_view()),
+    path("promo/<str:promo_uuid>/activate", (AsyncActivatePromocode if ASYNC_VIEWS else ActivatePromocode).as_view()),
+    path("promo/<str:promo_uuid>/activate/<str:ticket>",
+         (AsyncActivationResultView if ASYNC_VIEWS else ActivationResultView).as_view()),
 ]
\ No newline at end of file
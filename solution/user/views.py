@@ -1,28 +1,42 @@
-from itertools import chain
 from typing import Union
 
 from django.utils import timezone
-from django.db.models import Q, F
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Now
 from datetime import timedelta
-from django.contrib.auth.hashers import make_password, check_password
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import NotFound, ValidationError, PermissionDenied
 from rest_framework.generics import CreateAPIView, ListAPIView, RetrieveAPIView, GenericAPIView
 from rest_framework.mixins import CreateModelMixin, ListModelMixin
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from app.exeptions import CustomException
 from app.pagination import PureLimitOffsetPagination
-from core.utils import is_valid_uuid
+from core.conditional import Validators, conditional_get
+from core.hashing import hash_password, verify_password
+from core import outbox
+from core.routers import ReadReplicaMixin
+from core.tokens import issue_token
+from core.utils import is_valid_uuid, register_account, requested_fields, is_duplicate_email
+from business.counters import claim_common
 from business.models import Promocode, PromocodeAction, Comment, promocode_is_active, Target, PromocodeUniqueInstance, \
-    PromocodeCommonInstance, PromocodeCommonActivation, PromocodeUniqueActivation
+    PromocodeCommonInstance, PromocodeCommonActivation, PromocodeUniqueActivation, promocodes_last_modified, \
+    bump_promocode_activity, common_counters
+from business.reservations import reservations_enabled, reserve_common, RESERVED, DUPLICATE
+from business.tasks import refresh_promocode_stats, reconcile_promocode_counters, RECONCILE_DELAY, \
+    STATS_REFRESH_DELAY
+from .activation_queue import ACTIVATED, QUEUED, activation_result, enqueue_activation, queued_response
 from .antifraud import antifraud_success
 from .models import User, TargetInfo
 from .permissions import IsUserAuthenticated, get_user, IsCommentOwner
+from .representations import promocodes_for_user_rows, promocodes_for_user_representation, \
+    activation_history_rows, PROMOCODE_FOR_USER_FIELDS
 from .serializers import RegisterUserSerializer, LoginUserSerializer, UserSerializer, UpdateUserSerializer, \
     FeedQueryParamSerializer, PromocodeForUserSerializer, CreateCommentSerializer, RetrieveCommentSerializer, \
-    UpdateCommentSerializer, HistoryQueryParamSerializer
+    UpdateCommentSerializer, HistoryQueryParamSerializer, LikeBatchSerializer, ActivationResultQueryParamSerializer
+from .tasks import prefetch_antifraud
 
 
 class LoginUserView(APIView):
@@ -33,45 +47,34 @@ class LoginUserView(APIView):
         email = serializer.validated_data['email']
         password = serializer.validated_data['password']
 
-        if not (user := User.objects.filter(email=email).first()) or not check_password(password, user.password):
+        if not (user := User.objects.filter(email=email).first()) or not verify_password(password, user):
             return Response({
                 "message": "Неверный email или password.",
             }, status=status.HTTP_401_UNAUTHORIZED
             )
 
-        Token.objects.filter(user=user).delete()
-        token = Token.objects.create(user=user)
-
         return Response({
-            "token": token.key,
+            "token": issue_token(user),
         })
 
 
 class RegisterUserView(CreateAPIView):
     serializer_class = RegisterUserSerializer
 
-    def perform_create(self, serializer):
-        password = serializer.validated_data['password']
-        serializer.validated_data['password'] = make_password(password)
-
-        serializer.validated_data['model_type'] = "USER"
-        serializer.save()
-
     def create(self, request, *args, **kwargs):
-        email = request.data.get("email")
-        if User.objects.filter(email=email).exists():
-            return Response({"message": "Пользователь с указанным email уже зарегистрирован."},
-                            status=status.HTTP_409_CONFLICT)
-
-        response = super().create(request, *args, **kwargs)
-
-        email = response.data.get("email")
-        user = User.objects.get(email=email)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        token = Token.objects.create(user=user)
+        try:
+            user, token = register_account(serializer, "USER")
+        except IntegrityError as exc:
+            if not is_duplicate_email(exc):
+                raise
+            raise CustomException("Пользователь с указанным email уже зарегистрирован.", "message",
+                                  status.HTTP_409_CONFLICT)
 
         return Response({
-            "token": token.key
+            "token": token
         })
 
 
@@ -80,13 +83,13 @@ class RetrieveUpdateUserView(APIView):
     serializer_class = UserSerializer
 
     def get(self, request, *args, **kwargs):
-        user = get_user(request.user.uuid)
+        user = get_user(request.user)
         serializer = UserSerializer(user)
 
         return Response(serializer.data)
 
     def patch(self, request, *args, **kwargs):
-        user = get_user(request.user.uuid)
+        user = get_user(request.user)
 
         serializer = UpdateUserSerializer(
             user, data=request.data, partial=True
@@ -94,80 +97,171 @@ class RetrieveUpdateUserView(APIView):
         serializer.is_valid(raise_exception=True)
 
         if (password := serializer.validated_data.get('password')):
-            serializer.validated_data["password"] = make_password(password)
+            serializer.validated_data["password"] = hash_password(password)
         serializer.save()
 
         res_ser = UserSerializer(user)
         return Response(res_ser.data)
 
 
-class FeedView(ListAPIView):
+def feed_queryset(user: User, params: dict):
+    category = params.get('category', None)
+    active = params.get('active', None)
+    age = user.other.age
+    country = user.other.country
+
+    queryset = Promocode.objects.all()
+
+    if category is not None:
+        queryset = queryset.filter(target__categories__icontains=category)
+
+    if active is not None:
+        current_time = timezone.now() + timedelta(hours=3)
+
+        active_filter = Q(active_from__isnull=True) | Q(active_from__lte=current_time)
+        active_filter &= Q(active_until__isnull=True) | Q(active_until__gte=current_time)
+        active_filter &= Q(mode='COMMON', common_left__gt=0) | Q(mode='UNIQUE', unique_count__gt=0)
+        queryset = queryset.alias(common_left=common_counters()["common_left"])
+
+        if active:
+            queryset = queryset.filter(active_filter)
+        else:
+            queryset = queryset.exclude(active_filter)
+
+    target_filter = (
+            (Q(target__age_from__isnull=True) | Q(target__age_from__lte=age)) &
+            (Q(target__age_until__isnull=True) | Q(target__age_until__gte=age)) &
+            (Q(target__country__isnull=True) | Q(target__country__iexact=country))
+    )
+    queryset = queryset.filter(target_filter)
+
+    return queryset.order_by("-created_at")
+
+
+def feed_validators(request, user: User) -> Validators | None:
+    """The page depends on the matching promos, the user's targeting and the query string."""
+    params_serializer = FeedQueryParamSerializer(data=request.query_params)
+    if not params_serializer.is_valid():
+        return None  # the handler answers with 400
+    queryset = feed_queryset(user, params_serializer.validated_data)
+    paginator = PureLimitOffsetPagination()
+    last_modified, page = promocodes_last_modified(
+        queryset, paginator.get_offset(request), paginator.get_limit(request),
+    )
+    return Validators.build(
+        user.uuid, user.other.age, user.other.country, request.get_full_path(), queryset.count(), page,
+        last_modified=last_modified,
+    )
+
+
+def promocode_validators(request, uuid) -> Validators | None:
+    """The caller's likes, comments and activations are among the promo's changes, so it covers the user fields too."""
+    if not is_valid_uuid(uuid):
+        return None
+    last_modified, page = promocodes_last_modified(Promocode.objects.filter(uuid=uuid))
+    if not page:
+        return None  # the handler answers with 404
+    return Validators.build(request.user.uuid, uuid, request.get_full_path(), page, last_modified=last_modified)
+
+
+class FeedView(ReadReplicaMixin, ListAPIView):
     permission_classes = (IsUserAuthenticated,)
     pagination_class = PureLimitOffsetPagination
     serializer_class = PromocodeForUserSerializer
 
-    def get_serializer_context(self):  # for is_liked_by_user
-        context = super().get_serializer_context()
-        context.update({"user": get_user(self.request.user.uuid)})
-        return context
+    def get_validators(self, request, *args, **kwargs):
+        return feed_validators(request, get_user(request.user))
 
+    @conditional_get
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
 
-    def get_queryset(self):
-        user = get_user(self.request.user.uuid)
+    def get_queryset(self, fields=PROMOCODE_FOR_USER_FIELDS):
+        user = get_user(self.request.user)
         params_serializer = FeedQueryParamSerializer(data=self.request.query_params)
         params_serializer.is_valid(raise_exception=True)
-        params = params_serializer.validated_data
-
-        category = params.get('category', None)
-        active = params.get('active', None)
-        age = user.other.age
-        country = user.other.country
-
-        queryset = Promocode.objects.all()
-
-        if category is not None:
-            queryset = queryset.filter(target__categories__icontains=category)
 
-        if active is not None:
-            current_time = timezone.now() + timedelta(hours=3)
+        return promocodes_for_user_rows(feed_queryset(user, params_serializer.validated_data), user, fields=fields)
 
-            active_filter = Q(active_from__isnull=True) | Q(active_from__lte=current_time)
-            active_filter &= Q(active_until__isnull=True) | Q(active_until__gte=current_time)
-            active_filter &= Q(mode='COMMON', common_count__gt=0) | Q(mode='UNIQUE', unique_count__gt=0)
+    def list(self, request, *args, **kwargs):
+        fields = requested_fields(request.query_params, PROMOCODE_FOR_USER_FIELDS)
+        page = self.paginate_queryset(self.get_queryset(fields))
+        return self.get_paginated_response(promocodes_for_user_representation(page, fields))
 
-            if active:
-                queryset = queryset.filter(active_filter)
-            else:
-                queryset = queryset.exclude(active_filter)
 
-        target_filter = (
-                (Q(target__age_from__isnull=True) | Q(target__age_from__lte=age)) &
-                (Q(target__age_until__isnull=True) | Q(target__age_until__gte=age)) &
-                (Q(target__country__isnull=True) | Q(target__country__iexact=country))
-        )
-        queryset = queryset.filter(target_filter)
-
-        return queryset.order_by("-created_at")
-
-
-class RetrievePromocodeForUserView(RetrieveAPIView):
+class RetrievePromocodeForUserView(ReadReplicaMixin, RetrieveAPIView):
     permission_classes = (IsUserAuthenticated,)
     serializer_class = PromocodeForUserSerializer
-    queryset = Promocode.objects.all()
+    queryset = Promocode.objects.select_related("company")
     lookup_field = "uuid"
     lookup_url_kwarg = "uuid"
 
     def get_serializer_context(self):  # for is_liked_by_user
         context = super().get_serializer_context()
-        context.update({"user": get_user(self.request.user.uuid)})
+        context.update({
+            "user": get_user(self.request.user),
+            "fields": requested_fields(self.request.query_params, PromocodeForUserSerializer.Meta.fields),
+        })
         return context
 
+    def get_validators(self, request, uuid, *args, **kwargs):
+        return promocode_validators(request, uuid)
+
+    @conditional_get
+    def get(self, request, *args, **kwargs):
+        return self.retrieve(request, *args, **kwargs)
+
     def retrieve(self, request, uuid, *args, **kwargs):
         if not is_valid_uuid(uuid):
             raise ValidationError("Invalid UUID.")
-        return super().retrieve(request, uuid, *args, **kwargs)
+        response = super().retrieve(request, uuid, *args, **kwargs)
+        prefetch_antifraud.delay(str(request.user.uuid), uuid)  # a viewed promo is often activated next
+        return response
+
+
+def like_promocodes(user: User, promocode_ids: list[int], action_type: str) -> None:
+    """
+    Single INSERT ... ON CONFLICT (promocode_id, user_id) DO UPDATE, no read-then-write.
+    A row that already has the type is left alone and RETURNING yields only the changed
+    ones, so a repeated like writes nothing and emits no outbox event or activity bump.
+    Rows go in id order so concurrent batches lock them in the same order.
+    Call inside a transaction, the outbox events commit with the actions.
+    """
+    if not promocode_ids:
+        return
+    table = PromocodeAction._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (promocode_id, user_id, type) "
+            "SELECT promocode_id, %s, %s FROM unnest(%s::bigint[]) WITH ORDINALITY AS ids (promocode_id, position) "
+            "ORDER BY position "
+            f"ON CONFLICT (promocode_id, user_id) DO UPDATE SET type = EXCLUDED.type "
+            f"WHERE {table}.type <> EXCLUDED.type "
+            "RETURNING promocode_id",
+            [user.pk, action_type, sorted(promocode_ids)],
+        )
+        changed = sorted(promocode_id for promocode_id, in cursor.fetchall())
+    bump_promocode_activity(changed)
+    outbox.record_many(action_type, (
+        {"promocode_id": promocode_id, "user_id": user.uuid} for promocode_id in changed
+    ))
+
+
+def unlike_promocodes(user: User, promocode_ids: list[int]) -> None:
+    """DELETE ... RETURNING: only the likes that were there get an outbox event and an activity bump."""
+    if not promocode_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {PromocodeAction._meta.db_table} WHERE user_id = %s AND promocode_id = ANY(%s::bigint[]) "
+            "RETURNING promocode_id",
+            [user.pk, sorted(promocode_ids)],
+        )
+        deleted = sorted(promocode_id for promocode_id, in cursor.fetchall())
+    bump_promocode_activity(deleted)
+    outbox.record_many("unlike", (
+        {"promocode_id": promocode_id, "user_id": user.uuid} for promocode_id in deleted
+    ))
 
 
 class LikePromocodeView(APIView):
@@ -176,12 +270,7 @@ class LikePromocodeView(APIView):
     action_type = "like"
 
     def action(self, user: User, promocode: Promocode) -> None:
-        if (
-                not (action_qs := PromocodeAction.objects.filter(user=user, promocode=promocode))
-                or action_qs.first().type != self.action_type
-        ):
-            action_qs.delete()
-            PromocodeAction.objects.create(user=user, promocode=promocode, type=self.action_type)
+        like_promocodes(user, [promocode.id], self.action_type)
 
     def post(self, request, uuid, *args, **kwargs) -> Response:
         if not is_valid_uuid(uuid):
@@ -192,7 +281,8 @@ class LikePromocodeView(APIView):
         ):
             raise NotFound("Промокод не найден.")
 
-        self.action(get_user(self.request.user.uuid), promocode)
+        with transaction.atomic():
+            self.action(get_user(self.request.user), promocode)
 
         return Response(
             {
@@ -209,7 +299,8 @@ class LikePromocodeView(APIView):
         ):
             raise NotFound("Промокод не найден.")
 
-        PromocodeAction.objects.filter(user=get_user(self.request.user.uuid), promocode=promocode).delete()
+        with transaction.atomic():
+            unlike_promocodes(get_user(self.request.user), [promocode.id])
 
         return Response(
             {
@@ -218,7 +309,43 @@ class LikePromocodeView(APIView):
         )
 
 
-class CreateListCommentView(GenericAPIView, CreateModelMixin, ListModelMixin):
+class LikePromocodeBatchView(APIView):
+    permission_classes = (IsUserAuthenticated,)
+
+    action_type = "like"
+
+    def post(self, request, *args, **kwargs) -> Response:
+        serializer = LikeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        latest_actions = {}  # the last action for a promo wins, like the client replaying its log
+        for item in serializer.validated_data["actions"]:
+            latest_actions[item["promo_id"]] = item["action"]
+
+        promocode_ids = dict(
+            Promocode.objects.filter(uuid__in=latest_actions.keys()).values_list("uuid", "id")
+        )
+        user = get_user(self.request.user)
+
+        with transaction.atomic():
+            like_promocodes(user, [
+                promocode_ids[uuid] for uuid, action in latest_actions.items()
+                if action == "like" and uuid in promocode_ids
+            ], self.action_type)
+            unlike_promocodes(user, [
+                promocode_ids[uuid] for uuid, action in latest_actions.items()
+                if action == "unlike" and uuid in promocode_ids
+            ])
+
+        return Response(
+            {
+                "status": "ok",
+                "not_found": [uuid for uuid in latest_actions if uuid not in promocode_ids],
+            }
+        )
+
+
+class CreateListCommentView(ReadReplicaMixin, GenericAPIView, CreateModelMixin, ListModelMixin):
     permission_classes = (IsUserAuthenticated,)
     pagination_class = PureLimitOffsetPagination
     serializer_class = RetrieveCommentSerializer
@@ -241,11 +368,15 @@ class CreateListCommentView(GenericAPIView, CreateModelMixin, ListModelMixin):
         serializer = CreateCommentSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        comment = Comment.objects.create(
-            user=get_user(self.request.user.uuid),
-            promocode=promocode,
-            text=serializer.validated_data['text'],
-        )
+        user = get_user(self.request.user)
+        with transaction.atomic():
+            comment = Comment.objects.create(
+                user=user,
+                promocode=promocode,
+                text=serializer.validated_data['text'],
+            )
+            bump_promocode_activity([promocode.id])
+            outbox.record("comment", promocode_id=promocode.id, user_id=user.uuid, comment_id=comment.uuid)
 
         response_data = RetrieveCommentSerializer(comment).data
         return Response(response_data, status=status.HTTP_201_CREATED)
@@ -258,15 +389,23 @@ class CreateListCommentView(GenericAPIView, CreateModelMixin, ListModelMixin):
         params_serializer = FeedQueryParamSerializer(data=self.request.query_params)
         params_serializer.is_valid(raise_exception=True)
 
-        if not Promocode.objects.filter(uuid=uuid).exists():
-            raise NotFound("Промокод не найден.")
-
-        queryset = Comment.objects.filter(promocode__uuid=uuid)
+        queryset = Comment.objects.filter(promocode__uuid=uuid).select_related("user")
 
         return queryset.order_by("-created_at")
 
+    def list(self, request, uuid, *args, **kwargs):
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+
+        # the pagination count doubles as the existence check, only an empty list needs a second look
+        if not self.paginator.count and not Promocode.objects.filter(uuid=uuid).exists():
+            raise NotFound("Промокод не найден.")
+
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
-class RetrieveUpdateDeleteCommentView(APIView):
+class RetrieveUpdateDeleteCommentView(ReadReplicaMixin, APIView):
     permission_classes = (IsUserAuthenticated, IsCommentOwner,)
 
     def get(self, request, *args, **kwargs):
@@ -276,7 +415,7 @@ class RetrieveUpdateDeleteCommentView(APIView):
         if not is_valid_uuid(promo_uuid, comment_uuid):
             raise ValidationError("Invalid UUID.")
 
-        if not (comment := Comment.objects.filter(promocode__uuid=promo_uuid, uuid=comment_uuid).first()):
+        if not (comment := Comment.objects.select_related("user").filter(promocode__uuid=promo_uuid, uuid=comment_uuid).first()):
             raise NotFound("Комментарий не найден.")
         response_data = RetrieveCommentSerializer(comment).data
         return Response(response_data)
@@ -288,17 +427,21 @@ class RetrieveUpdateDeleteCommentView(APIView):
         if not is_valid_uuid(promo_uuid, comment_uuid):
             raise ValidationError("Invalid UUID.")
 
-        if not (comment := Comment.objects.filter(promocode__uuid=promo_uuid, uuid=comment_uuid).first()):
+        if not (comment := Comment.objects.select_related("user").filter(promocode__uuid=promo_uuid, uuid=comment_uuid).first()):
             raise NotFound("Комментарий не найден.")
 
-        if not comment.user == get_user(self.request.user.uuid):
+        if not comment.user == get_user(self.request.user):
             raise PermissionDenied("Низя")
 
         serialier = UpdateCommentSerializer(data=request.data)
         serialier.is_valid(raise_exception=True)
 
         comment.text = serialier.validated_data['text']
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+            bump_promocode_activity([comment.promocode_id])
+            outbox.record("comment_update", promocode_id=comment.promocode_id, user_id=comment.user.uuid,
+                          comment_id=comment.uuid)
 
         response_data = RetrieveCommentSerializer(comment).data
         return Response(response_data, status=status.HTTP_200_OK)
@@ -310,13 +453,18 @@ class RetrieveUpdateDeleteCommentView(APIView):
         if not is_valid_uuid(promo_uuid, comment_uuid):
             raise ValidationError("Invalid UUID.")
 
-        if not (comment := Comment.objects.filter(promocode__uuid=promo_uuid, uuid=comment_uuid).first()):
+        if not (comment := Comment.objects.select_related("user").filter(promocode__uuid=promo_uuid, uuid=comment_uuid).first()):
             raise NotFound("Комментарий не найден.")
 
-        if not comment.user == get_user(self.request.user.uuid):
+        if not comment.user == get_user(self.request.user):
             raise PermissionDenied("Низя")
 
-        comment.delete()
+        comment_id = comment.uuid
+        with transaction.atomic():
+            comment.delete()
+            bump_promocode_activity([comment.promocode_id])
+            outbox.record("comment_delete", promocode_id=comment.promocode_id, user_id=comment.user.uuid,
+                          comment_id=comment_id)
 
         return Response(
             {"status": "ok"}
@@ -338,19 +486,98 @@ def user_is_targeted(user_info: TargetInfo, promocode_target: Target) -> bool:
 
 
 def activate_promocode(user: User, promocode_instanse: Union[PromocodeUniqueInstance, PromocodeCommonInstance],
-                       promocode: Promocode):
-    promocode_instanse.is_activated = True
-    promocode_instanse.save()
-
-    if isinstance(promocode_instanse, PromocodeCommonInstance):
-        PromocodeCommonActivation.objects.create(user=user, promocode_instanse=promocode_instanse)
-        promocode.common_count -= 1
-        promocode.common_activations_count += 1
+                       promocode: Promocode, reservation_id: str = None) -> bool:
+    """
+    The activation, the counters and its outbox event commit together. Counters move
+    by conditional UPDATEs, not a read-modify-write of the promo row. False when a
+    concurrent activation took the last COMMON one.
+    reservation_id: the Redis reservation being persisted (persist_reservations) or the ticket
+    of a queued activation (run_activation_queue), stored with the activation of either mode.
+    """
+    with transaction.atomic():
+        if isinstance(promocode_instanse, PromocodeCommonInstance):
+            if not claim_common(promocode):
+                return False
+            PromocodeCommonActivation.objects.create(
+                user=user, promocode_instanse=promocode_instanse, reservation_id=reservation_id
+            )
+        else:
+            Promocode.objects.filter(pk=promocode.pk).update(
+                unique_count=F("unique_count") - 1,
+                unique_activations_count=F("unique_activations_count") + 1,
+                updated_at=Now(),
+            )
+            PromocodeUniqueActivation.objects.create(
+                user=user, promocode_instanse=promocode_instanse, reservation_id=reservation_id
+            )
+
+        if not promocode_instanse.is_activated:  # the shared COMMON code row is written once, not per activation
+            promocode_instanse.is_activated = True
+            promocode_instanse.save(update_fields=["is_activated"])
+        outbox.record(
+            "activation",
+            promocode_id=promocode.id,
+            promo_id=promocode.uuid,
+            user_id=user.uuid,
+            mode=promocode.mode,
+            country=user.other.country,
+            age=user.other.age,
+        )
+        refresh_promocode_stats.debounce(promocode.id, STATS_REFRESH_DELAY, promocode.id)
+    return True
+
+
+def counters_promise_codes(promocode: Promocode) -> bool:
+    """False for a sold out promo: no code row left is then expected, not a drift to reconcile."""
+    return promocode.common_left > 0 if promocode.mode == "COMMON" else promocode.unique_count > 0
+
+
+def user_checks_pass(user: User, promocode: Promocode) -> bool:
+    """The per-user part of the activation checks, targeting and antifraud, independent of the inventory."""
+    return user_is_targeted(user.other, promocode.target) and antifraud_success(user.email, str(promocode.uuid))
+
+
+def activate_for_user(user: User, promocode: Promocode, reservation_id: str = None,
+                      user_checked: bool = False) -> str | None:
+    """
+    The checks and the activation behind ActivatePromocode, the code or None when the user gets none.
+    user_checked: user_checks_pass() already ran, see run_activation_queue.
+    """
+    if promocode.mode == "COMMON":
+        promocode_instanse = promocode.common_code.first()
+    else:  # unique mode
+        promocode_instanse = promocode.unique_codes.filter(is_activated=False).first()
+
+    if promocode_instanse is None and counters_promise_codes(promocode):  # a code that is not there
+        reconcile_promocode_counters.debounce(promocode.id, RECONCILE_DELAY, promocode.id)
+
+    if promocode_instanse is None or not promocode_is_active(promocode) \
+            or not (user_checked or user_checks_pass(user, promocode)):
+        return None
+
+    if reservations_enabled(promocode):  # written to Postgres by persist_reservations
+        activated = reserve_common(promocode, user.id) in (RESERVED, DUPLICATE)
     else:
-        PromocodeUniqueActivation.objects.create(user=user, promocode_instanse=promocode_instanse)
-        promocode.unique_count -= 1
-        promocode.unique_activations_count += 1
-    promocode.save()
+        activated = activate_promocode(user, promocode_instanse, promocode, reservation_id)
+    return promocode_instanse.promocode if activated else None
+
+
+def activation_response(code: str | None) -> Response:
+    if code is None:
+        return Response(
+            {"detail": "Вы не можете активировать этот промокод."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    return Response(
+        {"promo": code},
+    )
+
+
+def ticket_response(ticket: dict) -> Response:
+    """A queued activation's ticket answered like the activation itself once it is done."""
+    if ticket["status"] == QUEUED:
+        return Response(queued_response(ticket["ticket"]), status=status.HTTP_202_ACCEPTED)
+    return activation_response(ticket["promo"] if ticket["status"] == ACTIVATED else None)
 
 
 class ActivatePromocode(APIView):
@@ -358,7 +585,7 @@ class ActivatePromocode(APIView):
 
     def post(self, request, *args, **kwargs):
         promo_uuid = self.kwargs.get("promo_uuid")
-        user = get_user(request.user.uuid)
+        user = get_user(request.user)
 
         if not is_valid_uuid(promo_uuid):
             raise ValidationError("Invalid UUID.")
@@ -368,53 +595,42 @@ class ActivatePromocode(APIView):
         ):
             raise NotFound("Промокод не найден.")
 
-        if promocode.mode == "COMMON":
-            promocode_instanse = promocode.common_code.first()
-        else:  # unique mode
-            promocode_instanse = promocode.unique_codes.filter(is_activated=False).first()
-
-        if not promocode_is_active(promocode) \
-                or not user_is_targeted(user.other, promocode.target) \
-                or not antifraud_success(user.email, promo_uuid):
-            return Response(
-                {"detail": "Вы не можете активировать этот промокод."},
-                status=status.HTTP_403_FORBIDDEN,
-            )
+        if promocode.queued_activation:  # checked and activated by run_activation_queue
+            return Response(queued_response(enqueue_activation(promocode, user.id)), status=status.HTTP_202_ACCEPTED)
 
-        activate_promocode(user, promocode_instanse, promocode)
-        return Response(
-            {"promo": promocode_instanse.promocode},
-        )
+        return activation_response(activate_for_user(user, promocode))
 
 
-class ActivationHistory(ListAPIView):
+class ActivationResultView(APIView):
+    """Result of a queued activation, ?wait=N holds the request up to N seconds until it is there."""
     permission_classes = (IsUserAuthenticated,)
-    pagination_class = PureLimitOffsetPagination
-    serializer_class = PromocodeForUserSerializer
 
-    def get_serializer_context(self):  # for is_liked_by_user
-        context = super().get_serializer_context()
-        context.update({"user": get_user(self.request.user.uuid)})
-        return context
+    def get(self, request, promo_uuid, ticket, *args, **kwargs):
+        if not is_valid_uuid(promo_uuid, ticket):
+            raise ValidationError("Invalid UUID.")
 
-    def get_queryset(self):
-        user = get_user(self.request.user.uuid)
-        params_serializer = HistoryQueryParamSerializer(data=self.request.query_params)
+        params_serializer = ActivationResultQueryParamSerializer(data=request.query_params)
         params_serializer.is_valid(raise_exception=True)
 
-        common_queryset = Promocode.objects.filter(
-            common_code__common_activations__user=user
-        ).annotate(activation_created_at=F('common_code__common_activations__created_at'))
+        user = get_user(request.user)
+        if not (result := activation_result(ticket, user.id, promo_uuid, params_serializer.validated_data["wait"])):
+            raise NotFound("Заявка не найдена.")
+        return ticket_response(result)
 
-        unique_queryset = Promocode.objects.filter(
-            unique_codes__unique_activations__user=user
-        ).annotate(activation_created_at=F('unique_codes__unique_activations__created_at'))
 
-        queryset = sorted(
-            chain(common_queryset, unique_queryset),
-            key=lambda promo: promo.activation_created_at,
-            reverse=True
-        )
+class ActivationHistory(ListAPIView):
+    permission_classes = (IsUserAuthenticated,)
+    pagination_class = PureLimitOffsetPagination
+    serializer_class = PromocodeForUserSerializer
+
+    def get_queryset(self, fields=PROMOCODE_FOR_USER_FIELDS):
+        user = get_user(self.request.user)
+        params_serializer = HistoryQueryParamSerializer(data=self.request.query_params)
+        params_serializer.is_valid(raise_exception=True)
 
-        return queryset
+        return activation_history_rows(user, fields)
 
+    def list(self, request, *args, **kwargs):
+        fields = requested_fields(request.query_params, PROMOCODE_FOR_USER_FIELDS)
+        page = self.paginate_queryset(self.get_queryset(fields))
+        return self.get_paginated_response(promocodes_for_user_representation(page, fields))